@@ -5,17 +5,92 @@ class Settings(BaseSettings):
     secret_key: str #= "default_secret_key"
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
+    bcrypt_rounds: int = 12  # Stored hashes with another cost are rehashed on login
+    password_hash_workers: int = 0  # Processes in the bcrypt pool of each uvicorn worker, 0 means the CPUs divided by WEB_CONCURRENCY
+    password_hash_max_pending: int = 0  # Reject with 503 beyond this many queued hashes, 0 means 4 per worker
+    user_cache_size: int = 10000  # Authenticated users cached per process
+    user_cache_ttl_seconds: int = 30
+    revocation_backend: str = "memory"  # "memory" (per process) or "mongo" (shared by all workers)
+    revocation_collection: str = "revoked_tokens"
+    revocation_negative_cache_seconds: int = 5  # How long a "not revoked" answer is reused locally
+    event_buffer_ms: float = 0  # Coalesce user events this long into one bulk_write, 0 writes each request directly
+    event_buffer_max_users: int = 1000  # Flush buffered events early once this many users have some pending
+    max_events_per_request: int = 500  # Largest batch accepted by POST /user/events
 
     # MongoDB configuration
     mongo_username: str  # Will load from .env
     mongo_password: str  # Will load from .env
     db_name: str = "cognitive_project"
     collection_name: str = "user_data"
+    mongo_max_pool_size: int = 100  # Connections per process
+    mongo_min_pool_size: int = 0
+    mongo_max_idle_time_ms: int = 60000
+    mongo_wait_queue_timeout_ms: int = 5000  # Fail fast instead of queueing forever for a connection
+    mongo_url: str = ""  # Full connection string used instead of the Atlas cluster, e.g. a local mongod
+    index_bootstrap: bool = True  # Create missing indexes at startup (else: python -m app.manage ensure-indexes); missing unique ones always stop startup
+    index_check: str = "warn"  # Hot queries that scan a collection at startup: "fail" refuses to start, "warn" logs, "off"
 
     genai_api_key: str # Will load from .env
 
+    # Embedding settings
+    embedding_provider: str = "genai"  # "genai" or "local" (deterministic, offline)
+    embedding_model: str = "models/text-embedding-004"
+    embedding_dim: int = 768
+    embedding_cache_size: int = 10000
+    embedding_cache_ttl_seconds: int = 3600
+    embedding_persistent_cache: bool = False  # Share cached embeddings through MongoDB
+    embedding_cache_collection: str = "embedding_cache"
+    embedding_persistent_cache_ttl_seconds: int = 7 * 24 * 3600
+    embedding_timeout_seconds: float = 2.0  # Deadline of one remote embedding call, 0 waits indefinitely
+    embedding_breaker_failures: int = 5  # Consecutive failed or timed-out embedding calls that open the circuit breaker
+    embedding_breaker_reset_seconds: float = 30  # How long calls fail fast before a trial call is let through
+
+    # Observability
+    log_level: str = "INFO"
+    metrics_enabled: bool = True  # Serve Prometheus metrics on /metrics
+    slow_request_ms: int = 1000  # Log the per-stage breakdown of slower requests, 0 disables
+    profile_sample_rate: float = 0.0  # Fraction of requests profiled with pyinstrument (optional dependency)
+    profile_output_dir: str = ""  # Directory for HTML profiles of slow sampled requests; logged if empty
+
+    # Recommendation settings
+    warmup_enabled: bool = True  # Run a recommendation pass at startup before reporting ready
+    article_index_refresh_seconds: int = 300  # Rebuild the in-memory article index after this age (live refresh off)
+    article_live_refresh: str = "auto"  # "auto" (change streams, else polling), "change_stream", "poll" or "off"
+    article_poll_seconds: float = 5  # Polling interval, also the change stream await time
+    article_updated_field: str = ""  # Optional last-modified field polled for updated articles
+    article_reconcile_seconds: int = 600  # Polling mode: how often deleted or late-valid articles are reconciled
+    article_refresh_batch_size: int = 500  # Most article changes applied per snapshot swap
+    ann_enabled: bool = False  # Query an IVF approximate index instead of exhaustive scoring
+    ann_n_lists: int = 0  # Number of IVF lists, 0 picks about sqrt(number of articles)
+    ann_n_probe: int = 16  # Lists scanned per query; higher means better recall, slower queries
+    ann_index_path: str = ""  # Optional .npz file the IVF index is loaded from and saved to, by one worker at a time
+    quantized_scoring: bool = False  # Scan an int8 copy of the embeddings, then re-rank exactly; costs a quarter more memory and only pays off on large corpora
+    quantized_rerank_depth: int = 300  # Candidates re-scored with the float32 embeddings after the int8 scan
+    shared_matrix_dir: str = ""  # Directory (e.g. under /dev/shm) where one worker per host publishes the article matrix for the others to map, "" keeps a private copy per worker
+    shared_matrix_publish_seconds: float = 30  # Least time between two published generations of the shared matrix
+    shared_matrix_poll_seconds: float = 2  # How often workers look for a newer generation or a vacant builder role
+    shared_matrix_wait_seconds: float = 300  # How long a worker waits for the first generation before building a private index
+    recency_window_days: float = 0  # Only articles published this recently are loaded and scored, 0 disables
+    recency_half_life_hours: float = 0  # Article age at which the recency bonus halves, 0 disables blending
+    recency_weight: float = 0.2  # Share of the blended score that comes from recency
+    trending_size: int = 200  # Articles in the fallback trending list served when no user vector is available
+    trending_refresh_seconds: float = 300  # How often the trending list is recomputed, 0 never (fresh articles only)
+    mmr_pool_size: int = 500  # Candidates considered when re-ranking recommendations for diversity
+    mmr_diversity: float = 0.3  # MMR trade-off: 0 ranks by relevance only, 1 by novelty only
+    max_page_size: int = 100  # Largest `limit` accepted by /user/recommendations
+    ranked_list_depth: int = 100  # Ids ranked on the first page and paged through with cursors, 0 disables paging
+    ranked_list_cache_size: int = 10000  # Users whose ranked list is kept per process
+    ranked_list_ttl_seconds: int = 900  # Cursors expire after this long
+    precompute_top_k: int = 100  # Recommendations stored per user by the batch job
+    precompute_max_age_seconds: int = 6 * 3600  # Older precomputed lists are rescored live
+    precompute_user_chunk_size: int = 1024  # Users scored per matrix-matrix product
+    precompute_article_block_size: int = 4096  # Articles scored per block within a chunk; peaks near 24 bytes x chunk x block (100 MB)
+    precompute_embedding_concurrency: int = 8  # Preference texts embedded concurrently by the batch job
+
     @property
     def database_url(self) -> str:
+        if self.mongo_url:
+            return self.mongo_url
         return (
             f"mongodb+srv://{self.mongo_username}:{self.mongo_password}"
             f"@cluster0.3rx4l.mongodb.net/?retryWrites=true&w=majority&appName=Cluster0"
@@ -0,0 +1,136 @@
+import logging
+import os
+import random
+import time
+from typing import Optional
+
+from pymongo import monitoring
+
+from app.core.config import settings
+from app.core.metrics import record_stage, registry, start_trace
+
+logger = logging.getLogger(__name__)
+
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ["method", "route", "status"]
+)
+HTTP_IN_PROGRESS = registry.gauge("http_requests_in_progress", "HTTP requests currently being handled")
+MONGO_COMMAND_SECONDS = registry.histogram(
+    "mongo_command_duration_seconds", "MongoDB command round-trip time", ["command"]
+)
+MONGO_COMMAND_FAILURES = registry.counter("mongo_command_failures_total", "Failed MongoDB commands", ["command"])
+
+
+def route_template(scope) -> str:
+    """
+    The matched route with path parameters as placeholders (e.g. /user/delete/{email}),
+    which keeps the label cardinality bounded; "unmatched" for 404s.
+    """
+    if scope.get("route") is None:
+        return "unmatched"
+    segments = scope["path"].split("/")
+    placeholders = {str(value): f"{{{name}}}" for name, value in scope.get("path_params", {}).items()}
+    return "/".join(placeholders.get(segment, segment) for segment in segments)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """
+    pymongo command listener timing every command; the time also counts towards the
+    `mongo` stage of the request that issued it.
+    """
+    def started(self, event: monitoring.CommandStartedEvent):
+        pass
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        seconds = event.duration_micros / 1e6
+        MONGO_COMMAND_SECONDS.observe(seconds, command=event.command_name)
+        record_stage("mongo", seconds)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        seconds = event.duration_micros / 1e6
+        MONGO_COMMAND_SECONDS.observe(seconds, command=event.command_name)
+        MONGO_COMMAND_FAILURES.inc(command=event.command_name)
+        record_stage("mongo", seconds)
+
+
+class SlowRequestProfiler:
+    """
+    Runs a sampled fraction of requests under pyinstrument (an optional dependency) and keeps
+    the profile only when the request turns out slower than `threshold_ms`.
+    """
+    def __init__(self, sample_rate: float, threshold_ms: float, output_dir: str = ""):
+        self.sample_rate = sample_rate
+        self.threshold_ms = threshold_ms
+        self.output_dir = output_dir
+        self._profiler_class = None
+        if sample_rate > 0:
+            try:
+                from pyinstrument import Profiler
+                self._profiler_class = Profiler
+            except ImportError:
+                logger.warning("profile_sample_rate is set but pyinstrument is not installed; profiling disabled")
+
+    def start(self):
+        if self._profiler_class is None or random.random() >= self.sample_rate:
+            return None
+        # async_mode="enabled" only attributes time spent in this request's task
+        profiler = self._profiler_class(async_mode="enabled")
+        profiler.start()
+        return profiler
+
+    def finish(self, profiler, path: str, elapsed_ms: float):
+        if profiler is None:
+            return
+        profiler.stop()
+        if elapsed_ms < self.threshold_ms:
+            return
+        if self.output_dir:
+            filename = os.path.join(self.output_dir, f"{int(time.time() * 1000)}{path.replace('/', '_')}.html")
+            with open(filename, "w") as f:
+                f.write(profiler.output_html())
+            logger.warning("Profile of slow request %s (%.0f ms) written to %s", path, elapsed_ms, filename)
+        else:
+            logger.warning("Profile of slow request %s (%.0f ms):\n%s", path, elapsed_ms, profiler.output_text())
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware recording latency per route and status, collecting the per-stage trace of
+    each request and logging the stage breakdown of slow ones.
+    """
+    def __init__(self, app, slow_request_ms: Optional[float] = None, profiler: Optional[SlowRequestProfiler] = None):
+        self.app = app
+        self.slow_request_ms = settings.slow_request_ms if slow_request_ms is None else slow_request_ms
+        self.profiler = profiler or SlowRequestProfiler(
+            settings.profile_sample_rate, self.slow_request_ms, settings.profile_output_dir
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        trace = start_trace()
+        profile = self.profiler.start()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_PROGRESS.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_IN_PROGRESS.dec()
+            HTTP_REQUEST_SECONDS.observe(elapsed, method=scope["method"], route=route_template(scope), status=status)
+
+            elapsed_ms = elapsed * 1000
+            if self.slow_request_ms and elapsed_ms >= self.slow_request_ms:
+                stages = ", ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in sorted(trace.items()))
+                logger.warning("Slow request %s %s took %.0f ms (%s)", scope["method"], scope["path"], elapsed_ms, stages)
+            self.profiler.finish(profile, scope["path"], elapsed_ms)
@@ -1,6 +1,15 @@
-from pymongo import MongoClient
+from pymongo import AsyncMongoClient
 from app.core.config import settings
+from app.core.monitoring import MongoCommandMetrics
 
-client = MongoClient(settings.database_url)
+# Non-blocking client; connections are opened lazily on the first operation
+client = AsyncMongoClient(
+    settings.database_url,
+    maxPoolSize=settings.mongo_max_pool_size,
+    minPoolSize=settings.mongo_min_pool_size,
+    maxIdleTimeMS=settings.mongo_max_idle_time_ms,
+    waitQueueTimeoutMS=settings.mongo_wait_queue_timeout_ms,
+    event_listeners=[MongoCommandMetrics()],
+)
 
 db = client[settings.db_name]#[settings.collection_name]#client["user_db"]
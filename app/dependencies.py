@@ -0,0 +1,18 @@
+from fastapi import Request
+
+from app.db import db
+from app.services.personalized_recommender import PersonalizedRecommender
+
+
+def get_db():
+    """
+    The application database handle.
+    """
+    return db
+
+
+def get_recommender(request: Request) -> PersonalizedRecommender:
+    """
+    The recommender built once by the application lifespan.
+    """
+    return request.app.state.recommender
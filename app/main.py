@@ -1,13 +1,64 @@
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from app.routes import user, auth
+from app.routes import user, auth, health, metrics
+from app.core.config import settings
+from app.core.monitoring import RequestMetricsMiddleware
+from app.db import client
+from app.services.article_index import article_index
+from app.services.article_refresher import article_refresher
+from app.services.embedding_provider import get_embedding_provider
+from app.services.event_buffer import event_buffer
+from app.services.indexes import bootstrap_indexes
+from app.services.personalized_recommender import PersonalizedRecommender
+from app.services.shared_matrix import shared_matrix
+from app.services.trending import trending
+from app.security import password_hasher
 import uvicorn
 
 from fastapi.middleware.cors import CORSMiddleware
 
+logging.basicConfig(level=settings.log_level, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Build long-lived resources once per worker and warm them up before serving traffic.
+    """
+    app.state.ready = False
+    await client.aconnect()
+    await bootstrap_indexes()
+    app.state.recommender = PersonalizedRecommender(get_embedding_provider(), article_index)
+    if shared_matrix is not None:
+        await shared_matrix.start()
+    else:
+        await article_index.build()
+        article_refresher.start()
+    trending.start()
+    if settings.warmup_enabled:
+        await app.state.recommender.warm_up()
+        await password_hasher.warm_up()
+    app.state.ready = True
+
+    yield
+
+    app.state.ready = False
+    await trending.stop()
+    if event_buffer is not None:
+        await event_buffer.close()
+    if shared_matrix is not None:
+        await shared_matrix.stop()
+    await article_refresher.stop()
+    await article_index.close()
+    password_hasher.shutdown()
+    await client.close()
+
+
 app = FastAPI(
     title="Informed Pulse backend API",
     description="An API to manage user registration, login, and news data retrive from DB",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Allow all origins
@@ -19,9 +70,15 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+# Outermost, so the measured latency covers every other middleware
+app.add_middleware(RequestMetricsMiddleware)
+
 # Include routes
 app.include_router(user.router, prefix="/user", tags=["users"])
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
+app.include_router(health.router, prefix="/health", tags=["health"])
+if settings.metrics_enabled:
+    app.include_router(metrics.router, tags=["metrics"])
 
 if __name__ == "__main__":
     uvicorn.run(app, port=8000, host="0.0.0.0")
@@ -0,0 +1,81 @@
+"""
+Maintenance commands for the Informed Pulse backend.
+
+    python -m app.manage backfill-profiles [--force]
+    python -m app.manage precompute-recommendations [--top-k 100] [--chunk-size 1024]
+    python -m app.manage migrate-embeddings [--batch-size 1000]
+    python -m app.manage ensure-indexes [--check-only]
+"""
+import argparse
+import asyncio
+import logging
+import sys
+
+
+def backfill_profiles(args):
+    from app.services.user_profile import backfill_profiles
+
+    stats = asyncio.run(backfill_profiles(force=args.force, batch_size=args.batch_size))
+    print(f"Profiles updated: {stats['updated']}, skipped (changed concurrently): {stats['skipped']}")
+
+
+def precompute_recommendations(args):
+    from app.services.batch_recommendations import precompute_recommendations
+
+    stats = asyncio.run(precompute_recommendations(top_k=args.top_k, chunk_size=args.chunk_size))
+    print(f"Users scored: {stats['users']}, lists stored: {stats['updated']}, "
+          f"skipped (preferences not embedded): {stats['skipped']}, seconds: {stats.get('seconds', 0):.1f}")
+
+
+def migrate_embeddings(args):
+    from app.services.embedding_codec import migrate_embeddings
+
+    stats = asyncio.run(migrate_embeddings(batch_size=args.batch_size))
+    print(f"Embeddings converted: {stats['converted']}, skipped (changed concurrently): {stats['skipped']}")
+
+
+def ensure_indexes(args):
+    from app.services.indexes import ensure_indexes, verify_query_plans
+
+    async def run():
+        if not args.check_only:
+            print(f"Indexes ensured: {', '.join(await ensure_indexes())}")
+        return await verify_query_plans()
+
+    problems = asyncio.run(run())
+    for problem in problems:
+        print(f"Query plan check failed: {problem}")
+    if problems:
+        sys.exit(1)
+    print("All hot queries use an index")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    backfill = commands.add_parser("backfill-profiles", help="Initialize stored interaction profile vectors")
+    backfill.add_argument("--force", action="store_true", help="Recompute profiles that already exist")
+    backfill.add_argument("--batch-size", type=int, default=500)
+    backfill.set_defaults(handler=backfill_profiles)
+
+    precompute = commands.add_parser("precompute-recommendations", help="Store top-k recommendations for every user")
+    precompute.add_argument("--top-k", type=int, default=None)
+    precompute.add_argument("--chunk-size", type=int, default=None, help="Users scored per batch")
+    precompute.set_defaults(handler=precompute_recommendations)
+
+    migrate = commands.add_parser("migrate-embeddings", help="Convert stored article embeddings to float32 binary")
+    migrate.add_argument("--batch-size", type=int, default=1000)
+    migrate.set_defaults(handler=migrate_embeddings)
+
+    indexes = commands.add_parser("ensure-indexes", help="Create the required indexes and verify the hot query plans")
+    indexes.add_argument("--check-only", action="store_true", help="Only explain the hot queries")
+    indexes.set_defaults(handler=ensure_indexes)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr, Field
 from datetime import date
-from typing import List, Optional
+from typing import List, Literal, Optional
 
 class UserCreate(BaseModel):
     name: str = Field(..., min_length=1, max_length=100, description="User's full name")
@@ -32,4 +32,9 @@ class PreferencesUpdate(BaseModel):
 class InteractionRequest(BaseModel):
     news_id: str
 
+class UserEvent(BaseModel):
+    type: Literal["interaction", "interest", "uninterest"]
+    news_id: str = Field(..., min_length=1)
 
+class UserEventBatch(BaseModel):
+    events: List[UserEvent] = Field(..., min_length=1, description="Applied in order; the last interest event per article wins")
@@ -1,14 +1,14 @@
 from fastapi import APIRouter, HTTPException, Depends
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from app.db import db
-from app.security import authenticate_user, create_access_token, get_current_user, oauth2_scheme, token_blacklist
+from app.security import authenticate_user, create_access_token, get_current_user, oauth2_scheme, revoke_token
 from app.models import LoginRequest
 
 router = APIRouter()
 
 @router.post("/login")
-def login(request: LoginRequest):
-    user = authenticate_user(request.email, request.password)
+async def login(request: LoginRequest):
+    user = await authenticate_user(request.email, request.password)
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     access_token = create_access_token(data={"sub": user["email"]})
@@ -28,10 +28,10 @@ def login(request: LoginRequest):
 #oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 @router.post("/logout")
-def logout(token: str = Depends(oauth2_scheme), current_user: dict = Depends(get_current_user)):
+async def logout(token: str = Depends(oauth2_scheme), current_user: dict = Depends(get_current_user)):
     """
-    Adds the token to a blacklist to revoke it.
+    Revokes the token until it expires.
     """
-    token_blacklist.add(token)
+    await revoke_token(token)
     return {"message": "Successfully logged out"}
 
@@ -0,0 +1,27 @@
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+from app.db import client
+
+router = APIRouter()
+
+
+@router.get("/live")
+async def live():
+    """
+    The process is up and serving requests.
+    """
+    return {"status": "ok"}
+
+
+@router.get("/ready")
+async def ready(request: Request):
+    """
+    Startup and warm-up have finished and MongoDB is reachable.
+    """
+    if not getattr(request.app.state, "ready", False):
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    try:
+        await client.admin.command("ping")
+    except Exception as e:
+        return JSONResponse(status_code=503, content={"status": "unavailable", "detail": str(e)})
+    return {"status": "ready", "articles": len(request.app.state.recommender.article_index.snapshot)}
@@ -1,35 +1,50 @@
-from fastapi import APIRouter, Depends, HTTPException
-from app.models import UserCreate, PreferencesUpdate, InteractionRequest
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pymongo.errors import DuplicateKeyError
+from app.core.config import settings
+from app.core.metrics import stage_timer
+from app.models import UserCreate, PreferencesUpdate, InteractionRequest, UserEventBatch
 from app.services.personalized_recommender import PersonalizedRecommender
+from app.services.facets import FacetFilter
+from app.services.ranked_lists import Cursor, ExpiredCursor, InvalidCursor, decode_cursor, encode_cursor, ranked_lists
+from app.services.single_flight import SingleFlight
+from app.services.event_buffer import record_user_events
+from app.services.user_profile import INTEREST, INTERACTION, UNINTEREST, profile_vector
 from app.db import db
+from app.dependencies import get_recommender
 import requests
 
-from app.security import get_current_user, get_password_hash, get_api_key
+from app.security import get_current_user, get_password_hash, invalidate_user
 
 router = APIRouter()
 
+# Duplicate first-page requests (e.g. app resume) share one ranking pass
+first_page_flights = SingleFlight("recommendations")
+
 # user Signup
 @router.post("/register", status_code=201)
-def register_user(user: UserCreate):
-    existing_user = db.user_data.find_one({"email": user.email})
-    if existing_user:
-        raise HTTPException(status_code=400, detail="Email already registered")
-    
+async def register_user(user: UserCreate):
     user_dict = {
         "name": user.name,
         "email": user.email,
-        "hashed_password": get_password_hash(user.password),
+        "hashed_password": await get_password_hash(user.password),
         "date_of_birth": user.date_of_birth.isoformat(),  # Store as ISO string
         "preferences": user.preferences,
         "interaction_list": [],  # Initially empty
         "interest_list": []  # Initially empty
     }
-    db.user_data.insert_one(user_dict)
+    # The unique email index rejects duplicates, including concurrent registrations
+    try:
+        await db.user_data.insert_one(user_dict)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already registered")
     return {"message": "User registered successfully"}
 
 # get user data
 @router.get("/")
-def get_user_details(current_user: dict = Depends(get_current_user)):
+async def get_user_details(current_user: dict = Depends(get_current_user)):
     return {
         "name": current_user["name"],
         "email": current_user["email"],
@@ -37,21 +52,52 @@ def get_user_details(current_user: dict = Depends(get_current_user)):
     }
 
 @router.get("/preferences")
-def get_preferences(current_user: dict = Depends(get_current_user)):
+async def get_preferences(current_user: dict = Depends(get_current_user)):
     #sreturn current_user
     return {"email": current_user["email"], "preferences": current_user["preferences"]}
 
 @router.put("/preferences")
-def update_preferences(preferences: PreferencesUpdate, current_user: dict = Depends(get_current_user)):
-    db.user_data.update_one(
+async def update_preferences(preferences: PreferencesUpdate, current_user: dict = Depends(get_current_user)):
+    await db.user_data.update_one(
         {"email": current_user["email"]},
-        {"$set": {"preferences": preferences.preferences}}
+        {"$set": {"preferences": preferences.preferences}, "$inc": {"profile_version": 1}}
     )
+    invalidate_user(current_user["email"])
+    ranked_lists.invalidate(current_user["email"])
     return {"message": "Preferences updated successfully"}
 
 
+async def apply_events(current_user: dict, events):
+    """
+    Write the user's events (see user_profile.apply_user_events) and drop what they make stale.
+    """
+    changes = await record_user_events(current_user, events)
+    invalidate_user(current_user["email"])
+    if changes[INTERACTION]:
+        ranked_lists.invalidate(current_user["email"])
+    return changes
+
+
+@router.post("/events")
+async def add_events(batch: UserEventBatch, current_user: dict = Depends(get_current_user)):
+    """
+    Apply many interaction, interest and un-interest events in one request and one write.
+    Returns the news IDs each event type actually changed.
+    """
+    if len(batch.events) > settings.max_events_per_request:
+        raise HTTPException(
+            status_code=413, detail=f"At most {settings.max_events_per_request} events per request"
+        )
+    changes = await apply_events(current_user, [(event.type, event.news_id) for event in batch.events])
+    return {
+        "interactions_added": changes[INTERACTION],
+        "interests_added": changes[INTEREST],
+        "interests_removed": changes[UNINTEREST],
+    }
+
+
 @router.post("/add-interaction")
-def add_interaction(request: InteractionRequest, current_user: dict = Depends(get_current_user)):
+async def add_interaction(request: InteractionRequest, current_user: dict = Depends(get_current_user)):
     """
     Add a news ID to the user's interaction list.
     """
@@ -59,20 +105,18 @@ def add_interaction(request: InteractionRequest, current_user: dict = Depends(ge
     if not news_id:
         raise HTTPException(status_code=400, detail="News ID is required")
 
-    result = db.user_data.update_one(
-        {"email": current_user["email"]},
-        {"$addToSet": {"interaction_list": news_id}}
-    )
+    # Updates the interaction list and the running profile vector together
+    changes = await apply_events(current_user, [(INTERACTION, news_id)])
 
     # Check if the ID was added or already exists
-    if result.modified_count == 1:
+    if changes[INTERACTION]:
         return {"message": f"News ID {news_id} added to interaction list"}
     else:
         return {"message": f"News ID {news_id} already exists in the interaction list"}
     
     
 @router.post("/add-interest")
-def add_interest(request: InteractionRequest, current_user: dict = Depends(get_current_user)):
+async def add_interest(request: InteractionRequest, current_user: dict = Depends(get_current_user)):
     """
     Add a news ID to the user's interest list.
     """
@@ -81,20 +125,17 @@ def add_interest(request: InteractionRequest, current_user: dict = Depends(get_c
         raise HTTPException(status_code=400, detail="News ID is required")
 
     # Add the news ID to the user's interest list
-    result = db.user_data.update_one(
-        {"email": current_user["email"]},
-        {"$addToSet": {"interest_list": news_id}}
-    )
+    changes = await apply_events(current_user, [(INTEREST, news_id)])
 
     # Check if the ID was added or already exists
-    if result.modified_count == 1:
+    if changes[INTEREST]:
         return {"message": f"News ID {news_id} added to interest list"}
     else:
         return {"message": f"News ID {news_id} already exists in the interest list"}
     
 
 @router.delete("/delete-interest")
-def delete_interest(request: InteractionRequest, current_user: dict = Depends(get_current_user)):
+async def delete_interest(request: InteractionRequest, current_user: dict = Depends(get_current_user)):
     """
     Delete a news ID from the user's interest list.
     """
@@ -103,27 +144,26 @@ def delete_interest(request: InteractionRequest, current_user: dict = Depends(ge
         raise HTTPException(status_code=400, detail="News ID is required")
 
     # Remove the news ID from the user's interest list
-    result = db.user_data.update_one(
-        {"email": current_user["email"]},
-        {"$pull": {"interest_list": news_id}}
-    )
+    changes = await apply_events(current_user, [(UNINTEREST, news_id)])
 
     # Check if the ID was successfully removed
-    if result.modified_count == 1:
+    if changes[UNINTEREST]:
         return {"message": f"News ID {news_id} removed from interest list"}
     else:
         raise HTTPException(status_code=404, detail="News ID not found in interest list")
 
 
 @router.delete("/delete/{email}")
-def delete_user_by_email(email: str):#, current_user: dict = Depends(get_current_user)):
+async def delete_user_by_email(email: str):#, current_user: dict = Depends(get_current_user)):
     """
     Admin can delete a user by email.
     """
     #if not current_user.get("is_admin", False):
     #    raise HTTPException(status_code=403, detail="Permission denied")
 
-    result = db.user_data.delete_one({"email": email})
+    result = await db.user_data.delete_one({"email": email})
+    invalidate_user(email)
+    ranked_lists.invalidate(email)
 
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
@@ -131,30 +171,134 @@ def delete_user_by_email(email: str):#, current_user: dict = Depends(get_current
     return {"message": f"User with email {email} deleted successfully"}
 
 
+async def rank_for_user(recommender: PersonalizedRecommender, user: dict, preferences: str, options: dict):
+    """
+    The user's ranked list for the given ranking options (see `get_recommendations`).
+    """
+    facets = FacetFilter.build(**options["facets"]) if options.get("facets") else None
+    # Serve the batch-computed list while it matches the user's current profile,
+    # otherwise call the recommender system. The batch list is unfiltered, so filtered
+    # requests are always scored live.
+    ranked = None
+    if facets is None:
+        ranked = recommender.precomputed_recommendations(
+            user, options["depth"], options["diversify"], options["diversity"], options["dedupe"]
+        )
+    if ranked is None:
+        ranked = await recommender.recommend(
+            preferences, user.get("interaction_list", []), options["depth"], interaction_profile=profile_vector(user),
+            diversify=options["diversify"], diversity=options["diversity"], pool_size=options["pool_size"],
+            dedupe=options["dedupe"], user=user, facets=facets,
+        )
+    return ranked
+
+
+async def rank_first_page(recommender: PersonalizedRecommender, user: dict, preferences: str, limit: int,
+                          options: dict):
+    """
+    Rank `options["depth"]` articles for the user and keep them behind a cursor.
+    Returns the first page and the cursor of the next one.
+    """
+    ranked = await rank_for_user(recommender, user, preferences, options)
+    next_cursor = None
+    if len(ranked) > limit:
+        session = ranked_lists.start(
+            user["email"], user.get("profile_version"),
+            [item["_id"] for item in ranked], [item["similarity"] for item in ranked], options,
+        )
+        next_cursor = encode_cursor(Cursor(session, limit, user.get("profile_version"), options))
+    return ranked[:limit], next_cursor
+
+
+async def rerank_session(recommender: PersonalizedRecommender, user: dict, preferences: str, cursor: Cursor):
+    """
+    Rank the list behind `cursor` again, under its session id, for cursors whose list is not
+    cached here: ranked by another worker, expired or evicted.
+    """
+    ranked = await rank_for_user(recommender, user, preferences, cursor.options)
+    ranked_lists.start(
+        user["email"], cursor.version,
+        [item["_id"] for item in ranked], [item["similarity"] for item in ranked], cursor.options, cursor.session,
+    )
+
+
 @router.get("/recommendations")
-def get_recommendations(limit: int = 10, current_user: dict = Depends(get_current_user)):
+async def get_recommendations(
+    limit: int = Query(10, ge=1, le=settings.max_page_size, description="Recommendations per page"),
+    diversify: bool = False,
+    diversity: Optional[float] = Query(None, ge=0, le=1, description="0 = relevance only, 1 = novelty only"),
+    pool_size: Optional[int] = Query(None, ge=1, le=5000, description="Candidates considered for diversification"),
+    dedupe: bool = Query(True, description="Drop near-duplicates listed in top_5_similar"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    category: Optional[List[str]] = Query(None, description="Only these categories (repeatable)"),
+    exclude_category: Optional[List[str]] = Query(None, description="Never these categories (repeatable)"),
+    domain: Optional[List[str]] = Query(None, description="Only these source domains (repeatable)"),
+    exclude_domain: Optional[List[str]] = Query(None, description="Never these source domains (repeatable)"),
+    sentiment: Optional[List[str]] = Query(None, description="Only these sentiments (repeatable)"),
+    exclude_sentiment: Optional[List[str]] = Query(None, description="Never these sentiments (repeatable)"),
+    current_user: dict = Depends(get_current_user),
+    recommender: PersonalizedRecommender = Depends(get_recommender),
+):
     """
     Fetch personalized recommendations for the authenticated user.
+    The first page ranks `ranked_list_depth` articles and returns a `next_cursor`; passing it back
+    serves the next slice of that same ranking without rescoring. Ranking options and facet
+    filters only apply to the first page; the following pages are slices of its filtered ranking.
     """
-    # Fetch user data from the database
-    user = db.user_data.find_one({"email": current_user["email"]})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    embedding_model = "models/text-embedding-004"
-    recommender = PersonalizedRecommender(get_api_key(), embedding_model)
+    # get_current_user already loaded the full user document
+    user = current_user
 
     preferences = " ".join(current_user["preferences"])  # Convert list into comma-separated string
-    interaction_data = user.get("interaction_list", [])
     interest_list = set(user.get("interest_list", []))  # Convert interest list to a set for faster lookups
 
-    # Call the recommender system
-    recommendations = recommender.recommend(preferences, interaction_data, limit)
-
-    # Add the "is_interested" field for each recommendation
-    for news_item in recommendations:
-        news_item["is_interested"] = news_item.get("_id") in interest_list
+    if cursor:
+        try:
+            position = decode_cursor(cursor)
+        except InvalidCursor:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if position.version != user.get("profile_version"):
+            raise HTTPException(status_code=410, detail="Cursor expired, request the first page again")
+        try:
+            ids, scores, next_cursor = ranked_lists.page(user["email"], position.version, position, limit)
+        except InvalidCursor:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        except ExpiredCursor:
+            # The ranking is deterministic for a profile version, so rank it again and slice
+            await first_page_flights.do(
+                ("cursor", user["email"], position.version, position.session),
+                lambda: rerank_session(recommender, user, preferences, position),
+            )
+            try:
+                ids, scores, next_cursor = ranked_lists.page(user["email"], position.version, position, limit)
+            except InvalidCursor:
+                # The collection changed since the cursor was issued and the list ends earlier
+                ids, scores, next_cursor = [], [], None
+        recommendations = recommender.article_index.hydrate(ids, scores)
+    else:
+        facets = FacetFilter.build(
+            {"category": category, "domain": domain, "sentiment": sentiment},
+            {"category": exclude_category, "domain": exclude_domain, "sentiment": exclude_sentiment},
+        )
+        # Rank deeper than one page so the following pages are slices of this ranking
+        options = {
+            "depth": max(limit, settings.ranked_list_depth), "diversify": diversify, "diversity": diversity,
+            "pool_size": pool_size, "dedupe": dedupe, "facets": facets.as_dict() if facets else None,
+        }
+        # Concurrent identical requests of the same user and profile version share one ranking
+        # (and cursor) instead of each scoring the collection
+        key = (user["email"], user.get("profile_version"), preferences, limit, diversify, diversity, pool_size, dedupe,
+               facets)
+        recommendations, next_cursor = await first_page_flights.do(key, lambda: rank_first_page(
+            recommender, user, preferences, limit, options,
+        ))
 
+    # Add the "is_interested" field for each recommendation, on copies since coalesced
+    # requests share the page
+    recommendations = [
+        {**news_item, "is_interested": news_item.get("_id") in interest_list} for news_item in recommendations
+    ]
 
-    return {"recommendations": recommendations}
+    # Serialized here rather than by FastAPI so the time shows up as its own stage
+    with stage_timer("serialization"):
+        return JSONResponse(jsonable_encoder({"recommendations": recommendations, "next_cursor": next_cursor}))
 
@@ -1,51 +1,139 @@
 from jose import jwt, JWTError
-from passlib.context import CryptContext
 from fastapi import HTTPException, Depends
 from fastapi.security import OAuth2PasswordBearer
 from datetime import datetime, timedelta
+import hashlib
+import time
+import uuid
 from app.core.config import settings
+from app.core.metrics import register_cache, stage_timer
 from app.db import db
+from app.services.cache import TTLCache
+from app.services.password_hasher import PasswordHasher, PasswordHasherBusy
+from app.services.revocation import RevocationStore, InMemoryRevocationStore, MongoRevocationStore
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+password_hasher = PasswordHasher(
+    rounds=settings.bcrypt_rounds,
+    workers=settings.password_hash_workers,
+    max_pending=settings.password_hash_max_pending,
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
-# Example token blacklist for revoked tokens
-token_blacklist = set()
+def build_revocation_store() -> RevocationStore:
+    if settings.revocation_backend == "mongo":
+        store = MongoRevocationStore(
+            db[settings.revocation_collection], negative_ttl=settings.revocation_negative_cache_seconds
+        )
+        register_cache("revocation_negative", store.not_revoked)
+        return store
+    return InMemoryRevocationStore()
 
-def get_password_hash(password: str):
-    return pwd_context.hash(password)
+# Revoked token ids, kept only until the tokens expire
+revocation_store = build_revocation_store()
 
-def verify_password(plain_password: str, hashed_password: str):
-    return pwd_context.verify(plain_password, hashed_password)
+# Per-process caches for the auth hot path: decoded token -> email, and email -> user document.
+# Writes to a user go through invalidate_user(); other workers see them after the TTL at most.
+token_cache = TTLCache(settings.user_cache_size, settings.user_cache_ttl_seconds)
+user_cache = TTLCache(settings.user_cache_size, settings.user_cache_ttl_seconds)
+register_cache("token", token_cache)
+register_cache("user", user_cache)
 
-def authenticate_user(email: str, password: str):
-    user = db.user_data.find_one({"email": email})
-    if user and verify_password(password, user["hashed_password"]):
+def invalidate_user(email: str):
+    user_cache.pop(email)
+
+# bcrypt is deliberately slow CPU work; it runs in a bounded process pool
+def _hasher_busy():
+    return HTTPException(
+        status_code=503, detail="Server is busy, please retry", headers={"Retry-After": "1"}
+    )
+
+async def get_password_hash(password: str):
+    try:
+        return await password_hasher.hash(password)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
+
+async def verify_password(plain_password: str, hashed_password: str):
+    try:
+        with stage_timer("password_verify"):
+            return await password_hasher.verify(plain_password, hashed_password)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
+
+async def authenticate_user(email: str, password: str):
+    user = await db.user_data.find_one({"email": email})
+    if user and await verify_password(password, user["hashed_password"]):
+        if password_hasher.needs_rehash(user["hashed_password"]):
+            await rehash_password(user, password)
         return user
     return None
 
+async def rehash_password(user: dict, password: str):
+    """
+    Upgrade a stored hash to the configured bcrypt cost after a successful login.
+    """
+    try:
+        new_hash = await password_hasher.hash(password)
+    except PasswordHasherBusy:
+        return  # Not urgent; the next login will retry
+    await db.user_data.update_one(
+        {"_id": user["_id"], "hashed_password": user["hashed_password"]},
+        {"$set": {"hashed_password": new_hash}}
+    )
+    invalidate_user(user["email"])
+
 def create_access_token(data: dict):
-    print(settings.secret_key)
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=settings.access_token_expire_minutes)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     return jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
-    if token in token_blacklist:
-        raise HTTPException(status_code=401, detail="Token has been revoked")
-    
+def decode_token(token: str) -> dict:
+    """
+    Verify the token and return its `sub`, `jti` and `exp` claims, cached until the token expires.
+    Tokens issued without a `jti` are identified by their hash.
+    """
+    claims = token_cache.get(token)
+    if claims is not None:
+        return claims
     try:
         payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
-        email: str = payload.get("sub")
-        if email is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        user = db.user_data.find_one({"email": email})
-        if user is None:
-            raise HTTPException(status_code=404, detail="User not found")
-        return user
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
+    if payload.get("sub") is None:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    claims = {
+        "sub": payload["sub"],
+        "jti": payload.get("jti") or hashlib.sha256(token.encode("utf-8")).hexdigest(),
+        "exp": payload.get("exp", 0),
+    }
+    ttl = min(settings.user_cache_ttl_seconds, claims["exp"] - time.time())
+    if ttl > 0:
+        token_cache.set(token, claims, ttl=ttl)
+    return claims
+
+async def revoke_token(token: str):
+    claims = decode_token(token)
+    await revocation_store.revoke(claims["jti"], claims["exp"])
+
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    """
+    The full user document for the bearer token. Served from the per-process cache when
+    possible; callers must treat it as read-only.
+    """
+    with stage_timer("get_current_user"):
+        claims = decode_token(token)
+        if await revocation_store.is_revoked(claims["jti"]):
+            raise HTTPException(status_code=401, detail="Token has been revoked")
+
+        email = claims["sub"]
+        user = user_cache.get(email)
+        if user is None:
+            user = await db.user_data.find_one({"email": email})
+            if user is None:
+                raise HTTPException(status_code=404, detail="User not found")
+            user_cache.set(email, user)
+        return user
 
 def get_api_key():
     return settings.genai_api_key
\ No newline at end of file
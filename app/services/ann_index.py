@@ -0,0 +1,285 @@
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """
+    Return a C-contiguous float32 copy of `vectors` with unit-length rows.
+    """
+    vectors = np.array(vectors, dtype=np.float32, ndmin=2, order="C")
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    vectors /= norms
+    return vectors
+
+
+def spherical_kmeans(vectors: np.ndarray, n_clusters: int, n_iter: int = 20, seed: int = 0,
+                     chunk_size: int = 65536) -> np.ndarray:
+    """
+    Cluster unit vectors by cosine similarity and return unit-length centroids.
+    """
+    rng = np.random.default_rng(seed)
+    n_clusters = min(n_clusters, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+
+    for _ in range(n_iter):
+        assignment = assign_to_centroids(vectors, centroids, chunk_size)
+
+        # Sum the members of each cluster with one reduceat over the sorted assignment
+        order = np.argsort(assignment, kind="stable")
+        sorted_assignment = assignment[order]
+        starts = np.flatnonzero(np.r_[True, sorted_assignment[1:] != sorted_assignment[:-1]])
+        sums = np.add.reduceat(vectors[order], starts, axis=0)
+
+        updated = np.zeros_like(centroids)
+        updated[sorted_assignment[starts]] = sums
+
+        # Re-seed empty clusters with random points so every list stays usable
+        empty = np.flatnonzero(~np.isin(np.arange(n_clusters), sorted_assignment[starts]))
+        if len(empty):
+            updated[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+
+        centroids = normalize_rows(updated)
+
+    return centroids
+
+
+def assign_to_centroids(vectors: np.ndarray, centroids: np.ndarray, chunk_size: int = 65536) -> np.ndarray:
+    """
+    Index of the most similar centroid for every row, computed in bounded-memory chunks.
+    """
+    assignment = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), chunk_size):
+        block = vectors[start:start + chunk_size]
+        assignment[start:start + chunk_size] = np.argmax(block @ centroids.T, axis=1)
+    return assignment
+
+
+class IVFIndex:
+    """
+    Inverted-file approximate nearest-neighbour index for cosine similarity. A query scores
+    the members of its `n_probe` closest k-means lists; `n_probe == n_lists` is exact.
+    """
+    def __init__(self, dim: int, n_lists: int = 0, n_probe: int = 8):
+        self.dim = dim
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.centroids: Optional[np.ndarray] = None
+        self.ids: List[Optional[str]] = []
+        self._id_to_row: Dict[str, int] = {}
+        self._row_list: Dict[int, int] = {}
+        self._list_rows: List[np.ndarray] = []
+        self._list_vectors: List[np.ndarray] = []
+
+    def __len__(self) -> int:
+        return len(self._id_to_row)
+
+    def __contains__(self, news_id: str) -> bool:
+        return news_id in self._id_to_row
+
+    def indexed_ids(self) -> List[str]:
+        return list(self._id_to_row)
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def build(self, vectors: np.ndarray, ids: Sequence[str], n_iter: int = 20,
+              sample_size: int = 100000, seed: int = 0) -> "IVFIndex":
+        """
+        Train the coarse quantizer on (a sample of) `vectors` and index all of them.
+        """
+        vectors = normalize_rows(vectors) if len(vectors) else np.zeros((0, self.dim), dtype=np.float32)
+        if not self.n_lists:
+            # Common IVF rule of thumb: about sqrt(N) lists
+            self.n_lists = max(1, int(np.sqrt(len(vectors))))
+
+        if len(vectors):
+            rng = np.random.default_rng(seed)
+            sample = vectors if len(vectors) <= sample_size else vectors[rng.choice(len(vectors), sample_size, replace=False)]
+            self.centroids = spherical_kmeans(sample, self.n_lists, n_iter=n_iter, seed=seed)
+            self.n_lists = len(self.centroids)
+            assignment = assign_to_centroids(vectors, self.centroids)
+        else:
+            self.centroids = np.zeros((0, self.dim), dtype=np.float32)
+            self.n_lists = 0
+            assignment = np.zeros(0, dtype=np.int32)
+
+        self.ids = list(ids)
+        self._id_to_row = {news_id: row for row, news_id in enumerate(self.ids)}
+        self._fill_lists(vectors, np.arange(len(vectors)), assignment)
+        return self
+
+    def _fill_lists(self, vectors: np.ndarray, rows: np.ndarray, assignment: np.ndarray):
+        order = np.argsort(assignment, kind="stable")
+        bounds = np.searchsorted(assignment[order], np.arange(self.n_lists + 1))
+        self._list_rows = [rows[order[bounds[i]:bounds[i + 1]]] for i in range(self.n_lists)]
+        self._list_vectors = [vectors[order[bounds[i]:bounds[i + 1]]] for i in range(self.n_lists)]
+        self._row_list = {int(row): int(list_no) for row, list_no in zip(rows, assignment)}
+
+    def add(self, vectors: np.ndarray, ids: Sequence[str]):
+        """
+        Insert or update vectors without retraining the quantizer.
+        """
+        if not self.is_trained or self.n_lists == 0:
+            raise RuntimeError("IVFIndex must be built before vectors can be added")
+        if len(ids) == 0:
+            return
+
+        vectors = normalize_rows(vectors)
+        assignment = assign_to_centroids(vectors, self.centroids)
+        self.remove([news_id for news_id in ids if news_id in self._id_to_row])
+
+        start = len(self.ids)
+        new_rows = np.arange(start, start + len(ids))
+        for offset, news_id in enumerate(ids):
+            self.ids.append(news_id)
+            self._id_to_row[news_id] = start + offset
+            self._row_list[start + offset] = int(assignment[offset])
+
+        for list_no in np.unique(assignment):
+            members = assignment == list_no
+            self._list_rows[list_no] = np.concatenate([self._list_rows[list_no], new_rows[members]])
+            self._list_vectors[list_no] = np.concatenate([self._list_vectors[list_no], vectors[members]])
+
+    def copy(self) -> "IVFIndex":
+        """
+        Independent index sharing the (never modified in place) per-list arrays, so
+        `add`/`remove` on the copy leave this one untouched.
+        """
+        index = IVFIndex(self.dim, self.n_lists, self.n_probe)
+        index.centroids = self.centroids
+        index.ids = list(self.ids)
+        index._id_to_row = dict(self._id_to_row)
+        index._row_list = dict(self._row_list)
+        index._list_rows = list(self._list_rows)
+        index._list_vectors = list(self._list_vectors)
+        return index
+
+    def remove(self, ids: Iterable[str]):
+        """
+        Drop vectors from the index. Row numbers of removed ids are not reused.
+        """
+        removed = {}
+        for news_id in ids:
+            row = self._id_to_row.pop(news_id, None)
+            if row is not None:
+                self.ids[row] = None
+                removed.setdefault(self._row_list.pop(row), []).append(row)
+        for list_no, rows in removed.items():
+            keep = ~np.isin(self._list_rows[list_no], rows)
+            self._list_rows[list_no] = self._list_rows[list_no][keep]
+            self._list_vectors[list_no] = self._list_vectors[list_no][keep]
+
+    def search(self, query: np.ndarray, k: int, n_probe: Optional[int] = None) -> Tuple[List[str], np.ndarray]:
+        """
+        Approximate top-k ids by cosine similarity to `query`, best first, with their scores.
+        """
+        if k <= 0 or len(self) == 0:
+            return [], np.zeros(0, dtype=np.float32)
+
+        query = normalize_rows(query)[0]
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+        centroid_scores = self.centroids @ query
+        probes = np.argpartition(-centroid_scores, n_probe - 1)[:n_probe]
+
+        rows = np.concatenate([self._list_rows[list_no] for list_no in probes])
+        if len(rows) == 0:
+            return [], np.zeros(0, dtype=np.float32)
+        scores = np.concatenate([self._list_vectors[list_no] @ query for list_no in probes])
+
+        k = min(k, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [self.ids[row] for row in rows[top]], scores[top]
+
+    def packed(self) -> Tuple[np.ndarray, List[str], np.ndarray]:
+        """
+        The lists laid out back to back: the n_lists + 1 list boundaries, then the ids and the
+        vectors of the members in that order.
+        """
+        bounds = np.zeros(self.n_lists + 1, dtype=np.int64)
+        np.cumsum([len(rows) for rows in self._list_rows], out=bounds[1:])
+        ids = [self.ids[row] for rows in self._list_rows for row in rows]
+        vectors = np.concatenate(self._list_vectors) if self._list_vectors else np.zeros((0, self.dim), dtype=np.float32)
+        return bounds, ids, vectors
+
+    @classmethod
+    def from_packed(cls, centroids: np.ndarray, bounds: np.ndarray, ids: List[str], vectors: np.ndarray,
+                    n_probe: int = 8) -> "IVFIndex":
+        """
+        Index over lists laid out as by `packed`. The lists are views of `vectors`, which may
+        be a read-only mapping; `add`/`remove` replace lists rather than writing to them.
+        """
+        index = cls(centroids.shape[1], len(centroids), n_probe)
+        index.centroids = centroids
+        index.ids = list(ids)
+        index._id_to_row = {news_id: row for row, news_id in enumerate(index.ids)}
+        index._list_rows = [np.arange(bounds[i], bounds[i + 1]) for i in range(index.n_lists)]
+        index._list_vectors = [vectors[bounds[i]:bounds[i + 1]] for i in range(index.n_lists)]
+        index._row_list = dict(zip(range(len(index.ids)), np.repeat(np.arange(index.n_lists), np.diff(bounds)).tolist()))
+        return index
+
+    def save(self, path: str):
+        """
+        Persist the index to a single .npz file at exactly `path`, replacing it atomically.
+        """
+        rows = np.concatenate(self._list_rows) if self._list_rows else np.zeros(0, dtype=np.int64)
+        vectors = np.concatenate(self._list_vectors) if self._list_vectors else np.zeros((0, self.dim), dtype=np.float32)
+        assignment = np.repeat(np.arange(self.n_lists, dtype=np.int32), [len(r) for r in self._list_rows])
+        # Written through a file object so numpy does not append ".npz" to the name
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                centroids=self.centroids,
+                vectors=vectors,
+                assignment=assignment,
+                ids=np.array([self.ids[row] for row in rows], dtype=str),
+                params=np.array([self.dim, self.n_lists, self.n_probe], dtype=np.int64),
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        with np.load(path, allow_pickle=False) as data:
+            dim, n_lists, n_probe = (int(value) for value in data["params"])
+            index = cls(dim, n_lists, n_probe)
+            index.centroids = data["centroids"]
+            vectors = data["vectors"]
+            assignment = data["assignment"]
+            index.ids = data["ids"].tolist()
+        index._id_to_row = {news_id: row for row, news_id in enumerate(index.ids)}
+        index._fill_lists(vectors, np.arange(len(vectors)), assignment)
+        return index
+
+
+def benchmark_recall(index: IVFIndex, vectors: np.ndarray, queries: np.ndarray, k: int = 10,
+                     n_probes: Sequence[int] = (1, 2, 4, 8, 16, 32)) -> List[Dict]:
+    """
+    Compare `index` against exact cosine search over `vectors` (aligned with index.ids).
+    Returns recall@k and mean query latency for each n_probe setting.
+    """
+    vectors = normalize_rows(vectors)
+    queries = normalize_rows(queries)
+    exact_scores = queries @ vectors.T
+    exact = np.argpartition(-exact_scores, k - 1, axis=1)[:, :k]
+    exact_ids = [{index.ids[row] for row in rows} for rows in exact]
+
+    results = []
+    for n_probe in n_probes:
+        hits = 0
+        started = time.perf_counter()
+        found = [index.search(query, k, n_probe=n_probe)[0] for query in queries]
+        elapsed = time.perf_counter() - started
+        for expected, ids in zip(exact_ids, found):
+            hits += len(expected.intersection(ids))
+        results.append({
+            "n_probe": min(n_probe, index.n_lists),
+            "recall_at_k": hits / (k * len(queries)),
+            "mean_latency_ms": 1000 * elapsed / len(queries),
+        })
+    return results
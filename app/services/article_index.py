@@ -0,0 +1,485 @@
+import asyncio
+import fcntl
+import logging
+import os
+import time
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import registry, stage_timer
+from app.services.ann_index import IVFIndex
+from app.services.diversity import drop_near_duplicates, mmr, similar_ids
+from app.services.embedding_codec import is_empty_embedding
+from app.services.facets import FacetFilter, FacetIndex
+from app.services.quantization import QuantizedMatrix, quantize_rows
+from app.services.recency import publication_timestamp, recency_blend, window_cutoff
+from app.services.fetch_news import NewsFetcher
+
+logger = logging.getLogger(__name__)
+
+# How many more ANN candidates to fetch when the window, recency or a facet filter may reorder or drop them
+ANN_RECENCY_OVERSAMPLE = 4
+# Facet filters matching less than this share of the window score only the matching rows;
+# broader ones score the whole window and mask the rest out
+FACET_SUBSET_FRACTION = 0.5
+# Matching rows gathered and scored at a time, so each gathered block is still in cache when scored
+FACET_SUBSET_BLOCK_ROWS = 256
+
+ARTICLE_INDEX_SIZE = registry.gauge("article_index_articles", "Articles in the current in-memory index snapshot")
+ARTICLE_INDEX_BUILD_SECONDS = registry.histogram(
+    "article_index_build_seconds", "Time to build or update the article index snapshot", ["kind"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+
+
+class ArticleSnapshot:
+    """
+    Immutable view of the indexed articles: L2-normalized float32 embeddings aligned with
+    `ids`, `metadata`, `published` and `facets`, oldest first so any publication window is a
+    block of trailing rows. `quantized` is the optional int8 copy of `matrix`.
+    """
+    def __init__(self, matrix: np.ndarray, ids: List[str], metadata: List[Dict], published: np.ndarray,
+                 quantized: Optional[QuantizedMatrix] = None, facets: Optional[FacetIndex] = None):
+        self.matrix = matrix
+        self.ids = ids
+        self.metadata = metadata
+        self.published = published
+        self.quantized = quantized
+        self.facets = facets if facets is not None else FacetIndex.from_metadata(metadata)
+        self.id_to_row = {news_id: row for row, news_id in enumerate(ids)}
+        self.built_at = time.monotonic()
+        self.ann: Optional[IVFIndex] = None
+        self._neighbours: Dict[int, frozenset] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def window_start(self, cutoff: Optional[float]) -> int:
+        """
+        First row published at or after `cutoff`; 0 without a cutoff.
+        """
+        if cutoff is None:
+            return 0
+        return int(np.searchsorted(self.published, cutoff, side="left"))
+
+    def neighbours(self, row: int) -> frozenset:
+        """
+        Ids listed in the article's `top_5_similar`, parsed once per snapshot.
+        """
+        similar = self._neighbours.get(row)
+        if similar is None:
+            similar = self._neighbours[row] = frozenset(similar_ids(self.metadata[row].get("top_5_similar")))
+        return similar
+
+    def quantized_rows(self, rows: np.ndarray):
+        """
+        int8 codes and scales of `rows`, quantized on the fly without a quantized copy.
+        """
+        if self.quantized is not None:
+            return self.quantized.codes[rows], self.quantized.scales[rows]
+        return quantize_rows(self.matrix[rows])
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[Dict]) -> "ArticleSnapshot":
+        """
+        Build a snapshot from serialized news documents carrying an 'embedding' field.
+        """
+        ids, metadata, vectors, published = [], [], [], []
+        for doc in documents:
+            embedding = doc.pop("embedding", None)
+            if is_empty_embedding(embedding):
+                continue
+            doc.pop("text", None)
+            ids.append(str(doc["_id"]))
+            metadata.append(doc)
+            vectors.append(np.asarray(embedding, dtype=np.float32))
+            published.append(publication_timestamp(doc.get("publication_date")))
+
+        if not vectors:
+            return cls(np.zeros((0, 0), dtype=np.float32), [], [], np.zeros(0))
+
+        order = np.argsort(published, kind="stable")
+        matrix = np.ascontiguousarray(np.vstack([vectors[row] for row in order]), dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+        return cls(matrix, [ids[row] for row in order], [metadata[row] for row in order],
+                   np.asarray(published)[order],
+                   QuantizedMatrix.from_matrix(matrix) if settings.quantized_scoring else None)
+
+    def with_changes(self, documents: Iterable[Dict], deleted_ids: Iterable[str],
+                     cutoff: Optional[float] = None) -> "ArticleSnapshot":
+        """
+        A new snapshot with `documents` inserted or replaced and `deleted_ids` removed, also
+        dropping articles published before `cutoff` (those that aged out of the window).
+        This snapshot is left untouched, so readers holding it are never affected.
+        """
+        changes = ArticleSnapshot.from_documents(documents)
+        # Changed articles are sorted oldest first too, so those outside the window lead
+        first_new = changes.window_start(cutoff)
+        removed = set(deleted_ids).union(changes.ids, self.ids[:self.window_start(cutoff)])
+        keep = np.array([row for row, news_id in enumerate(self.ids) if news_id not in removed], dtype=np.int64)
+        new = np.arange(first_new, len(changes), dtype=np.int64)
+
+        if len(new) and len(keep) and changes.matrix.shape[1] != self.matrix.shape[1]:
+            raise ValueError("Embedding dimension of changed articles does not match the index")
+
+        # Merge both sides by publication time, gathering straight into the new matrix
+        order = np.argsort(np.concatenate([self.published[keep], changes.published[new]]), kind="stable")
+        from_self = order < len(keep)
+        self_rows, changed_rows = keep[order[from_self]], new[order[~from_self] - len(keep)]
+        dim = self.matrix.shape[1] if len(keep) else changes.matrix.shape[1] if len(new) else 0
+        matrix = np.empty((len(order), dim), dtype=np.float32)
+        if len(keep):
+            matrix[from_self] = self.matrix[self_rows]
+        if len(new):
+            matrix[~from_self] = changes.matrix[changed_rows]
+
+        quantized = None
+        if settings.quantized_scoring:
+            quantized = QuantizedMatrix(np.empty(matrix.shape, dtype=np.int8), np.empty(len(order), dtype=np.float32))
+            if len(keep):
+                quantized.codes[from_self], quantized.scales[from_self] = self.quantized_rows(self_rows)
+            if len(new):
+                quantized.codes[~from_self], quantized.scales[~from_self] = changes.quantized_rows(changed_rows)
+
+        def merged(own, changed):
+            return [own[keep[position]] if position < len(keep) else changed[new[position - len(keep)]]
+                    for position in order]
+
+        snapshot = ArticleSnapshot(
+            matrix, merged(self.ids, changes.ids), merged(self.metadata, changes.metadata),
+            np.concatenate([self.published[keep], changes.published[new]])[order], quantized,
+            self.facets.merge(self_rows, changes.facets, changed_rows, from_self),
+        )
+
+        if self.ann is not None:
+            snapshot.ann = self.ann.copy()
+            snapshot.ann.remove(removed)
+            snapshot.ann.add(changes.matrix[new], changes.ids[first_new:])
+        return snapshot
+
+
+class ArticleIndex:
+    """
+    Process-resident index over every valid article in the news collection.
+    Scoring is a single matrix-vector product followed by an argpartition top-K.
+    """
+    def __init__(self, news_fetcher: Optional[NewsFetcher] = None, refresh_seconds: Optional[int] = None):
+        self.news_fetcher = news_fetcher or NewsFetcher()
+        self.refresh_seconds = settings.article_index_refresh_seconds if refresh_seconds is None else refresh_seconds
+        self._snapshot: Optional[ArticleSnapshot] = None
+        self._build_lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+        # Set while a live refresher keeps the snapshot current; periodic full rebuilds are skipped
+        self.live_updates = False
+
+    @property
+    def snapshot(self) -> ArticleSnapshot:
+        """
+        The current snapshot; an empty one until the index has been loaded.
+        """
+        return self._snapshot or ArticleSnapshot.from_documents([])
+
+    async def build(self) -> ArticleSnapshot:
+        """
+        Load the full collection and atomically replace the current snapshot.
+        Matrix and ANN construction run in a worker thread to keep the event loop free.
+        """
+        cutoff = window_cutoff()
+        with ARTICLE_INDEX_BUILD_SECONDS.time(kind="full"):
+            documents = [doc async for doc in self.news_fetcher.iter_all_news(published_after=cutoff)]
+            snapshot = await asyncio.to_thread(self._build_snapshot, documents)
+        self._snapshot = snapshot
+        ARTICLE_INDEX_SIZE.set(len(snapshot))
+        if cutoff is not None and not len(snapshot) and await self.news_fetcher.has_news():
+            logger.warning("No article was published in the last %s days, or their publication_date has an "
+                           "unsupported format; recommendations fall back to the trending list",
+                           settings.recency_window_days)
+        return snapshot
+
+    async def apply_changes(self, documents: List[Dict], deleted_ids: Iterable[str] = ()) -> ArticleSnapshot:
+        """
+        Insert, replace or remove individual articles without reloading the collection;
+        articles that aged out of the publication window are evicted along the way.
+        The new snapshot is built off the event loop and swapped in with a single assignment,
+        so concurrent searches see either the old or the new snapshot, never a partial one.
+        """
+        deleted_ids = list(deleted_ids)
+        async with self._build_lock:
+            if self._snapshot is None:
+                return await self.build()
+            with ARTICLE_INDEX_BUILD_SECONDS.time(kind="incremental"):
+                snapshot = await asyncio.to_thread(self._snapshot.with_changes, documents, deleted_ids, window_cutoff())
+            self._snapshot = snapshot
+        ARTICLE_INDEX_SIZE.set(len(snapshot))
+        return snapshot
+
+    async def use_snapshot(self, snapshot: ArticleSnapshot, replaces: Optional[ArticleSnapshot] = None,
+                           build_ann: bool = False) -> bool:
+        """
+        Install a snapshot built elsewhere, such as one mapped from the shared article matrix.
+        With `replaces`, only while that is still the current snapshot, so a newer update is
+        never undone. Returns whether the snapshot was installed.
+        """
+        if build_ann and settings.ann_enabled and len(snapshot):
+            snapshot.ann = await asyncio.to_thread(self._build_ann, snapshot, False)
+        async with self._build_lock:
+            if replaces is not None and self._snapshot is not replaces:
+                return False
+            self._snapshot = snapshot
+        ARTICLE_INDEX_SIZE.set(len(snapshot))
+        return True
+
+    def _build_snapshot(self, documents: List[Dict]) -> ArticleSnapshot:
+        snapshot = ArticleSnapshot.from_documents(documents)
+        if settings.ann_enabled and len(snapshot):
+            snapshot.ann = self._build_ann(snapshot)
+        return snapshot
+
+    def _build_ann(self, snapshot: ArticleSnapshot, save: bool = True) -> IVFIndex:
+        """
+        Load the saved IVF index and insert any new articles, or train a fresh one.
+        Without `save` the result is not written back, for processes that do not own the file.
+        """
+        path = settings.ann_index_path
+        ann = None
+        if path and os.path.exists(path):
+            try:
+                ann = IVFIndex.load(path)
+            except Exception as e:
+                logger.warning("Could not load ANN index from %s: %s", path, e)
+        if ann is not None and ann.dim == snapshot.matrix.shape[1]:
+            ann.n_probe = settings.ann_n_probe
+            missing = [row for row, news_id in enumerate(snapshot.ids) if news_id not in ann]
+            stale = set(ann.indexed_ids()).difference(snapshot.id_to_row)
+            ann.remove(stale)
+            ann.add(snapshot.matrix[missing], [snapshot.ids[row] for row in missing])
+        else:
+            ann = IVFIndex(snapshot.matrix.shape[1], settings.ann_n_lists, settings.ann_n_probe)
+            ann.build(snapshot.matrix, snapshot.ids)
+
+        if path and save:
+            self._save_ann(ann, path)
+        return ann
+
+    @staticmethod
+    def _save_ann(ann: IVFIndex, path: str):
+        """
+        Write the IVF index file unless another worker holds its lock and is writing it.
+        """
+        with open(path + ".lock", "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            ann.save(path)
+
+    async def ensure_loaded(self):
+        """
+        Build the index on first use and refresh it in the background once stale.
+        Readers keep using the previous snapshot while a refresh is running.
+        """
+        if self._snapshot is None:
+            async with self._build_lock:
+                if self._snapshot is None:
+                    await self.build()
+            return
+
+        age = time.monotonic() - self._snapshot.built_at
+        refreshing = self._refresh_task is not None and not self._refresh_task.done()
+        if self.live_updates:
+            return
+        if self.refresh_seconds and age > self.refresh_seconds and not refreshing:
+            self._refresh_task = asyncio.create_task(self._refresh_in_background())
+
+    async def _refresh_in_background(self):
+        async with self._build_lock:
+            try:
+                await self.build()
+            except Exception:
+                logger.exception("Article index refresh failed")
+
+    async def close(self):
+        """
+        Stop any in-flight background refresh.
+        """
+        if self._refresh_task is not None and not self._refresh_task.done():
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+
+    def search(self, query: np.ndarray, k: int, exclude_ids: Iterable[str] = (),
+               facets: Optional[FacetFilter] = None) -> List[Dict]:
+        """
+        Return the top-k articles by cosine similarity to `query`, best first, among those
+        passing the `facets` filter.
+        Pure CPU work on the current snapshot; call `ensure_loaded` first.
+        """
+        snapshot = self.snapshot
+        with stage_timer("scoring"):
+            rows, scores = self._top_rows(snapshot, query, k, exclude_ids, facets)
+            return self._results(snapshot, rows, scores)
+
+    def search_diverse(self, query: np.ndarray, k: int, exclude_ids: Iterable[str] = (),
+                       pool_size: Optional[int] = None, diversity: Optional[float] = None,
+                       dedupe: bool = True, facets: Optional[FacetFilter] = None) -> List[Dict]:
+        """
+        Top-k articles re-ranked for diversity: the `pool_size` best candidates are filtered
+        for near-duplicates via their `top_5_similar` neighbours, then picked by MMR.
+        """
+        snapshot = self.snapshot
+        pool_size = max(k, pool_size or settings.mmr_pool_size)
+        with stage_timer("scoring"):
+            rows, scores = self._top_rows(snapshot, query, pool_size, exclude_ids, facets)
+        with stage_timer("diversity"):
+            rows, scores = self._rerank_diverse(snapshot, rows, scores, k, diversity, dedupe)
+            return self._results(snapshot, rows, scores)
+
+    def diversify(self, ids: List[str], scores: List[float], k: int, diversity: Optional[float] = None,
+                  dedupe: bool = True) -> List[Dict]:
+        """
+        `search_diverse` over an already ranked candidate list, such as a precomputed one.
+        """
+        snapshot = self.snapshot
+        with stage_timer("diversity"):
+            known = [(snapshot.id_to_row[news_id], score) for news_id, score in zip(ids, scores)
+                     if news_id in snapshot.id_to_row]
+            rows = np.array([row for row, _ in known], dtype=np.int64)
+            scores = np.array([score for _, score in known], dtype=np.float32)
+            rows, scores = self._rerank_diverse(snapshot, rows, scores, k, diversity, dedupe)
+            return self._results(snapshot, rows, scores)
+
+    def _rerank_diverse(self, snapshot: ArticleSnapshot, rows: np.ndarray, scores: np.ndarray, k: int,
+                        diversity: Optional[float], dedupe: bool):
+        diversity = settings.mmr_diversity if diversity is None else diversity
+        keep = np.arange(len(rows))
+        if dedupe:
+            # Plain ints index and hash much faster than NumPy scalars
+            row_list = rows.tolist()
+            keep = np.array(drop_near_duplicates(
+                [snapshot.ids[row] for row in row_list],
+                [snapshot.neighbours(row) for row in row_list],
+            ), dtype=np.int64)
+
+        picked = keep[mmr(snapshot.matrix[rows[keep]], scores[keep], k, diversity)]
+        if len(picked) < min(k, len(rows)):
+            # Too few candidates left after de-duplication; top up with the best dropped ones
+            dropped = np.setdiff1d(np.arange(len(rows)), picked, assume_unique=True)
+            picked = np.concatenate([picked, dropped[:k - len(picked)]])
+        return rows[picked], scores[picked]
+
+    def _top_rows(self, snapshot: ArticleSnapshot, query: np.ndarray, k: int, exclude_ids: Iterable[str],
+                  facets: Optional[FacetFilter] = None):
+        """
+        Snapshot rows and scores of the top-k articles in the publication window passing
+        `facets`, best first, blended with recency. Quantized scans are re-ranked exactly.
+        """
+        empty = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        if k <= 0 or len(snapshot) == 0:
+            return empty
+
+        query = np.asarray(query, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+
+        start = snapshot.window_start(window_cutoff())
+        mask = snapshot.facets.mask(facets, start) if facets is not None else None
+        if mask is not None and np.count_nonzero(mask) < FACET_SUBSET_FRACTION * len(mask):
+            return self._top_rows_subset(snapshot, query, k, exclude_ids, np.flatnonzero(mask) + start)
+        if snapshot.ann is not None:
+            return self._top_rows_ann(snapshot, query, k, exclude_ids, start, mask)
+
+        # Rows are ordered by publication time, so the window is a view, not a copy
+        if snapshot.quantized is not None:
+            scores = snapshot.quantized.scores(query, start)
+        else:
+            scores = snapshot.matrix[start:] @ query
+        scores = recency_blend(scores, snapshot.published[start:])
+        excluded = [snapshot.id_to_row[news_id] - start for news_id in exclude_ids
+                    if snapshot.id_to_row.get(news_id, -1) >= start]
+        if excluded:
+            scores[excluded] = -np.inf
+        if mask is not None:
+            scores[~mask] = -np.inf
+            available = int(np.count_nonzero(mask)) - len({row for row in excluded if mask[row]})
+        else:
+            available = len(scores) - len(set(excluded))
+
+        k = min(k, available)
+        if k <= 0:
+            return empty
+        if snapshot.quantized is not None:
+            depth = min(max(k, settings.quantized_rerank_depth), available)
+            candidates = np.argpartition(-scores, depth - 1)[:depth] + start
+            scores = recency_blend(snapshot.matrix[candidates] @ query, snapshot.published[candidates])
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return candidates[top], scores[top]
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return top + start, scores[top]
+
+    def _top_rows_subset(self, snapshot: ArticleSnapshot, query: np.ndarray, k: int, exclude_ids: Iterable[str],
+                         rows: np.ndarray):
+        """
+        Top-k among the given rows only, scored exactly block by block.
+        """
+        excluded = [snapshot.id_to_row[news_id] for news_id in exclude_ids if news_id in snapshot.id_to_row]
+        if excluded:
+            rows = rows[~np.isin(rows, excluded)]
+        k = min(k, len(rows))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        scores = np.empty(len(rows), dtype=np.float32)
+        for first in range(0, len(rows), FACET_SUBSET_BLOCK_ROWS):
+            block = rows[first:first + FACET_SUBSET_BLOCK_ROWS]
+            np.matmul(snapshot.matrix[block], query, out=scores[first:first + len(block)])
+        scores = recency_blend(scores, snapshot.published[rows])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return rows[top], scores[top]
+
+    def _top_rows_ann(self, snapshot: ArticleSnapshot, query: np.ndarray, k: int, exclude_ids: Iterable[str],
+                      start: int = 0, mask: Optional[np.ndarray] = None):
+        excluded = set(exclude_ids)
+        # Candidates outside the window, filtered out or re-ordered by recency need a deeper probe
+        reranked = start > 0 or settings.recency_half_life_hours > 0 or mask is not None
+        ids, scores = snapshot.ann.search(query, (k + len(excluded)) * (ANN_RECENCY_OVERSAMPLE if reranked else 1))
+        rows, kept_scores = [], []
+        for news_id, score in zip(ids, scores):
+            row = snapshot.id_to_row.get(news_id)
+            if row is None or row < start or news_id in excluded or (mask is not None and not mask[row - start]):
+                continue
+            rows.append(row)
+            kept_scores.append(score)
+            if len(rows) == k and not reranked:
+                break
+        rows = np.array(rows, dtype=np.int64)
+        kept_scores = recency_blend(np.array(kept_scores, dtype=np.float32), snapshot.published[rows])
+        top = np.argsort(-kept_scores, kind="stable")[:k]
+        return rows[top], kept_scores[top]
+
+    def _results(self, snapshot: ArticleSnapshot, rows: np.ndarray, scores: np.ndarray) -> List[Dict]:
+        return [{**snapshot.metadata[row], "similarity": float(score)} for row, score in zip(rows, scores)]
+
+    def hydrate(self, ids: List[str], scores: List[float]) -> List[Dict]:
+        """
+        Article metadata for already ranked ids; ids no longer in the index are skipped.
+        """
+        snapshot = self.snapshot
+        with stage_timer("hydrate"):
+            return [
+                {**snapshot.metadata[snapshot.id_to_row[news_id]], "similarity": float(score)}
+                for news_id, score in zip(ids, scores) if news_id in snapshot.id_to_row
+            ]
+
+
+# Shared by all recommender instances in this process
+article_index = ArticleIndex()
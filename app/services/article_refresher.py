@@ -0,0 +1,278 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.db import db
+from app.services.article_index import ArticleIndex, article_index
+from app.services.fetch_news import NewsFetcher
+from app.services.recency import window_cutoff
+
+logger = logging.getLogger(__name__)
+
+ARTICLE_CHANGES = registry.counter(
+    "article_index_changes_total", "Article inserts/updates and deletes applied incrementally", ["operation"]
+)
+FRESHNESS_LAG = registry.gauge(
+    "article_index_freshness_lag_seconds",
+    "Seconds between the oldest article change in the last applied batch being written and becoming searchable",
+)
+LAST_SYNC = registry.gauge(
+    "article_index_last_sync_timestamp_seconds", "Unix time the index was last confirmed current with the collection"
+)
+REFRESH_ERRORS = registry.counter("article_index_refresh_errors_total", "Failed live refresh attempts")
+REFRESH_MODE = registry.gauge("article_index_refresh_mode", "Live refresh mechanism in use (1 = active)", ["mode"])
+
+CHANGE_OPERATIONS = ["insert", "update", "replace", "delete"]
+
+
+class ArticleRefresher:
+    """
+    Keeps an ArticleIndex current from a change stream, or on a standalone mongod by polling
+    for new `_id`s (and `updated_field`) and periodically reconciling the indexed ids.
+    """
+    def __init__(self, article_index: ArticleIndex, news_fetcher: Optional[NewsFetcher] = None,
+                 mode: Optional[str] = None, poll_seconds: Optional[float] = None,
+                 batch_size: Optional[int] = None, updated_field: Optional[str] = None,
+                 reconcile_seconds: Optional[float] = None):
+        self.article_index = article_index
+        self.news_fetcher = news_fetcher or NewsFetcher()
+        self.mode = mode or settings.article_live_refresh
+        self.poll_seconds = settings.article_poll_seconds if poll_seconds is None else poll_seconds
+        self.batch_size = batch_size or settings.article_refresh_batch_size
+        self.updated_field = settings.article_updated_field if updated_field is None else updated_field
+        self.reconcile_seconds = settings.article_reconcile_seconds if reconcile_seconds is None else reconcile_seconds
+        self.active_mode: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+        self._resume_token = None
+        self._last_id: Optional[ObjectId] = None
+        self._last_updated: Optional[datetime] = None
+        self._next_reconcile = 0.0
+
+    @property
+    def collection(self):
+        return db[self.news_fetcher.collection_name]
+
+    def start(self):
+        """
+        Start following changes in the background. Call after the index has been built.
+        """
+        if self.mode == "off" or (self._task is not None and not self._task.done()):
+            return
+        self.article_index.live_updates = True
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self.article_index.live_updates = False
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    def _set_mode(self, mode: str):
+        if self.active_mode is not None:
+            REFRESH_MODE.set(0, mode=self.active_mode)
+        self.active_mode = mode
+        REFRESH_MODE.set(1, mode=mode)
+
+    async def _run(self):
+        use_change_stream = self.mode in ("auto", "change_stream")
+        while True:
+            try:
+                if use_change_stream:
+                    try:
+                        stream = await self._open_change_stream()
+                    except OperationFailure as e:
+                        if self.mode == "change_stream":
+                            # Fall back to periodic full rebuilds
+                            logger.warning("Change streams unavailable, live article refresh disabled: %s", e)
+                            self.article_index.live_updates = False
+                            return
+                        logger.info("Change streams unavailable, polling for article changes instead: %s", e)
+                        use_change_stream = False
+                        continue
+                    await self._follow(stream)
+                else:
+                    self._set_mode("poll")
+                    await self.poll_once()
+                    await asyncio.sleep(self.poll_seconds)
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                # Typically the resume point fell off the oplog: start over from a full load
+                REFRESH_ERRORS.inc()
+                logger.warning("Article change stream failed, rebuilding the index: %s", e)
+                self._resume_token = None
+                await self._rebuild_after(self.poll_seconds)
+            except Exception:
+                REFRESH_ERRORS.inc()
+                logger.exception("Article refresh failed")
+                await asyncio.sleep(self.poll_seconds)
+
+    async def _rebuild_after(self, delay: float):
+        await asyncio.sleep(delay)
+        try:
+            await self.article_index.build()
+            self._last_id = None
+        except Exception:
+            logger.exception("Article index rebuild failed")
+
+    async def _open_change_stream(self):
+        pipeline = [{"$match": {"operationType": {"$in": CHANGE_OPERATIONS}}}]
+        return await self.collection.watch(
+            pipeline,
+            full_document="updateLookup",
+            resume_after=self._resume_token,
+            max_await_time_ms=int(max(self.poll_seconds, 0.1) * 1000),
+        )
+
+    async def _follow(self, stream):
+        async with stream:
+            self._set_mode("change_stream")
+            if self._resume_token is None:
+                # Inserts between the last full load and opening the stream are not in the stream
+                await self._poll_new_ids()
+            while stream.alive:
+                events = []
+                while len(events) < self.batch_size:
+                    event = await stream.try_next()
+                    if event is None:
+                        break
+                    events.append(event)
+                if events:
+                    documents, deleted_ids, written_at = self._changes_from_events(events)
+                    await self._apply(documents, deleted_ids, written_at)
+                else:
+                    LAST_SYNC.set(time.time())
+                self._resume_token = stream.resume_token
+
+    def _changes_from_events(self, events: List[Dict]) -> Tuple[List[Dict], Set[str], List[float]]:
+        """
+        Collapse a batch of change events into the final state of each touched article.
+        """
+        projected_fields = set(self.news_fetcher.NEWS_PROJECTION)
+        documents: Dict[str, Dict] = {}
+        deleted_ids: Set[str] = set()
+        written_at = []
+        for event in events:
+            news_id = str(event["documentKey"]["_id"])
+            description = event.get("updateDescription")
+            if description is not None:
+                changed = set(description.get("updatedFields", {})).union(description.get("removedFields", []))
+                if not {field.split(".")[0] for field in changed} & projected_fields:
+                    continue  # Nothing the index stores has changed
+
+            doc = event.get("fullDocument")
+            if event["operationType"] == "delete" or doc is None or not self.news_fetcher.is_valid_news(doc):
+                documents.pop(news_id, None)
+                deleted_ids.add(news_id)
+            else:
+                deleted_ids.discard(news_id)
+                documents[news_id] = doc
+            if event.get("clusterTime") is not None:
+                written_at.append(float(event["clusterTime"].time))
+        return [self.news_fetcher.project_doc(doc) for doc in documents.values()], deleted_ids, written_at
+
+    async def _apply(self, documents: List[Dict], deleted_ids: Iterable[str], written_at: List[float]):
+        deleted_ids = list(deleted_ids)
+        if not documents and not deleted_ids:
+            LAST_SYNC.set(time.time())
+            return
+        await self.article_index.apply_changes(documents, deleted_ids)
+        now = time.time()
+        ARTICLE_CHANGES.inc(len(documents), operation="upsert")
+        ARTICLE_CHANGES.inc(len(deleted_ids), operation="delete")
+        if written_at:
+            FRESHNESS_LAG.set(max(0.0, now - min(written_at)))
+        LAST_SYNC.set(now)
+
+    async def poll_once(self):
+        """
+        One polling pass: new articles by `_id`, modified articles by `updated_field`, and a
+        reconciliation of the indexed ids every `reconcile_seconds`.
+        """
+        await self._poll_new_ids()
+        if self.updated_field:
+            await self._poll_updated()
+        if self.reconcile_seconds and time.monotonic() >= self._next_reconcile:
+            await self.reconcile()
+            self._next_reconcile = time.monotonic() + self.reconcile_seconds
+        LAST_SYNC.set(time.time())
+
+    def _max_indexed_id(self) -> Optional[ObjectId]:
+        ids = [ObjectId(news_id) for news_id in self.article_index.snapshot.ids if ObjectId.is_valid(news_id)]
+        return max(ids) if ids else None
+
+    async def _poll_new_ids(self):
+        if self._last_id is None:
+            self._last_id = self._max_indexed_id()
+        while True:
+            query = dict(self.news_fetcher.valid_news_filter(window_cutoff()))
+            if self._last_id is not None:
+                query["_id"] = {"$gt": self._last_id}
+            batch = await self.collection.find(query, self.news_fetcher.NEWS_PROJECTION) \
+                .sort("_id", 1).limit(self.batch_size).to_list()
+            if not batch:
+                return
+            self._last_id = batch[-1]["_id"]
+            written_at = [doc["_id"].generation_time.timestamp() for doc in batch if isinstance(doc["_id"], ObjectId)]
+            await self._apply([self.news_fetcher.decode_doc(doc) for doc in batch], [], written_at)
+            if len(batch) < self.batch_size:
+                return
+
+    async def _poll_updated(self):
+        if self._last_updated is None:
+            self._last_updated = datetime.now(timezone.utc)
+            return
+        projection = {**self.news_fetcher.NEWS_PROJECTION, self.updated_field: 1}
+        while True:
+            batch = await self.collection.find({self.updated_field: {"$gt": self._last_updated}}, projection) \
+                .sort(self.updated_field, 1).limit(self.batch_size).to_list()
+            if not batch:
+                return
+            self._last_updated = batch[-1][self.updated_field]
+            documents = [doc for doc in batch if self.news_fetcher.is_valid_news(doc)]
+            deleted_ids = [str(doc["_id"]) for doc in batch if not self.news_fetcher.is_valid_news(doc)]
+            written_at = [_timestamp(doc[self.updated_field]) for doc in batch]
+            await self._apply([self.news_fetcher.project_doc(doc) for doc in documents], deleted_ids, written_at)
+            if len(batch) < self.batch_size:
+                return
+
+    async def reconcile(self):
+        """
+        Compare indexed ids with the valid ids in the collection (an `_id`-only query) and apply
+        the difference, which catches deletes and documents that became valid after insertion.
+        """
+        indexed = set(self.article_index.snapshot.ids)
+        cursor = self.collection.find(self.news_fetcher.valid_news_filter(window_cutoff()), {"_id": 1})
+        current = {str(doc["_id"]) async for doc in cursor}
+
+        missing = [ObjectId(news_id) for news_id in current - indexed if ObjectId.is_valid(news_id)]
+        documents = []
+        for start in range(0, len(missing), self.batch_size):
+            batch = await self.collection.find(
+                {"_id": {"$in": missing[start:start + self.batch_size]}}, self.news_fetcher.NEWS_PROJECTION
+            ).to_list()
+            documents.extend(self.news_fetcher.decode_doc(doc) for doc in batch)
+        await self._apply(documents, indexed - current, [])
+
+
+def _timestamp(value) -> float:
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    return float(value)
+
+
+# Follows the shared article index of this process
+article_refresher = ArticleRefresher(article_index)
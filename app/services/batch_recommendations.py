@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from pymongo import UpdateOne
+
+from app.core.config import settings
+from app.db import db
+from app.services.article_index import ArticleIndex, ArticleSnapshot
+from app.services.embedding_provider import EmbeddingProvider, EmbeddingUnavailable, get_embedding_provider
+from app.services.recency import recency_blend, window_cutoff
+from app.services.user_profile import profile_vector
+
+logger = logging.getLogger(__name__)
+
+USER_PROJECTION = {"email": 1, "preferences": 1, "interaction_list": 1,
+                   "profile_sum": 1, "profile_count": 1, "profile_version": 1}
+
+
+def top_k_blocked(users: np.ndarray, articles: np.ndarray, k: int, excluded: List[List[int]],
+                  block_size: int = 4096, published: Optional[np.ndarray] = None):
+    """
+    Top-k article rows and scores for every user row, scoring one block of articles at a time
+    with a matrix-matrix product so memory stays proportional to users x block_size.
+    With `published` timestamps the scores are blended with recency like live searches.
+    """
+    now = time.time()
+    n_users = len(users)
+    best_rows = np.zeros((n_users, 0), dtype=np.int64)
+    best_scores = np.zeros((n_users, 0), dtype=np.float32)
+
+    for start in range(0, len(articles), block_size):
+        scores = users @ articles[start:start + block_size].T
+        if published is not None:
+            scores = recency_blend(scores, published[start:start + block_size], now)
+        for user_row, rows in enumerate(excluded):
+            in_block = [row - start for row in rows if start <= row < start + scores.shape[1]]
+            if in_block:
+                scores[user_row, in_block] = -np.inf
+
+        # Merge this block's candidates with the running top-k
+        block_k = min(k, scores.shape[1])
+        block_top = np.argpartition(-scores, block_k - 1, axis=1)[:, :block_k]
+        candidate_rows = np.concatenate([best_rows, block_top + start], axis=1)
+        candidate_scores = np.concatenate([best_scores, np.take_along_axis(scores, block_top, axis=1)], axis=1)
+
+        keep = min(k, candidate_rows.shape[1])
+        top = np.argpartition(-candidate_scores, keep - 1, axis=1)[:, :keep]
+        best_rows = np.take_along_axis(candidate_rows, top, axis=1)
+        best_scores = np.take_along_axis(candidate_scores, top, axis=1)
+
+    order = np.argsort(-best_scores, axis=1)
+    return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+
+async def _preference_embeddings(texts: Iterable[str], embedding_provider: EmbeddingProvider,
+                                 concurrency: int) -> Dict[str, np.ndarray]:
+    """
+    Embeddings of the distinct preference texts, at most `concurrency` calls at a time.
+    Texts whose embedding is unavailable are left out.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def embed(text):
+        async with semaphore:
+            try:
+                return text, await embedding_provider.embed(text)
+            except EmbeddingUnavailable as e:
+                logger.warning("Could not embed preferences %r: %s", text, e)
+                return text, None
+
+    embedded = await asyncio.gather(*(embed(text) for text in set(texts)))
+    return {text: embedding for text, embedding in embedded if embedding is not None}
+
+
+async def _user_vectors(users: List[Dict], embedding_provider: EmbeddingProvider) -> Tuple[List[Dict], np.ndarray]:
+    """
+    The same blend of preference and interaction embeddings the live recommender uses, for
+    the users whose preferences could be embedded; returns those users and their vectors.
+    """
+    texts = [" ".join(user.get("preferences", [])) for user in users]
+    embeddings = await _preference_embeddings(texts, embedding_provider, settings.precompute_embedding_concurrency)
+    kept, vectors = [], []
+    for user, text in zip(users, texts):
+        preference_embedding = embeddings.get(text)
+        if preference_embedding is None:
+            continue
+        interaction_profile = profile_vector(user)
+        if interaction_profile is None:
+            # Only users without interactions are selected without a stored profile
+            interaction_profile = np.zeros(settings.embedding_dim)
+        kept.append(user)
+        vectors.append(0.5 * interaction_profile + 0.5 * preference_embedding)
+    vectors = np.asarray(vectors, dtype=np.float32).reshape(len(kept), -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return kept, vectors / norms
+
+
+async def _process_chunk(users: List[Dict], snapshot: ArticleSnapshot, embedding_provider: EmbeddingProvider,
+                         top_k: int, block_size: int) -> Tuple[int, int]:
+    """
+    Score and store one chunk of users. Returns the lists stored and the users skipped
+    because their preferences could not be embedded.
+    """
+    scored, vectors = await _user_vectors(users, embedding_provider)
+    skipped = len(users) - len(scored)
+    if not scored:
+        return 0, skipped
+    users = scored
+    # Only the rows inside the publication window, as in ArticleIndex.search
+    start = snapshot.window_start(window_cutoff())
+    excluded = [
+        [snapshot.id_to_row[news_id] - start for news_id in user.get("interaction_list", [])
+         if snapshot.id_to_row.get(news_id, -1) >= start]
+        for user in users
+    ]
+    rows, scores = top_k_blocked(vectors, snapshot.matrix[start:], top_k, excluded, block_size,
+                                 snapshot.published[start:])
+    rows += start
+
+    computed_at = datetime.now(timezone.utc)
+    operations = []
+    for user, user_rows, user_scores in zip(users, rows, scores):
+        valid = np.isfinite(user_scores)
+        operations.append(UpdateOne(
+            # Only written if the user has not changed since we read them
+            {"_id": user["_id"], "profile_version": user.get("profile_version")},
+            {"$set": {"precomputed_recommendations": {
+                "version": user.get("profile_version"),
+                "ids": [snapshot.ids[row] for row in user_rows[valid]],
+                "scores": user_scores[valid].tolist(),
+                "computed_at": computed_at,
+            }}},
+        ))
+    result = await db.user_data.bulk_write(operations, ordered=False)
+    return result.modified_count, skipped
+
+
+async def precompute_recommendations(top_k: Optional[int] = None, chunk_size: Optional[int] = None,
+                                     block_size: Optional[int] = None,
+                                     article_index: Optional[ArticleIndex] = None) -> Dict[str, float]:
+    """
+    Store every user's top-k list on their document, stamped with the profile version it
+    was computed for, scoring users in chunks. Users whose preferences cannot be embedded
+    are skipped.
+    """
+    top_k = top_k or settings.precompute_top_k
+    chunk_size = chunk_size or settings.precompute_user_chunk_size
+    block_size = block_size or settings.precompute_article_block_size
+
+    started = time.monotonic()
+    article_index = article_index or ArticleIndex(refresh_seconds=0)
+    snapshot = await article_index.build()
+    embedding_provider = get_embedding_provider()
+
+    stats = {"users": 0, "updated": 0, "skipped": 0}
+    if len(snapshot) == 0:
+        return stats
+
+    chunk = []
+    query = {"$or": [
+        {"profile_sum": {"$exists": True}},
+        {"interaction_list": {"$size": 0}},
+        {"interaction_list": {"$exists": False}},
+    ]}
+    cursor = db.user_data.find(query, USER_PROJECTION).batch_size(chunk_size)
+    async for user in cursor:
+        chunk.append(user)
+        if len(chunk) == chunk_size:
+            updated, skipped = await _process_chunk(chunk, snapshot, embedding_provider, top_k, block_size)
+            stats["updated"] += updated
+            stats["skipped"] += skipped
+            stats["users"] += len(chunk) - skipped
+            chunk = []
+    if chunk:
+        updated, skipped = await _process_chunk(chunk, snapshot, embedding_provider, top_k, block_size)
+        stats["updated"] += updated
+        stats["skipped"] += skipped
+        stats["users"] += len(chunk) - skipped
+
+    stats["seconds"] = time.monotonic() - started
+    return stats
+
+
+def fresh_precomputed(user: Dict, limit: int, max_age_seconds: Optional[int] = None) -> Optional[Dict]:
+    """
+    The user's precomputed list if it matches their current profile version, is recent
+    enough and long enough to serve `limit` items; otherwise None.
+    """
+    precomputed = user.get("precomputed_recommendations")
+    if not precomputed or precomputed.get("version") != user.get("profile_version"):
+        return None
+    if len(precomputed.get("ids", [])) < limit:
+        return None
+
+    max_age_seconds = settings.precompute_max_age_seconds if max_age_seconds is None else max_age_seconds
+    computed_at = precomputed["computed_at"]
+    if computed_at.tzinfo is None:
+        computed_at = computed_at.replace(tzinfo=timezone.utc)
+    if (datetime.now(timezone.utc) - computed_at).total_seconds() > max_age_seconds:
+        return None
+    return precomputed
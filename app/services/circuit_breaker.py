@@ -0,0 +1,58 @@
+import time
+from typing import Optional
+
+from app.core.metrics import registry
+
+CIRCUIT_STATE = registry.gauge("circuit_breaker_open", "1 while the circuit breaker fails calls fast", ["name"])
+CIRCUIT_REJECTIONS = registry.counter("circuit_breaker_rejections_total", "Calls failed fast by an open circuit breaker", ["name"])
+
+
+class CircuitBreaker:
+    """
+    Fails calls fast after `failure_threshold` consecutive failures. Once `reset_seconds` have
+    passed, one trial call is let through: success closes the circuit, failure keeps it open
+    for another `reset_seconds`.
+    """
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        """
+        Whether a call may go ahead now; False counts as a rejection.
+        """
+        if self.opened_at is None:
+            return True
+        if not self._trial_running and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self._trial_running = True
+            return True
+        CIRCUIT_REJECTIONS.inc(name=self.name)
+        return False
+
+    def release_trial(self):
+        """
+        Give back the trial slot of a call that ended without an outcome, e.g. was cancelled.
+        """
+        self._trial_running = False
+
+    def record_success(self):
+        self.failures = 0
+        self._trial_running = False
+        if self.opened_at is not None:
+            self.opened_at = None
+            CIRCUIT_STATE.set(0, name=self.name)
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_running = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            CIRCUIT_STATE.set(1, name=self.name)
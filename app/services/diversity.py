@@ -0,0 +1,61 @@
+from typing import Iterable, List, Sequence
+
+import numpy as np
+
+
+def similar_ids(top_5_similar) -> List[str]:
+    """
+    Article ids listed in a `top_5_similar` field, whose entries are either ids or
+    sub-documents carrying one.
+    """
+    ids = []
+    for item in top_5_similar or []:
+        if isinstance(item, dict):
+            item = item.get("_id") or item.get("id") or item.get("news_id")
+        if item is not None:
+            ids.append(str(item))
+    return ids
+
+
+def drop_near_duplicates(ids: Sequence[str], neighbours: Sequence[Iterable[str]]) -> List[int]:
+    """
+    Positions of `ids` (ranked best first) to keep: an article that appears in the
+    precomputed neighbours of a better-ranked kept article, or lists one as its own
+    neighbour, is treated as a near-duplicate and dropped.
+    """
+    kept, kept_ids, blocked = [], set(), set()
+    for position, (news_id, similar) in enumerate(zip(ids, neighbours)):
+        if news_id in blocked or not kept_ids.isdisjoint(similar):
+            continue
+        kept.append(position)
+        kept_ids.add(news_id)
+        blocked.update(similar)
+    return kept
+
+
+def mmr(vectors: np.ndarray, relevance: np.ndarray, k: int, diversity: float = 0.3) -> np.ndarray:
+    """
+    Positions of `k` L2-normalized rows chosen by Maximal Marginal Relevance, in selection
+    order: each step maximizes (1 - diversity) * relevance - diversity * max similarity to the chosen rows.
+    """
+    n = len(vectors)
+    k = min(k, n)
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+
+    relevance = np.asarray(relevance, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    max_similarity = np.zeros(n, dtype=np.float32)
+    selected = np.empty(k, dtype=np.int64)
+    first = int(np.argmax(relevance))
+    for step in range(k):
+        if step == 0:
+            pick = first
+        else:
+            scores = (1 - diversity) * relevance - diversity * max_similarity
+            scores[~available] = -np.inf
+            pick = int(np.argmax(scores))
+        selected[step] = pick
+        available[pick] = False
+        np.maximum(max_similarity, vectors @ vectors[pick], out=max_similarity)
+    return selected
@@ -0,0 +1,72 @@
+import logging
+from typing import Any, Dict
+
+import numpy as np
+from bson.binary import Binary, BinaryVectorDtype, VECTOR_SUBTYPE
+from pymongo import UpdateOne
+
+from app.db import db
+
+logger = logging.getLogger(__name__)
+
+# BSON vector header: dtype byte followed by a padding byte (always 0 for float32)
+_FLOAT32_HEADER = BinaryVectorDtype.FLOAT32.value + b"\x00"
+_LITTLE_ENDIAN_FLOAT32 = np.dtype("<f4")
+
+
+def encode_embedding(embedding: Any) -> Binary:
+    """
+    Pack an embedding as a BSON float32 vector (subtype 9): a 2-byte header plus
+    little-endian float32 values, about 4 bytes per dimension instead of 9 for a double array.
+    """
+    values = np.asarray(embedding, dtype=_LITTLE_ENDIAN_FLOAT32)
+    return Binary(_FLOAT32_HEADER + values.tobytes(), subtype=VECTOR_SUBTYPE)
+
+
+def decode_embedding(value: Any) -> np.ndarray:
+    """
+    Read an embedding stored either as a BSON array of numbers or as packed float32 binary.
+    Binary values are wrapped without copying, so the result is read-only.
+    """
+    if isinstance(value, np.ndarray):
+        return value
+    if isinstance(value, bytes):
+        if isinstance(value, Binary) and value.subtype == VECTOR_SUBTYPE:
+            if value[:1] != _FLOAT32_HEADER[:1]:
+                raise ValueError("Only float32 BSON vectors are supported")
+            return np.frombuffer(value, dtype=_LITTLE_ENDIAN_FLOAT32, offset=len(_FLOAT32_HEADER))
+        return np.frombuffer(value, dtype=_LITTLE_ENDIAN_FLOAT32)
+    return np.asarray(value, dtype=np.float32)
+
+
+def is_empty_embedding(value: Any) -> bool:
+    return value is None or len(value) == 0
+
+
+async def migrate_embeddings(batch_size: int = 1000, collection_name: str = "news_scraper") -> Dict[str, int]:
+    """
+    Rewrite embeddings stored as BSON arrays as packed float32 binary, one batch at a time.
+    Converted documents no longer match the query, so an interrupted run can simply be restarted.
+    """
+    collection = db[collection_name]
+    stats = {"converted": 0, "skipped": 0}
+    last_id = None
+    while True:
+        query = {"embedding": {"$type": "array"}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await collection.find(query, {"embedding": 1}).sort("_id", 1).limit(batch_size).to_list()
+        if not batch:
+            return stats
+
+        operations = [
+            # Guarded on the type so a document rewritten in the meantime is left alone
+            UpdateOne({"_id": doc["_id"], "embedding": {"$type": "array"}},
+                      {"$set": {"embedding": encode_embedding(doc["embedding"])}})
+            for doc in batch
+        ]
+        result = await collection.bulk_write(operations, ordered=False)
+        stats["converted"] += result.modified_count
+        stats["skipped"] += len(batch) - result.modified_count
+        last_id = batch[-1]["_id"]
+        logger.info("Converted %d embeddings (last _id %s)", stats["converted"], last_id)
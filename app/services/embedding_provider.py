@@ -0,0 +1,208 @@
+import asyncio
+import hashlib
+import re
+from datetime import datetime, timezone
+from typing import Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import register_cache, registry, stage_timer
+from app.services.cache import TTLCache
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.single_flight import SingleFlight
+
+EMBEDDING_FAILURES = registry.counter(
+    "embedding_failures_total", "Remote embedding calls that timed out, failed or were skipped by the breaker", ["reason"]
+)
+
+
+def normalize_text(text: str) -> str:
+    """
+    Canonical form of an embedding input: case-folded with collapsed whitespace.
+    """
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+class EmbeddingUnavailable(RuntimeError):
+    """
+    The embedding backend missed its deadline, failed, or is being skipped while its circuit
+    breaker is open.
+    """
+
+
+class EmbeddingProvider:
+    """
+    Base class for anything that turns text into an embedding vector.
+    """
+    model: str = ""
+
+    async def embed(self, text: str) -> np.ndarray:
+        raise NotImplementedError
+
+
+class GenAIEmbeddingProvider(EmbeddingProvider):
+    """
+    Embeddings from the Google Generative AI embedding API.
+    """
+    def __init__(self, api_key: str, model: str):
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key)
+        self._genai = genai
+        self.model = model
+
+    async def embed(self, text: str) -> np.ndarray:
+        with stage_timer("embedding_api"):
+            response = await self._genai.embed_content_async(model=self.model, content=text)
+        return np.array(response["embedding"])
+
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    """
+    Deterministic, offline embeddings for tests and benchmarks.
+    Each token maps to a fixed pseudo-random vector, so texts sharing words get similar embeddings.
+    """
+    def __init__(self, dim: int = 768, model: str = "local/hashed-tokens"):
+        self.dim = dim
+        self.model = model
+
+    def _token_vector(self, token: str) -> np.ndarray:
+        seed = int.from_bytes(hashlib.sha256(token.encode("utf-8")).digest()[:8], "little")
+        return np.random.default_rng(seed).standard_normal(self.dim)
+
+    async def embed(self, text: str) -> np.ndarray:
+        tokens = normalize_text(text).split()
+        if not tokens:
+            return np.zeros(self.dim)
+        vector = np.sum([self._token_vector(token) for token in tokens], axis=0)
+        return vector / np.linalg.norm(vector)
+
+
+class GuardedEmbeddingProvider(EmbeddingProvider):
+    """
+    Bounds each call of a remote provider to `timeout` seconds and fails fast while the
+    circuit breaker is open, raising EmbeddingUnavailable either way.
+    """
+    def __init__(self, provider: EmbeddingProvider, timeout: float, breaker: CircuitBreaker):
+        self.provider = provider
+        self.model = provider.model
+        self.timeout = timeout
+        self.breaker = breaker
+
+    async def embed(self, text: str) -> np.ndarray:
+        if not self.breaker.allow():
+            EMBEDDING_FAILURES.inc(reason="circuit_open")
+            raise EmbeddingUnavailable("Embedding circuit breaker is open")
+        try:
+            embedding = await asyncio.wait_for(self.provider.embed(text), self.timeout or None)
+        except asyncio.TimeoutError as e:
+            self.breaker.record_failure()
+            EMBEDDING_FAILURES.inc(reason="timeout")
+            raise EmbeddingUnavailable(f"Embedding call exceeded {self.timeout}s") from e
+        except asyncio.CancelledError:
+            # The caller went away, which says nothing about the backend
+            self.breaker.release_trial()
+            raise
+        except Exception as e:
+            self.breaker.record_failure()
+            EMBEDDING_FAILURES.inc(reason="error")
+            raise EmbeddingUnavailable(f"Embedding call failed: {e}") from e
+        self.breaker.record_success()
+        return embedding
+
+
+class CachedEmbeddingProvider(EmbeddingProvider):
+    """
+    Caches a provider's embeddings per (model, normalized text) in process, optionally
+    backed by a MongoDB collection shared between processes.
+    """
+    def __init__(self, provider: EmbeddingProvider, cache: TTLCache, collection=None,
+                 persistent_ttl_seconds: int = 7 * 24 * 3600):
+        self.provider = provider
+        self.model = provider.model
+        self.cache = cache
+        self.collection = collection
+        self.persistent_ttl_seconds = persistent_ttl_seconds
+        self._ttl_index_ready = False
+        self._flights = SingleFlight("embedding")
+
+    async def _persistent_collection(self):
+        if self.collection is not None and not self._ttl_index_ready:
+            await self.collection.create_index("created_at", expireAfterSeconds=self.persistent_ttl_seconds)
+            self._ttl_index_ready = True
+        return self.collection
+
+    def _persistent_key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\n{text}".encode("utf-8")).hexdigest()
+
+    async def embed(self, text: str) -> np.ndarray:
+        text = normalize_text(text)
+        key = (self.model, text)
+        embedding = self.cache.get(key)
+        if embedding is not None:
+            return embedding
+        return await self._flights.do(key, lambda: self._load(text, key))
+
+    async def _load(self, text: str, key) -> np.ndarray:
+        embedding = None
+        collection = await self._persistent_collection()
+        if collection is not None:
+            doc = await collection.find_one({"_id": self._persistent_key(text)}, {"embedding": 1})
+            if doc:
+                embedding = np.array(doc["embedding"])
+
+        if embedding is None:
+            embedding = await self.provider.embed(text)
+            if collection is not None:
+                await collection.replace_one(
+                    {"_id": self._persistent_key(text)},
+                    {
+                        "model": self.model,
+                        "text": text,
+                        "embedding": embedding.tolist(),
+                        "created_at": datetime.now(timezone.utc),
+                    },
+                    upsert=True,
+                )
+
+        embedding.setflags(write=False)  # Shared between requests, never mutate
+        self.cache.set(key, embedding)
+        return embedding
+
+
+_embedding_provider: Optional[EmbeddingProvider] = None
+
+
+def build_embedding_provider() -> EmbeddingProvider:
+    """
+    Create the embedding provider described by the application settings.
+    """
+    if settings.embedding_provider == "local":
+        provider = LocalEmbeddingProvider(dim=settings.embedding_dim)
+    else:
+        provider = GenAIEmbeddingProvider(settings.genai_api_key, settings.embedding_model)
+    provider = GuardedEmbeddingProvider(
+        provider, settings.embedding_timeout_seconds,
+        CircuitBreaker("embedding", settings.embedding_breaker_failures, settings.embedding_breaker_reset_seconds),
+    )
+
+    collection = None
+    if settings.embedding_persistent_cache:
+        from app.db import db
+
+        collection = db[settings.embedding_cache_collection]
+
+    cache = TTLCache(settings.embedding_cache_size, settings.embedding_cache_ttl_seconds)
+    register_cache("embedding", cache)
+    return CachedEmbeddingProvider(provider, cache, collection, settings.embedding_persistent_cache_ttl_seconds)
+
+
+def get_embedding_provider() -> EmbeddingProvider:
+    """
+    Process-wide embedding provider, created on first use.
+    """
+    global _embedding_provider
+    if _embedding_provider is None:
+        _embedding_provider = build_embedding_provider()
+    return _embedding_provider
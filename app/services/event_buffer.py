@@ -0,0 +1,107 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.services.user_profile import EVENT_TYPES, apply_events_bulk, apply_user_events
+
+logger = logging.getLogger(__name__)
+
+EVENT_BUFFER_FLUSH_SECONDS = registry.histogram("event_buffer_flush_seconds", "Time to write one flush of buffered user events")
+EVENT_BUFFER_FLUSH_USERS = registry.histogram(
+    "event_buffer_flush_users", "Users written per flush of buffered user events",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000),
+)
+EVENT_BUFFER_EVENTS = registry.counter("event_buffer_events_total", "User events submitted to the write buffer")
+
+
+class EventBuffer:
+    """
+    Coalesces user events submitted within `window_ms` (or until `max_users` users are
+    pending) into one `apply_events_bulk` write; `submit` resolves once it is written.
+    """
+    def __init__(self, window_ms: float, max_users: int = 1000):
+        self.window = window_ms / 1000
+        self.max_users = max_users
+        # email -> [(events, future of the submitter)]
+        self._pending: Dict[str, List[Tuple[List[Tuple[str, str]], asyncio.Future]]] = {}
+        self._timer: Optional[asyncio.Task] = None
+        self._flushes = set()
+
+    async def submit(self, email: str, events: List[Tuple[str, str]]) -> Dict[str, List[str]]:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(email, []).append((events, future))
+        EVENT_BUFFER_EVENTS.inc(len(events))
+        if len(self._pending) >= self.max_users:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_after_window())
+        return await future
+
+    async def _flush_after_window(self):
+        await asyncio.sleep(self.window)
+        self._timer = None
+        self._start_flush()
+
+    def _start_flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        task = asyncio.create_task(self._flush(pending))
+        # Keep a reference so the task is not garbage collected mid-write
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, pending):
+        try:
+            with EVENT_BUFFER_FLUSH_SECONDS.time():
+                changes = await apply_events_bulk({
+                    email: [event for events, _ in submissions for event in events]
+                    for email, submissions in pending.items()
+                })
+            EVENT_BUFFER_FLUSH_USERS.observe(len(pending))
+        except Exception as e:
+            logger.exception("Writing %d users' buffered events failed", len(pending))
+            for submissions in pending.values():
+                for _, future in submissions:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+
+        for email, submissions in pending.items():
+            # Each change is reported to the first submitter whose events asked for it
+            unclaimed = {(event_type, news_id) for event_type in EVENT_TYPES for news_id in changes[email][event_type]}
+            for events, future in submissions:
+                own = unclaimed.intersection(events)
+                unclaimed -= own
+                if future.done():
+                    continue  # The request went away; its events were still written
+                future.set_result({
+                    event_type: [news_id for news_id in changes[email][event_type] if (event_type, news_id) in own]
+                    for event_type in EVENT_TYPES
+                })
+
+    async def close(self):
+        """
+        Write whatever is still buffered; called on shutdown.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._start_flush()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+
+event_buffer = EventBuffer(settings.event_buffer_ms, settings.event_buffer_max_users) \
+    if settings.event_buffer_ms > 0 else None
+
+
+async def record_user_events(user: Dict, events: List[Tuple[str, str]]) -> Dict[str, List[str]]:
+    """
+    Apply a user's events through the write buffer when it is enabled, directly otherwise.
+    """
+    if event_buffer is not None:
+        return await event_buffer.submit(user["email"], events)
+    return await apply_user_events(user["email"], events, user=user)
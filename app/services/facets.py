@@ -0,0 +1,105 @@
+from typing import Dict, Hashable, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Article fields that recommendations can be filtered by
+FACET_FIELDS = ("category", "domain", "sentiment")
+
+
+def facet_value(value) -> Optional[Hashable]:
+    """
+    Canonical form of a facet value, so filters match regardless of case and padding.
+    """
+    if isinstance(value, str):
+        value = value.strip().casefold()
+        return value or None
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return str(value)
+
+
+class FacetFilter(NamedTuple):
+    """
+    Hashable (field, values) pairs to include and exclude. An article passes when its value
+    is listed for every included field and for no excluded one.
+    """
+    include: Tuple[Tuple[str, frozenset], ...] = ()
+    exclude: Tuple[Tuple[str, frozenset], ...] = ()
+
+    @classmethod
+    def build(cls, include: Dict[str, Optional[Iterable]], exclude: Dict[str, Optional[Iterable]]) -> Optional["FacetFilter"]:
+        """
+        A filter from raw values per field (None or empty for no constraint); None without any.
+        """
+        def pairs(values_by_field):
+            return tuple(sorted(
+                (field, frozenset(facet_value(value) for value in values))
+                for field, values in values_by_field.items() if values
+            ))
+        facet_filter = cls(pairs(include), pairs(exclude))
+        return facet_filter if facet_filter.include or facet_filter.exclude else None
+
+    def as_dict(self) -> Dict[str, Dict[str, List]]:
+        """
+        JSON-friendly form, turned back into an equal filter by `FacetFilter.build(**as_dict())`.
+        """
+        def values_by_field(pairs):
+            return {field: sorted(values, key=str) for field, values in pairs}
+        return {"include": values_by_field(self.include), "exclude": values_by_field(self.exclude)}
+
+
+class FacetIndex:
+    """
+    Row-aligned facet codes of a snapshot: `codes[field][row]` indexes `values[field]`,
+    whose position 0 is the missing value.
+    """
+    def __init__(self, codes: Dict[str, np.ndarray], values: Dict[str, List]):
+        self.codes = codes
+        self.values = values
+        self._positions = {field: {value: code for code, value in enumerate(values[field])} for field in FACET_FIELDS}
+
+    @classmethod
+    def from_metadata(cls, metadata: Sequence[Dict]) -> "FacetIndex":
+        codes, values = {}, {}
+        for field in FACET_FIELDS:
+            positions = {None: 0}
+            codes[field] = np.fromiter(
+                (positions.setdefault(facet_value(doc.get(field)), len(positions)) for doc in metadata),
+                dtype=np.int32, count=len(metadata),
+            )
+            values[field] = list(positions)
+        return cls(codes, values)
+
+    def merge(self, rows: np.ndarray, other: "FacetIndex", other_rows: np.ndarray, from_self: np.ndarray) -> "FacetIndex":
+        """
+        Codes of a merged snapshot: `rows` of this index where `from_self` is set and
+        `other_rows` of `other` elsewhere, re-coded into one shared vocabulary.
+        """
+        codes, values = {}, {}
+        for field in FACET_FIELDS:
+            vocabulary = list(self.values[field])
+            positions = dict(self._positions[field])
+            recode = np.array([positions.setdefault(value, len(positions)) for value in other.values[field]],
+                              dtype=np.int32)
+            vocabulary.extend(list(positions)[len(vocabulary):])
+            merged = np.empty(len(from_self), dtype=np.int32)
+            merged[from_self] = self.codes[field][rows]
+            merged[~from_self] = recode[other.codes[field][other_rows]]
+            codes[field], values[field] = merged, vocabulary
+        return FacetIndex(codes, values)
+
+    def _matches(self, field: str, wanted: frozenset, start: int) -> np.ndarray:
+        table = np.zeros(len(self.values[field]), dtype=bool)
+        table[[self._positions[field][value] for value in wanted if value in self._positions[field]]] = True
+        return table[self.codes[field][start:]]
+
+    def mask(self, facet_filter: FacetFilter, start: int = 0) -> np.ndarray:
+        """
+        Boolean mask over rows `start:` of the articles passing the filter.
+        """
+        mask = np.ones(len(self.codes[FACET_FIELDS[0]]) - start, dtype=bool)
+        for field, wanted in facet_filter.include:
+            mask &= self._matches(field, wanted, start)
+        for field, unwanted in facet_filter.exclude:
+            mask &= ~self._matches(field, unwanted, start)
+        return mask
@@ -3,13 +3,16 @@
 from pymongo.mongo_client import MongoClient
 from pymongo.server_api import ServerApi
 from pymongo.errors import PyMongoError
-from datetime import datetime, timedelta
 from app.db import db
+from app.core.metrics import stage_timer
+from app.services.embedding_codec import decode_embedding
+from app.services.recency import published_since_conditions
 import logging
 
-from typing import List, Dict
+from typing import List, Dict, AsyncIterator, Optional
 from bson import ObjectId
 
+logger = logging.getLogger(__name__)
 
 class NewsFetcher:
     def __init__(self):
@@ -36,54 +39,110 @@ class NewsFetcher:
                 doc[key] = [self.serialize_doc(item) if isinstance(item, dict) else item for item in value]
         return doc
 
-    def news_fetcher(self, limit: int) -> List[Dict]:
+    def decode_doc(self, doc: Dict) -> Dict:
         """
-        Efficiently fetch news articles from MongoDB with nested 'top_5_similar'.
+        Serializes the document and turns its embedding, stored either as an array of numbers
+        or as packed float32 binary, into a numpy array.
+        """
+        doc = self.serialize_doc(doc)
+        if doc.get("embedding") is not None:
+            doc["embedding"] = decode_embedding(doc["embedding"])
+        return doc
+
+    # Documents missing any of these fields cannot be recommended
+    VALID_NEWS_FILTER = {
+        # Filters to exclude None values for required fields
+        "title": {"$exists": True, "$ne": None},
+        "summary": {"$exists": True, "$ne": None},
+        "sentiment": {"$exists": True, "$ne": None},
+        "embedding": {"$exists": True, "$ne": None},
+        # Check nested array field for non-empty lists
+        "$or": [
+            {"top_5_similar": {"$exists": False}},  # If not present, accept it
+            {"top_5_similar": {"$ne": []}}         # If present, must not be empty
+        ]
+    }
+
+    NEWS_PROJECTION = {
+        "_id": 1,
+        "title": 1,
+        "summary": 1,
+        "sentiment": 1,
+        "main_image": 1,
+        "embedding": 1,
+        "domain": 1,
+        "category": 1,
+        "url": 1,
+        "publication_date": 1,
+        "top_5_similar": 1
+    }
+
+    def valid_news_filter(self, published_after: Optional[float] = None) -> Dict:
+        """
+        VALID_NEWS_FILTER, restricted to articles published at or after the given timestamp,
+        whether `publication_date` is stored as a date, an ISO string or an epoch number.
+        Each range is served by a `publication_date` index (see indexes.py), so the cost follows the window
+        rather than the size of the collection.
+        """
+        if published_after is None:
+            return self.VALID_NEWS_FILTER
+        return {"$and": [
+            self.VALID_NEWS_FILTER,
+            {"$or": [{"publication_date": condition} for condition in published_since_conditions(published_after)]},
+        ]}
+
+    async def has_news(self) -> bool:
+        """
+        Whether the collection holds any document at all, valid or not.
+        """
+        return await db[self.collection_name].find_one({}, {"_id": 1}) is not None
+
+    def is_valid_news(self, doc: Dict) -> bool:
+        """
+        Python counterpart of VALID_NEWS_FILTER for documents that did not come from a filtered query.
+        """
+        if any(doc.get(field) is None for field in ("title", "summary", "sentiment", "embedding")):
+            return False
+        return doc.get("top_5_similar") != []
+
+    def project_doc(self, doc: Dict) -> Dict:
+        """
+        Apply NEWS_PROJECTION to a full document and decode it like a fetched one.
+        """
+        return self.decode_doc({key: doc[key] for key in self.NEWS_PROJECTION if key in doc})
+
+    async def news_fetcher(self, limit: int, published_after: Optional[float] = None) -> List[Dict]:
+        """
+        Efficiently fetch the `limit` most recent news articles from MongoDB with nested 'top_5_similar'.
         Filters invalid documents at the database level.
         """
         try:
             collection = db[self.collection_name]
 
             # Use MongoDB query to exclude documents with None values
-            all_documents = list(
-                collection.find(
-                    {
-                        # Filters to exclude None values for required fields
-                        "title": {"$exists": True, "$ne": None},
-                        "summary": {"$exists": True, "$ne": None},
-                        "sentiment": {"$exists": True, "$ne": None},
-                        "embedding": {"$exists": True, "$ne": None},
-                        # Check nested array field for non-empty lists
-                        "$or": [
-                            {"top_5_similar": {"$exists": False}},  # If not present, accept it
-                            {"top_5_similar": {"$ne": []}}         # If present, must not be empty
-                        ]
-                    },
-                    {
-                        "_id": 1,
-                        "title": 1,
-                        "summary": 1,
-                        "sentiment": 1,
-                        "main_image": 1,
-                        "embedding": 1,
-                        "domain": 1,
-                        "category": 1,
-                        "url": 1,
-                        "publication_date": 1,
-                        "top_5_similar": 1
-                    }
-                ).limit(limit)
-            )
+            with stage_timer("news_fetcher"):
+                all_documents = await collection.find(
+                    self.valid_news_filter(published_after), self.NEWS_PROJECTION
+                ).sort("publication_date", -1).limit(limit).to_list()
 
-            # Serialize ObjectIds and nested fields for valid documents
-            return [self.serialize_doc(doc) for doc in all_documents]
+                # Serialize ObjectIds and nested fields for valid documents
+                return [self.decode_doc(doc) for doc in all_documents]
 
-        except Exception as e:
-            print(f"An error occurred: {e}")
+        except Exception:
+            logger.exception("An error occurred while fetching news")
             return []
-        
 
-    def fetch_news_by_ids(self, news_ids: List[str]) -> List[Dict]:
+    async def iter_all_news(self, batch_size: int = 1000, published_after: Optional[float] = None) -> AsyncIterator[Dict]:
+        """
+        Stream every valid news article in the collection, or only those published since `published_after`.
+        Used to build in-memory indexes without holding the raw result list.
+        """
+        collection = db[self.collection_name]
+        cursor = collection.find(self.valid_news_filter(published_after), self.NEWS_PROJECTION).batch_size(batch_size)
+        async for doc in cursor:
+            yield self.decode_doc(doc)
+
+    async def fetch_news_by_ids(self, news_ids: List[str]) -> List[Dict]:
             """
             Fetch news articles based on a list of news IDs.
             """
@@ -92,11 +151,11 @@ class NewsFetcher:
                 object_ids = [ObjectId(news_id) for news_id in news_ids]
 
                 # Fetch articles that match any of the given IDs
-                news_articles = list(
-                    collection.find(
+                with stage_timer("fetch_news_by_ids"):
+                    news_articles = await collection.find(
                         {
                             "_id": {"$in": object_ids}  # Match any ID in the list
-                        
+                    
                             # Filters to exclude None values for required fields
                             #"title": {"$exists": True, "$ne": None},
                             #"summary": {"$exists": True, "$ne": None},
@@ -107,13 +166,12 @@ class NewsFetcher:
                             "_id": 1,
                             "embedding": 1
                         }
-                    )
-                )
+                    ).to_list()
 
                 # Serialize ObjectIds and nested fields for valid documents
-                return [self.serialize_doc(doc) for doc in news_articles]
-            except Exception as e:
-                print(f"Error fetching news by IDs: {e}")
+                return [self.decode_doc(doc) for doc in news_articles]
+            except Exception:
+                logger.exception("Error fetching news by IDs")
                 return []
 
 
@@ -0,0 +1,158 @@
+import logging
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import PyMongoError
+
+from app.core.config import settings
+from app.db import db
+from app.services.fetch_news import NewsFetcher
+
+logger = logging.getLogger(__name__)
+
+# Partial indexes only accept a subset of query operators ($exists: true but not $ne or
+# $exists: false), so this is the closest superset of NewsFetcher.VALID_NEWS_FILTER; the
+# planner can use it because every valid-article query implies it.
+VALID_NEWS_PARTIAL_FILTER = {
+    field: {"$exists": True} for field in ("title", "summary", "sentiment", "embedding")
+}
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "user_data": [
+        # Login, authentication and registration look users up by email; registration
+        # relies on the uniqueness instead of checking first
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    NewsFetcher().collection_name: [
+        # Most recent valid articles first (news_fetcher)
+        IndexModel([("publication_date", DESCENDING)], name="valid_by_publication_date",
+                   partialFilterExpression=VALID_NEWS_PARTIAL_FILTER),
+        # Publication windows of index builds, polling and reconciliation
+        IndexModel([("publication_date", ASCENDING)], name="publication_date_1"),
+    ],
+}
+
+
+class HotQuery(NamedTuple):
+    name: str
+    collection: str
+    filter: Dict
+    sort: Optional[List] = None
+    limit: int = 0
+
+
+def hot_queries() -> List[HotQuery]:
+    """
+    Representative shapes of the queries served on every request or refresh, which must
+    never fall back to a collection scan.
+    """
+    news_fetcher = NewsFetcher()
+    return [
+        HotQuery("user_by_email", "user_data", {"email": "explain@example.com"}, limit=1),
+        HotQuery("recent_valid_news", news_fetcher.collection_name, news_fetcher.valid_news_filter(),
+                 sort=[("publication_date", DESCENDING)], limit=500),
+        HotQuery("valid_news_in_window", news_fetcher.collection_name, news_fetcher.valid_news_filter(0.0)),
+    ]
+
+
+async def ensure_indexes() -> List[str]:
+    """
+    Create every index in INDEXES; existing ones are left alone. Returns the index names.
+    Each collection is handled on its own so one failure does not skip the others; the first
+    error is raised once all were tried. Fails (DuplicateKeyError) if existing users share an
+    email, until the duplicates are removed.
+    """
+    names, errors = [], []
+    for collection, indexes in INDEXES.items():
+        try:
+            names.extend(await db[collection].create_indexes(indexes))
+        except PyMongoError as e:
+            logger.error("Could not create the indexes of %s: %s", collection, e)
+            errors.append(e)
+    if errors:
+        raise errors[0]
+    return names
+
+
+async def missing_unique_indexes() -> List[str]:
+    """
+    Unique indexes of INDEXES that do not exist (as unique) in the database. The application
+    relies on them for correctness, e.g. registration on `email_unique` to reject duplicates.
+    """
+    missing = []
+    for collection, indexes in INDEXES.items():
+        unique = [index.document["name"] for index in indexes if index.document.get("unique")]
+        if not unique:
+            continue
+        existing = await db[collection].index_information()
+        missing.extend(f"{collection}.{name}" for name in unique if not existing.get(name, {}).get("unique"))
+    return missing
+
+
+def _plan_stages(plan) -> Iterator[str]:
+    """
+    Every stage name in an explain plan tree, classic or slot-based engine alike.
+    """
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _plan_stages(item)
+
+
+async def verify_query_plans() -> List[str]:
+    """
+    Explain every hot query and describe the ones whose winning plan scans a whole
+    collection (or that could not be explained). An empty list means all plans use an index.
+    """
+    problems = []
+    for query in hot_queries():
+        cursor = db[query.collection].find(query.filter)
+        if query.sort:
+            cursor = cursor.sort(query.sort)
+        if query.limit:
+            cursor = cursor.limit(query.limit)
+        try:
+            explanation = await cursor.explain()
+        except PyMongoError as e:
+            problems.append(f"{query.name}: explain failed: {e}")
+            continue
+        stages = set(_plan_stages(explanation.get("queryPlanner", {}).get("winningPlan", {})))
+        if "COLLSCAN" in stages:
+            problems.append(f"{query.name}: collection scan on {query.collection} (plan stages: {sorted(stages)})")
+    return problems
+
+
+async def bootstrap_indexes(check: Optional[str] = None):
+    """
+    Startup hook: ensure the indexes (unless disabled), then verify the hot query plans.
+    With check "fail" a missing index or a collection scan stops the application; with
+    "warn" it is logged. A missing unique index always stops it, whatever the check.
+    """
+    check = settings.index_check if check is None else check
+    if settings.index_bootstrap:
+        try:
+            names = await ensure_indexes()
+            logger.info("Indexes ensured: %s", ", ".join(names))
+        except PyMongoError:
+            logger.exception("Could not create the required indexes")
+            if check == "fail":
+                raise
+
+    missing = await missing_unique_indexes()
+    if missing:
+        raise RuntimeError(
+            f"Required unique indexes are missing: {', '.join(missing)}. Remove duplicate values "
+            "and run python -m app.manage ensure-indexes"
+        )
+
+    if check == "off":
+        return
+    problems = await verify_query_plans()
+    for problem in problems:
+        logger.error("Query plan check: %s", problem)
+    if problems and check == "fail":
+        raise RuntimeError(f"{len(problems)} hot queries would scan a whole collection: {'; '.join(problems)}")
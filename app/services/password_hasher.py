@@ -0,0 +1,97 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+
+from passlib.context import CryptContext
+
+# One context per bcrypt cost, created lazily inside each worker process
+_contexts: Dict[int, CryptContext] = {}
+
+
+def _context(rounds: int) -> CryptContext:
+    if rounds not in _contexts:
+        _contexts[rounds] = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+    return _contexts[rounds]
+
+
+def _hash(password: str, rounds: int) -> str:
+    return _context(rounds).hash(password)
+
+
+def _warm_up(rounds: int):
+    _context(rounds)
+
+
+def _verify(password: str, hashed_password: str, rounds: int) -> bool:
+    return _context(rounds).verify(password, hashed_password)
+
+
+def default_workers() -> int:
+    """
+    Share the CPUs between the bcrypt pools of all uvicorn workers on the host.
+    """
+    web_workers = int(os.environ.get("WEB_CONCURRENCY") or 1)
+    return max(1, (os.cpu_count() or 1) // max(1, web_workers))
+
+
+class PasswordHasherBusy(Exception):
+    """
+    Raised instead of queueing when too many hash operations are already pending.
+    """
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt in a dedicated process pool so password work neither blocks the event loop
+    nor competes with request handling for the GIL.
+    """
+    def __init__(self, rounds: int = 12, workers: int = 0, max_pending: int = 0):
+        self.rounds = rounds
+        self.workers = workers or default_workers()
+        self.max_pending = max_pending or self.workers * 4
+        self.context = _context(rounds)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: forking a process that runs an event loop and driver threads is unsafe
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    async def _submit(self, fn, *args):
+        if self._pending >= self.max_pending:
+            raise PasswordHasherBusy(f"{self._pending} password operations already pending")
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool(), fn, *args)
+        finally:
+            self._pending -= 1
+
+    async def warm_up(self):
+        """
+        Start the worker processes and load passlib in them before the first login arrives.
+        """
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(
+            loop.run_in_executor(self._pool(), _warm_up, self.rounds) for _ in range(self.workers)
+        ))
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(_hash, password, self.rounds)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._submit(_verify, password, hashed_password, self.rounds)
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        """
+        True when the stored hash uses a different cost than the configured one.
+        """
+        return self.context.needs_update(hashed_password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -1,21 +1,104 @@
 
-import google.generativeai as genai
-
-from typing import List, Dict
+import asyncio
+import logging
+from typing import List, Dict, Optional
 import numpy as np
+from pymongo.errors import PyMongoError
+from app.core.config import settings
+from app.core.metrics import registry, stage_timer
+from app.security import invalidate_user
 from app.services.fetch_news import NewsFetcher
+from app.services.article_index import ArticleIndex, article_index as shared_article_index
+from app.services.embedding_provider import EmbeddingProvider, EmbeddingUnavailable, get_embedding_provider
+from app.services.facets import FacetFilter
+from app.services.batch_recommendations import fresh_precomputed
+from app.services.trending import TrendingList, trending as shared_trending
+from app.services.user_profile import preference_key, remember_preference_vector, stored_preference_vector
+
+logger = logging.getLogger(__name__)
+
+RECOMMENDATION_ERRORS = registry.counter(
+    "recommendation_errors_total", "Recommendation requests that failed and fell back to the trending list"
+)
+RECOMMENDATION_FALLBACKS = registry.counter(
+    "recommendation_fallbacks_total", "Recommendations served without a fresh preference embedding", ["source"]
+)
 
 class PersonalizedRecommender:
-    def __init__(self, genai_api_key: str, model: str):
+    def __init__(self, embedding_provider: EmbeddingProvider = None, article_index: ArticleIndex = None,
+                 trending: TrendingList = None):
         # Constructor to initialize the recommender system.
-        genai.configure(api_key=genai_api_key)
-        self.embedding_model = model
+        self.embedding_provider = embedding_provider or get_embedding_provider()
+        self.embedding_model = self.embedding_provider.model
         self.news_fetcher = NewsFetcher()
+        self.article_index = article_index or shared_article_index
+        self.trending = trending or shared_trending
+
+    async def generate_embedding(self, text: str) -> np.ndarray:
+        # Cached per (model, normalized text); preferences rarely change between requests.
+        with stage_timer("embedding"):
+            return await self.embedding_provider.embed(text)
 
-    def generate_embedding(self, text: str) -> np.ndarray:
-       
-        response = genai.embed_content(model=self.embedding_model, content=text)#self.gemini_client.embed_text(text)
-        return np.array(response["embedding"])
+    async def preference_embedding(self, user_preferences: str, user: Optional[Dict] = None) -> Optional[np.ndarray]:
+        """
+        Embedding of the user's preferences. When the embedding backend is unavailable, the
+        last one stored for the user instead, or None. Fresh embeddings of changed
+        preferences are stored for next time.
+        """
+        try:
+            embedding = await self.generate_embedding(user_preferences)
+        except EmbeddingUnavailable as e:
+            stored = stored_preference_vector(user) if user is not None else None
+            logger.debug("Preference embedding unavailable (%s), stored vector: %s", e, stored is not None)
+            if stored is not None:
+                RECOMMENDATION_FALLBACKS.inc(source="stored_preference")
+            return stored
+
+        if user is not None:
+            key = preference_key(self.embedding_model, user_preferences)
+            if user.get("preference_embedding_key") != key:
+                try:
+                    await remember_preference_vector(user["email"], key, embedding)
+                    invalidate_user(user["email"])
+                except PyMongoError:
+                    logger.warning("Could not store the preference embedding of %s", user["email"], exc_info=True)
+        return embedding
+
+    def trending_recommendations(self, limit: int, exclude_ids: List[str],
+                                 facets: Optional[FacetFilter] = None) -> List[Dict]:
+        RECOMMENDATION_FALLBACKS.inc(source="trending")
+        return self.trending.recommendations(self.article_index, limit, exclude_ids, facets)
+
+    async def warm_up(self):
+        """
+        Exercise the embedding call and a full scoring pass so the first real request
+        does not pay for connection setup, lazy imports or BLAS initialization.
+        """
+        await self.article_index.ensure_loaded()
+        try:
+            query = await self.generate_embedding("news")
+        except Exception as e:
+            logger.warning("Embedding warm-up failed: %s", e)
+            query = np.ones(settings.embedding_dim)
+        await asyncio.to_thread(self.article_index.search, query, 10)
+
+    def precomputed_recommendations(self, user: Dict, limit: int, diversify: bool = False,
+                                    diversity: Optional[float] = None, dedupe: bool = True) -> Optional[List[Dict]]:
+        """
+        Serve the batch-computed ranking when it is still valid for this user, else None.
+        With `diversify` the whole stored list is the candidate pool for the diversity re-rank.
+        """
+        precomputed = fresh_precomputed(user, limit)
+        if precomputed is None:
+            return None
+        if diversify:
+            recommendations = self.article_index.diversify(
+                precomputed["ids"], precomputed["scores"], limit, diversity, dedupe
+            )
+        else:
+            recommendations = self.article_index.hydrate(precomputed["ids"][:limit], precomputed["scores"][:limit])
+        # Articles removed since the batch run leave gaps; rescore live instead
+        return recommendations if len(recommendations) == limit else None
 
     def compute_similarity(self, user_embedding: np.ndarray, article_embedding: np.ndarray) -> float:
         # Compute cosine similarity between user and article embeddings.
@@ -27,62 +110,65 @@ class PersonalizedRecommender:
     def aggregate_interactions(self, interaction_embeddings: List[np.ndarray]) -> np.ndarray:
         # Aggregate user interaction embeddings by averaging.
         if not interaction_embeddings:
-            return np.zeros(768)  # Return a zero vector if no interactions are found
+            return np.zeros(settings.embedding_dim)  # Return a zero vector if no interactions are found
         return np.mean(interaction_embeddings, axis=0)
 
-    def recommend(self, user_preferences: str, user_interactions: List[str], limit: int = 5) -> List[Dict]:
+    async def recommend(self, user_preferences: str, user_interactions: List[str], limit: int = 5,
+                  interaction_profile: Optional[np.ndarray] = None, diversify: bool = False,
+                  diversity: Optional[float] = None, pool_size: Optional[int] = None,
+                  dedupe: bool = True, user: Optional[Dict] = None,
+                  facets: Optional[FacetFilter] = None) -> List[Dict]:
         """
         Provide personalized recommendations based on user interactions and preferences.
+        Without a preference embedding the interaction profile alone is used, else (and on
+        any other failure) the trending list; every path honours `facets`.
         """
         try:
-            if not user_interactions:
-                print("No interaction data found for user. Defaulting to preferences only.")
-                interaction_embeddings = []
+            if interaction_profile is not None:
+                aggregated_embedding = interaction_profile
             else:
-                # Fetch news details and embeddings for interacted news
-                interaction_news = self.news_fetcher.fetch_news_by_ids(user_interactions)
-                interaction_embeddings = [np.array(item['embedding']) for item in interaction_news]
-                #print(user_interactions)
-
-            # Aggregate interaction embeddings
-            aggregated_embedding = self.aggregate_interactions(interaction_embeddings)
+                if not user_interactions:
+                    logger.debug("No interaction data found for user. Defaulting to preferences only.")
+                    interaction_embeddings = []
+                else:
+                    # Fetch news details and embeddings for interacted news
+                    interaction_news = await self.news_fetcher.fetch_news_by_ids(user_interactions)
+                    interaction_embeddings = [np.array(item['embedding']) for item in interaction_news]
+
+                # Aggregate interaction embeddings
+                aggregated_embedding = self.aggregate_interactions(interaction_embeddings)
             
             # Generate embedding for explicit user preferences
-            preference_embedding = self.generate_embedding(user_preferences)
-
-            # Combine the aggregated and preference embeddings (weighted sum)
-            user_embedding = 0.5 * aggregated_embedding + 0.5 * preference_embedding
-
-            # Fetch all news articles
-            articles = self.news_fetcher.news_fetcher(limit=500)
-
-            # Filter out already interacted articles
-            interacted_ids = set(user_interactions)
-            articles = [article for article in articles if str(article["_id"]) not in interacted_ids]
-            
-            # Calculate similarity scores
-            recommendations = []
-            for article in articles:
-                article_embedding = np.array(article['embedding'])
-                similarity = self.compute_similarity(user_embedding, article_embedding)
-
-                # Remove unnecessary fields before adding to recommendations
-                article.pop("embedding", None)
-                article.pop("text", None)
-                recommendations.append({**article, "similarity": similarity})
-
-            # Sort articles by similarity score in descending order
-            recommendations = sorted(recommendations, key=lambda x: x["similarity"], reverse=True)
-
-            # Return top N recommendations
-            return recommendations[:limit]
-        except Exception as e:
-            print(f"An error occurred during recommendation: {e}")
-            return []
+            preference_embedding = await self.preference_embedding(user_preferences, user)
+
+            if preference_embedding is not None:
+                # Combine the aggregated and preference embeddings (weighted sum)
+                user_embedding = 0.5 * aggregated_embedding + 0.5 * preference_embedding
+            elif np.any(aggregated_embedding):
+                RECOMMENDATION_FALLBACKS.inc(source="interaction_profile")
+                user_embedding = aggregated_embedding
+            else:
+                return self.trending_recommendations(limit, user_interactions, facets)
+
+            # Score the whole indexed collection, skipping already interacted articles.
+            # NumPy releases the GIL, so scoring in a thread keeps the event loop responsive.
+            await self.article_index.ensure_loaded()
+            if diversify:
+                return await asyncio.to_thread(
+                    self.article_index.search_diverse, user_embedding, limit, user_interactions,
+                    pool_size, diversity, dedupe, facets,
+                )
+            return await asyncio.to_thread(
+                self.article_index.search, user_embedding, limit, user_interactions, facets
+            )
+        except Exception:
+            RECOMMENDATION_ERRORS.inc()
+            logger.exception("An error occurred during recommendation")
+            return self.trending_recommendations(limit, user_interactions, facets)
 
 
     '''
-    def recommend(self, user_preferences: str, limit: int = 5) -> List[Dict]:
+    async def recommend(self, user_preferences: str, limit: int = 5) -> List[Dict]:
         # personalized recommendations for the user.
 
         # Fetch news articles
@@ -0,0 +1,55 @@
+from typing import Tuple
+
+import numpy as np
+
+# Rows dequantized at a time: small enough for the float32 block to stay in L2 between the
+# conversion and the matrix-vector product, so the scan streams one byte per dimension
+DEQUANTIZE_BLOCK_BYTES = 768 * 1024
+
+
+def quantize_rows(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Symmetric per-row int8 quantization: row ~= codes * scale, with codes in [-127, 127].
+    Returns (codes, scales); all-zero rows get a scale of 0.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    scales = (np.abs(matrix).max(axis=1) / 127).astype(np.float32) if matrix.size else \
+        np.zeros(len(matrix), dtype=np.float32)
+    safe = np.where(scales > 0, scales, 1).astype(np.float32)
+    codes = np.rint(matrix / safe[:, None]).astype(np.int8)
+    return codes, scales
+
+
+class QuantizedMatrix:
+    """
+    int8 copy of an embedding matrix, a quarter of its float32 size, for approximate
+    exhaustive scoring; candidates are meant to be re-ranked with the float rows.
+    """
+    def __init__(self, codes: np.ndarray, scales: np.ndarray):
+        self.codes = codes
+        self.scales = scales
+
+    @classmethod
+    def from_matrix(cls, matrix: np.ndarray) -> "QuantizedMatrix":
+        return cls(*quantize_rows(matrix))
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def scores(self, query: np.ndarray, start: int = 0) -> np.ndarray:
+        """
+        Approximate dot products of rows `start:` with a float32 query.
+        """
+        codes, scales = self.codes[start:], self.scales[start:]
+        out = np.empty(len(codes), dtype=np.float32)
+        if len(codes) == 0:
+            return out
+        block_rows = max(16, DEQUANTIZE_BLOCK_BYTES // (codes.shape[1] * 4 or 1))
+        block = np.empty((min(block_rows, len(codes)), codes.shape[1]), dtype=np.float32)
+        for first in range(0, len(codes), block_rows):
+            rows = codes[first:first + block_rows]
+            dequantized = block[:len(rows)]
+            np.copyto(dequantized, rows, casting="unsafe")
+            np.matmul(dequantized, query, out=out[first:first + len(rows)])
+        out *= scales
+        return out
@@ -0,0 +1,97 @@
+import base64
+import binascii
+import json
+import secrets
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import register_cache
+from app.services.cache import TTLCache
+
+
+class InvalidCursor(ValueError):
+    """
+    The cursor is malformed or was not issued for this user.
+    """
+
+
+class ExpiredCursor(LookupError):
+    """
+    The ranked list behind the cursor is not cached in this process (expired, invalidated,
+    or ranked by another worker).
+    """
+
+
+class Cursor(NamedTuple):
+    """
+    Position in a ranked list, with what it takes to rank it again: the profile version it
+    was ranked for and the ranking options of its first page.
+    """
+    session: str
+    offset: int
+    version: Optional[int] = None
+    options: Dict = {}
+
+
+def encode_cursor(cursor: Cursor) -> str:
+    raw = json.dumps(list(cursor), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        session, offset, version, options = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise InvalidCursor(cursor)
+    if not isinstance(session, str) or not session or not isinstance(offset, int) or offset < 0 \
+            or not isinstance(options, dict):
+        raise InvalidCursor(cursor)
+    return Cursor(session, offset, version, options)
+
+
+class RankedListCache:
+    """
+    Per-user ranked recommendation ids stored by the first page request, so later pages are
+    slices of the same ranking. Lists of an older `profile_version` are never served.
+    """
+    def __init__(self, maxsize: int, ttl: float):
+        self.cache = TTLCache(maxsize, ttl)
+
+    def start(self, email: str, profile_version, ids: List[str], scores: List[float],
+              options: Optional[Dict] = None, session: Optional[str] = None) -> str:
+        """
+        Store a ranking for the user, replacing any previous one, and return its session id
+        (a new one unless the ranking is rebuilt for an existing `session`).
+        """
+        session = session or secrets.token_urlsafe(8)
+        self.cache.set(email, {
+            "session": session, "version": profile_version, "ids": ids, "scores": scores, "options": options or {},
+        })
+        return session
+
+    def page(self, email: str, profile_version, cursor: Cursor, limit: int) -> Tuple[List[str], List[float], Optional[str]]:
+        """
+        Ids and scores of the page starting at `cursor`, plus the cursor of the following page
+        (None after the last one).
+        """
+        if limit < 1:
+            raise ValueError(f"limit must be positive, got {limit}")
+        entry = self.cache.get(email)
+        if entry is None or entry["session"] != cursor.session or entry["version"] != profile_version:
+            raise ExpiredCursor(cursor.session)
+        # Issued cursors always point inside the list
+        if cursor.offset >= len(entry["ids"]):
+            raise InvalidCursor(cursor.session)
+        end = cursor.offset + limit
+        next_cursor = None
+        if end < len(entry["ids"]):
+            next_cursor = encode_cursor(Cursor(cursor.session, end, profile_version, entry["options"]))
+        return entry["ids"][cursor.offset:end], entry["scores"][cursor.offset:end], next_cursor
+
+    def invalidate(self, email: str):
+        self.cache.pop(email)
+
+
+ranked_lists = RankedListCache(settings.ranked_list_cache_size, settings.ranked_list_ttl_seconds)
+register_cache("ranked_list", ranked_lists.cache)
@@ -0,0 +1,71 @@
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+
+# Epoch numbers above this are milliseconds, below it seconds (1e11 s is in the year 5138)
+EPOCH_MILLISECONDS_THRESHOLD = 1e11
+
+
+def publication_timestamp(value) -> float:
+    """
+    Seconds since the epoch of a `publication_date` stored as a BSON date, an ISO 8601 string
+    or a number (seconds or milliseconds); -inf when missing or unparseable, so undated
+    articles sort as the oldest.
+    """
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return float("-inf")
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value / 1000 if value > EPOCH_MILLISECONDS_THRESHOLD else float(value)
+    return float("-inf")
+
+
+def published_since_conditions(timestamp: float) -> List[Dict]:
+    """
+    Query conditions on `publication_date`, one per form `publication_timestamp` accepts,
+    matching the values at or after `timestamp`; MongoDB only compares values of the same
+    BSON type. Strings are compared as text a day early so that any UTC offset is covered,
+    which may admit a few older articles; the in-memory window is exact.
+    """
+    since = datetime.fromtimestamp(timestamp, timezone.utc)
+    return [
+        {"$gte": since},
+        {"$gte": (since - timedelta(days=1)).strftime("%Y-%m-%dT%H:%M:%S")},
+        {"$gte": timestamp, "$lte": EPOCH_MILLISECONDS_THRESHOLD},
+        {"$gte": timestamp * 1000},
+    ]
+
+
+def window_cutoff(now: Optional[float] = None) -> Optional[float]:
+    """
+    Oldest publication timestamp inside the configured recency window, or None without one.
+    """
+    if settings.recency_window_days <= 0:
+        return None
+    return (time.time() if now is None else now) - settings.recency_window_days * 86400
+
+
+def recency_blend(scores: np.ndarray, published: np.ndarray, now: Optional[float] = None) -> np.ndarray:
+    """
+    Blend similarity scores with an exponential recency decay computed over the whole block:
+    (1 - weight) * score + weight * 0.5 ** (age / half_life). Undated articles decay to 0.
+    Returns `scores` unchanged when no half-life is configured.
+    """
+    if settings.recency_half_life_hours <= 0 or len(scores) == 0:
+        return scores
+    now = time.time() if now is None else now
+    # Timestamps need float64; ages and everything after them fit float32
+    age = np.maximum(now - published, 0.0).astype(np.float32)
+    decay = np.exp2(age * np.float32(-1 / (settings.recency_half_life_hours * 3600)))
+    weight = np.float32(settings.recency_weight)
+    return (1 - weight) * scores + weight * decay
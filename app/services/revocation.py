@@ -0,0 +1,108 @@
+import time
+from datetime import datetime, timezone
+from typing import Dict, Set
+
+from app.services.cache import TTLCache
+
+
+class RevocationStore:
+    """
+    Remembers revoked token ids (`jti`) until the tokens would have expired anyway.
+    """
+    async def revoke(self, jti: str, expires_at: float):
+        raise NotImplementedError
+
+    async def is_revoked(self, jti: str) -> bool:
+        raise NotImplementedError
+
+
+class InMemoryRevocationStore(RevocationStore):
+    """
+    Per-process store. Entries are grouped into buckets by expiry time, so pruning drops whole
+    expired buckets instead of scanning every entry; lookups are a single dict access.
+    """
+    def __init__(self, bucket_seconds: int = 60):
+        self.bucket_seconds = bucket_seconds
+        self._expiry: Dict[str, float] = {}
+        self._buckets: Dict[int, Set[str]] = {}
+        self._next_prune = 0.0
+
+    def __len__(self) -> int:
+        return len(self._expiry)
+
+    def _prune(self, now: float):
+        if now < self._next_prune:
+            return
+        current = int(now // self.bucket_seconds)
+        for bucket in [bucket for bucket in self._buckets if bucket < current]:
+            for jti in self._buckets.pop(bucket):
+                self._expiry.pop(jti, None)
+        self._next_prune = (current + 1) * self.bucket_seconds
+
+    def add(self, jti: str, expires_at: float):
+        now = time.time()
+        self._prune(now)
+        if expires_at <= now:
+            return
+        self._expiry[jti] = expires_at
+        self._buckets.setdefault(int(expires_at // self.bucket_seconds), set()).add(jti)
+
+    def contains(self, jti: str) -> bool:
+        now = time.time()
+        self._prune(now)
+        expires_at = self._expiry.get(jti)
+        return expires_at is not None and expires_at > now
+
+    async def revoke(self, jti: str, expires_at: float):
+        self.add(jti, expires_at)
+
+    async def is_revoked(self, jti: str) -> bool:
+        return self.contains(jti)
+
+
+class MongoRevocationStore(RevocationStore):
+    """
+    Store shared by all workers through a MongoDB collection with a TTL index on `expires_at`.
+    Revocations found in (or written to) MongoDB are remembered locally until expiry; misses are
+    cached for `negative_ttl` seconds, which bounds how long other workers may still accept a
+    token after logout.
+    """
+    def __init__(self, collection, negative_ttl: float = 5, negative_cache_size: int = 100000):
+        self.collection = collection
+        self.local = InMemoryRevocationStore()
+        self.not_revoked = TTLCache(negative_cache_size, negative_ttl)
+        self._ttl_index_ready = False
+
+    async def _collection(self):
+        if not self._ttl_index_ready:
+            await self.collection.create_index("expires_at", expireAfterSeconds=0)
+            self._ttl_index_ready = True
+        return self.collection
+
+    async def revoke(self, jti: str, expires_at: float):
+        self.local.add(jti, expires_at)
+        self.not_revoked.pop(jti)
+        collection = await self._collection()
+        await collection.update_one(
+            {"_id": jti},
+            {"$set": {"expires_at": datetime.fromtimestamp(expires_at, tz=timezone.utc)}},
+            upsert=True,
+        )
+
+    async def is_revoked(self, jti: str) -> bool:
+        if self.local.contains(jti):
+            return True
+        if self.not_revoked.get(jti):
+            return False
+
+        collection = await self._collection()
+        doc = await collection.find_one({"_id": jti}, {"expires_at": 1})
+        if doc is None:
+            self.not_revoked.set(jti, True)
+            return False
+
+        expires_at = doc["expires_at"]
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        self.local.add(jti, expires_at.timestamp())
+        return expires_at.timestamp() > time.time()
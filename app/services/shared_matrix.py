@@ -0,0 +1,395 @@
+import asyncio
+import fcntl
+import glob
+import logging
+import mmap
+import os
+import struct
+import time
+from collections.abc import Sequence
+from typing import Dict, List, Optional, Tuple
+
+import bson
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.services.ann_index import IVFIndex
+from app.services.article_index import ArticleIndex, ArticleSnapshot, article_index
+from app.services.article_refresher import ArticleRefresher, article_refresher
+from app.services.facets import FACET_FIELDS, FacetIndex
+from app.services.quantization import QuantizedMatrix
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"IPARTMAT"
+FORMAT_VERSION = 4
+# magic, format version, embedding dimension, generation, rows, publish time, then the offsets
+# of the matrix, publication times, ids, metadata offsets and metadata, the byte lengths of
+# the ids and metadata, the offsets of the int8 codes and scales (0 without them), the
+# offset of the facet codes, offset and byte length of the facet vocabulary, and the IVF
+# list count, member count and offsets of its centroids, list boundaries, member rows and
+# member vectors (0 without an IVF index)
+HEADER = struct.Struct("<8sIIQQdQQQQQQQQQQQQQQQQQQ")
+# Sections start on cache-line boundaries so the arrays mapped over them are aligned
+ALIGNMENT = 64
+# Generations kept on disk; older files are unlinked, which leaves existing mappings valid
+KEEP_GENERATIONS = 2
+
+SHARED_MATRIX_GENERATION = registry.gauge("shared_matrix_generation", "Generation of the shared article matrix this worker serves")
+SHARED_MATRIX_BUILDER = registry.gauge("shared_matrix_builder", "1 while this worker builds and publishes the shared article matrix")
+SHARED_MATRIX_PUBLISH_SECONDS = registry.histogram(
+    "shared_matrix_publish_seconds", "Time to write and map one generation of the shared article matrix",
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0),
+)
+SHARED_MATRIX_ERRORS = registry.counter("shared_matrix_sync_errors_total", "Failed publishes or swaps of the shared article matrix")
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+class SharedMetadata(Sequence):
+    """
+    Article metadata stored as consecutive BSON documents in a mapped generation, decoded on
+    access so that only the rows a request returns are materialized in the worker.
+    """
+    def __init__(self, buffer: mmap.mmap, offsets: np.ndarray, base: int):
+        self._buffer = buffer
+        self._offsets = offsets
+        self._base = base
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(len(self)))]
+        row = int(row)
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        start = self._base + int(self._offsets[row])
+        return bson.decode(self._buffer[start:self._base + int(self._offsets[row + 1])])
+
+
+class SharedMatrixStore:
+    """
+    Generations of the article snapshot as files in `directory` (a tmpfs such as /dev/shm),
+    each renamed into place once written; the `current` file names the newest one.
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock_file = None
+        # news id -> (metadata dict, its BSON encoding) from the last publish
+        self._encoded: Dict[str, Tuple[Dict, bytes]] = {}
+
+    def _path(self, generation: int) -> str:
+        return os.path.join(self.directory, f"articles-{generation:012d}.bin")
+
+    @property
+    def _current_path(self) -> str:
+        return os.path.join(self.directory, "current")
+
+    def acquire_builder(self) -> bool:
+        """
+        Try to become the host's builder without blocking. The lock is released when this
+        process exits, so another worker can take over.
+        """
+        if self._lock_file is not None:
+            return True
+        os.makedirs(self.directory, exist_ok=True)
+        lock_file = open(os.path.join(self.directory, "builder.lock"), "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        # Left behind by a builder that died mid-write
+        for path in glob.glob(os.path.join(self.directory, ".articles-*.tmp")):
+            os.remove(path)
+        return True
+
+    def release_builder(self):
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def current_generation(self) -> int:
+        """
+        Newest published generation, 0 before the first publish.
+        """
+        try:
+            with open(self._current_path) as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _encode_metadata(self, snapshot: ArticleSnapshot) -> List[bytes]:
+        # Metadata dicts are shared between successive snapshots, so only changed articles
+        # are encoded again
+        encoded, cache = [], {}
+        for news_id, doc in zip(snapshot.ids, snapshot.metadata):
+            cached = self._encoded.get(news_id)
+            if cached is None or cached[0] is not doc:
+                cached = (doc, bson.encode(doc))
+            cache[news_id] = cached
+            encoded.append(cached[1])
+        self._encoded = cache
+        return encoded
+
+    def publish(self, snapshot: ArticleSnapshot) -> int:
+        """
+        Write `snapshot` as the next generation and make it current. Builder only.
+        """
+        generation = self.current_generation() + 1
+        rows = len(snapshot)
+        matrix = np.ascontiguousarray(snapshot.matrix, dtype=np.float32)
+        dim = matrix.shape[1] if rows else 0
+        published = np.ascontiguousarray(snapshot.published, dtype=np.float64)
+        ids = "\n".join(snapshot.ids).encode("utf-8")
+        metadata = self._encode_metadata(snapshot)
+        metadata_offsets = np.zeros(rows + 1, dtype=np.uint64)
+        np.cumsum(np.fromiter(map(len, metadata), dtype=np.uint64, count=rows), out=metadata_offsets[1:])
+
+        matrix_offset = _align(HEADER.size)
+        published_offset = _align(matrix_offset + matrix.nbytes)
+        ids_offset = _align(published_offset + published.nbytes)
+        metadata_offsets_offset = _align(ids_offset + len(ids))
+        metadata_offset = _align(metadata_offsets_offset + metadata_offsets.nbytes)
+        facet_codes = np.stack([snapshot.facets.codes[field] for field in FACET_FIELDS]).astype(np.int32, copy=False)
+        facet_values = bson.encode(snapshot.facets.values)
+        facet_codes_offset = _align(metadata_offset + int(metadata_offsets[-1]))
+        facet_values_offset = _align(facet_codes_offset + facet_codes.nbytes)
+        sections = [(matrix_offset, matrix), (published_offset, published), (ids_offset, ids),
+                    (metadata_offsets_offset, metadata_offsets), (facet_codes_offset, facet_codes),
+                    (facet_values_offset, facet_values)]
+        codes_offset = scales_offset = 0
+        if snapshot.quantized is not None:
+            codes_offset = _align(facet_values_offset + len(facet_values))
+            scales_offset = _align(codes_offset + snapshot.quantized.codes.nbytes)
+            sections += [(codes_offset, np.ascontiguousarray(snapshot.quantized.codes)),
+                         (scales_offset, np.ascontiguousarray(snapshot.quantized.scales))]
+        ann_lists = ann_members = centroids_offset = bounds_offset = members_offset = vectors_offset = 0
+        if snapshot.ann is not None and snapshot.ann.is_trained:
+            bounds, member_ids, vectors = snapshot.ann.packed()
+            # Members are stored as snapshot rows; the ids are already in the file
+            members = np.fromiter((snapshot.id_to_row[news_id] for news_id in member_ids), dtype=np.int64,
+                                  count=len(member_ids))
+            centroids = np.ascontiguousarray(snapshot.ann.centroids, dtype=np.float32)
+            ann_lists, ann_members = len(centroids), len(members)
+            last_end = max(offset + (data.nbytes if isinstance(data, np.ndarray) else len(data))
+                           for offset, data in sections)
+            centroids_offset = _align(last_end)
+            bounds_offset = _align(centroids_offset + centroids.nbytes)
+            members_offset = _align(bounds_offset + bounds.nbytes)
+            vectors_offset = _align(members_offset + members.nbytes)
+            sections += [(centroids_offset, centroids), (bounds_offset, bounds), (members_offset, members),
+                         (vectors_offset, np.ascontiguousarray(vectors, dtype=np.float32))]
+        header = HEADER.pack(
+            MAGIC, FORMAT_VERSION, dim, generation, rows, time.time(), matrix_offset, published_offset,
+            ids_offset, metadata_offsets_offset, metadata_offset, len(ids), int(metadata_offsets[-1]),
+            codes_offset, scales_offset, facet_codes_offset, facet_values_offset, len(facet_values),
+            ann_lists, ann_members, centroids_offset, bounds_offset, members_offset, vectors_offset,
+        )
+
+        os.makedirs(self.directory, exist_ok=True)
+        temporary = os.path.join(self.directory, f".articles-{generation:012d}.tmp")
+        with open(temporary, "wb") as f:
+            f.write(header)
+            f.seek(metadata_offset)
+            f.writelines(metadata)
+            for offset, data in sections:
+                f.seek(offset)
+                f.write(data)
+        os.replace(temporary, self._path(generation))
+
+        pointer = os.path.join(self.directory, ".current.tmp")
+        with open(pointer, "w") as f:
+            f.write(f"{generation}\n")
+        os.replace(pointer, self._current_path)
+        self._prune(generation)
+        return generation
+
+    def _prune(self, generation: int):
+        for path in glob.glob(os.path.join(self.directory, "articles-*.bin")):
+            try:
+                old = int(os.path.basename(path)[len("articles-"):-len(".bin")])
+            except ValueError:
+                continue
+            if old <= generation - KEEP_GENERATIONS:
+                os.remove(path)
+
+    def open(self, generation: int, like: Optional[ArticleSnapshot] = None) -> ArticleSnapshot:
+        """
+        Map a generation read-only as a snapshot. With `like`, the snapshot it was published
+        from, its ids, metadata, facets and ANN index are reused for incremental updates.
+        """
+        with open(self._path(generation), "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(buffer) < HEADER.size:
+            raise ValueError(f"{self._path(generation)} is truncated")
+        (magic, version, dim, stored_generation, rows, _, matrix_offset, published_offset, ids_offset,
+         metadata_offsets_offset, metadata_offset, ids_length, _, codes_offset,
+         scales_offset, facet_codes_offset, facet_values_offset, facet_values_length, ann_lists, ann_members,
+         centroids_offset, bounds_offset, members_offset, vectors_offset) = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{self._path(generation)} is not a version {FORMAT_VERSION} article matrix")
+        if stored_generation != generation:
+            raise ValueError(f"{self._path(generation)} holds generation {stored_generation}")
+
+        matrix = np.frombuffer(buffer, np.float32, rows * dim, matrix_offset).reshape(rows, dim)
+        published = np.frombuffer(buffer, np.float64, rows, published_offset)
+        quantized = None
+        if codes_offset:
+            quantized = QuantizedMatrix(np.frombuffer(buffer, np.int8, rows * dim, codes_offset).reshape(rows, dim),
+                                        np.frombuffer(buffer, np.float32, rows, scales_offset))
+        if like is not None:
+            snapshot = ArticleSnapshot(matrix, like.ids, like.metadata, published, quantized, like.facets)
+            snapshot.ann = like.ann
+            snapshot.built_at = like.built_at
+            return snapshot
+
+        ids = buffer[ids_offset:ids_offset + ids_length].decode("utf-8").split("\n") if rows else []
+        metadata = SharedMetadata(buffer, np.frombuffer(buffer, np.uint64, rows + 1, metadata_offsets_offset),
+                                  metadata_offset)
+        # Mapped as well, as deriving them would decode every metadata document
+        facet_codes = np.frombuffer(buffer, np.int32, len(FACET_FIELDS) * rows, facet_codes_offset)
+        facets = FacetIndex(
+            dict(zip(FACET_FIELDS, facet_codes.reshape(len(FACET_FIELDS), rows))),
+            bson.decode(buffer[facet_values_offset:facet_values_offset + facet_values_length]),
+        )
+        snapshot = ArticleSnapshot(matrix, ids, metadata, published, quantized, facets)
+        if centroids_offset:
+            members = np.frombuffer(buffer, np.int64, ann_members, members_offset)
+            snapshot.ann = IVFIndex.from_packed(
+                np.frombuffer(buffer, np.float32, ann_lists * dim, centroids_offset).reshape(ann_lists, dim),
+                np.frombuffer(buffer, np.int64, ann_lists + 1, bounds_offset),
+                [ids[row] for row in members.tolist()],
+                np.frombuffer(buffer, np.float32, ann_members * dim, vectors_offset).reshape(ann_members, dim),
+                settings.ann_n_probe,
+            )
+        return snapshot
+
+
+class SharedMatrixSync:
+    """
+    Backs the article index of every worker on a host with one shared matrix. The worker
+    holding the builder lock refreshes and publishes it; the others map the newest generation.
+    """
+    def __init__(self, store: SharedMatrixStore, article_index: ArticleIndex, refresher: ArticleRefresher,
+                 publish_seconds: Optional[float] = None, poll_seconds: Optional[float] = None,
+                 wait_seconds: Optional[float] = None):
+        self.store = store
+        self.article_index = article_index
+        self.refresher = refresher
+        self.publish_seconds = settings.shared_matrix_publish_seconds if publish_seconds is None else publish_seconds
+        self.poll_seconds = settings.shared_matrix_poll_seconds if poll_seconds is None else poll_seconds
+        self.wait_seconds = settings.shared_matrix_wait_seconds if wait_seconds is None else wait_seconds
+        self.role: Optional[str] = None
+        self.generation = 0
+        self._published: Optional[ArticleSnapshot] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """
+        Take the builder role or load the newest generation, then keep in sync in the background.
+        """
+        if self.store.acquire_builder():
+            await self._become_builder()
+        else:
+            self.role = "follower"
+            # Followers never rebuild on their own; new articles arrive with new generations
+            self.article_index.live_updates = True
+            if not await self._wait_for_generation():
+                logger.warning("No shared article matrix after %.0fs, building a private index", self.wait_seconds)
+                await self.article_index.build()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        if self.role == "builder":
+            await self.refresher.stop()
+            SHARED_MATRIX_BUILDER.set(0)
+        self.store.release_builder()
+
+    async def _become_builder(self):
+        logger.info("Building the shared article matrix in %s", self.store.directory)
+        self.role = "builder"
+        SHARED_MATRIX_BUILDER.set(1)
+        self.article_index.live_updates = False
+        await self.article_index.build()
+        await self._publish()
+        self.refresher.start()
+
+    async def _wait_for_generation(self) -> bool:
+        deadline = time.monotonic() + self.wait_seconds
+        while time.monotonic() < deadline:
+            if await self._follow():
+                return True
+            await asyncio.sleep(min(self.poll_seconds, 0.5))
+        return False
+
+    async def _run(self):
+        while True:
+            try:
+                if self.role == "builder":
+                    await asyncio.sleep(self.publish_seconds)
+                    await self._publish()
+                else:
+                    await asyncio.sleep(self.poll_seconds)
+                    if self.store.acquire_builder():
+                        await self._become_builder()
+                    else:
+                        await self._follow()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                SHARED_MATRIX_ERRORS.inc()
+                logger.exception("Shared article matrix sync failed")
+
+    async def _publish(self):
+        """
+        Publish the current snapshot unless it is the one last published, and swap the index
+        over to its mapping so the builder does not hold a private copy as well.
+        """
+        snapshot = self.article_index.snapshot
+        if snapshot is self._published:
+            return
+        with SHARED_MATRIX_PUBLISH_SECONDS.time():
+            generation = await asyncio.to_thread(self.store.publish, snapshot)
+            mapped = await asyncio.to_thread(self.store.open, generation, snapshot)
+        # Skipped when the refresher swapped in a newer snapshot meanwhile; the next round publishes it
+        await self.article_index.use_snapshot(mapped, replaces=snapshot)
+        self._published = mapped
+        self.generation = generation
+        SHARED_MATRIX_GENERATION.set(generation)
+
+    async def _follow(self) -> bool:
+        """
+        Swap to the newest generation if it is newer than the one served. Returns whether a
+        generation is being served.
+        """
+        generation = self.store.current_generation()
+        if generation > self.generation:
+            try:
+                snapshot = await asyncio.to_thread(self.store.open, generation)
+            except FileNotFoundError:
+                return self.generation > 0  # Pruned after a newer publish; picked up next poll
+            # Only generations published without an IVF index leave one to build
+            await self.article_index.use_snapshot(snapshot, build_ann=snapshot.ann is None)
+            self.generation = generation
+            SHARED_MATRIX_GENERATION.set(generation)
+        return self.generation > 0
+
+
+shared_matrix = SharedMatrixSync(SharedMatrixStore(settings.shared_matrix_dir), article_index, article_refresher) \
+    if settings.shared_matrix_dir else None
@@ -0,0 +1,43 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+from app.core.metrics import registry
+
+T = TypeVar("T")
+
+SINGLE_FLIGHT_CALLS = registry.counter(
+    "single_flight_calls_total",
+    "Calls through a single-flight group; outcome=coalesced joined an identical call already in flight",
+    ["name", "outcome"],
+)
+SINGLE_FLIGHT_IN_FLIGHT = registry.gauge("single_flight_in_flight", "Distinct computations currently in flight", ["name"])
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one computation whose result (or
+    exception) they all share; nothing is kept once it finishes. Cancelling one caller
+    does not cancel the computation.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, compute: Callable[[], Awaitable[T]]) -> T:
+        task = self._in_flight.get(key)
+        if task is not None:
+            SINGLE_FLIGHT_CALLS.inc(name=self.name, outcome="coalesced")
+        else:
+            SINGLE_FLIGHT_CALLS.inc(name=self.name, outcome="executed")
+            task = asyncio.ensure_future(compute())
+            self._in_flight[key] = task
+            SINGLE_FLIGHT_IN_FLIGHT.set(len(self._in_flight), name=self.name)
+            task.add_done_callback(lambda done: self._finished(key, done))
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        SINGLE_FLIGHT_IN_FLIGHT.set(len(self._in_flight), name=self.name)
+        if not task.cancelled():
+            task.exception()  # Retrieved here too, in case every caller went away
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.db import db
+from app.services.article_index import ArticleIndex
+from app.services.facets import FacetFilter
+from app.services.recency import window_cutoff
+
+logger = logging.getLogger(__name__)
+
+# Only the tail of each user's interaction list counts, so the list follows current interest
+RECENT_INTERACTIONS_PER_USER = 50
+
+TRENDING_ARTICLES = registry.gauge("trending_articles", "Articles in the in-memory trending list")
+TRENDING_REFRESH_ERRORS = registry.counter("trending_refresh_errors_total", "Failed trending list refreshes")
+
+
+class TrendingList:
+    """
+    Non-personalized fallback ranking: the articles most interacted with across users' recent
+    interactions, recomputed in the background every `refresh_seconds`, topped up with the
+    freshest indexed articles so it is never empty while the index is not.
+    """
+    def __init__(self, size: Optional[int] = None, refresh_seconds: Optional[float] = None):
+        self.size = size or settings.trending_size
+        self.refresh_seconds = settings.trending_refresh_seconds if refresh_seconds is None else refresh_seconds
+        self.ids: List[str] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def refresh(self) -> List[str]:
+        pipeline = [
+            {"$project": {"recent": {"$slice": ["$interaction_list", -RECENT_INTERACTIONS_PER_USER]}}},
+            {"$unwind": "$recent"},
+            {"$group": {"_id": "$recent", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1, "_id": -1}},
+            # Some of them may have left the index or the publication window
+            {"$limit": self.size * 2},
+        ]
+        cursor = await db.user_data.aggregate(pipeline)
+        self.ids = [doc["_id"] async for doc in cursor]
+        TRENDING_ARTICLES.set(len(self.ids))
+        return self.ids
+
+    def start(self):
+        if self.refresh_seconds > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                TRENDING_REFRESH_ERRORS.inc()
+                logger.exception("Trending list refresh failed")
+            await asyncio.sleep(self.refresh_seconds)
+
+    def recommendations(self, article_index: ArticleIndex, limit: int, exclude_ids: Iterable[str] = (),
+                        facets: Optional[FacetFilter] = None) -> List[Dict]:
+        """
+        Up to `limit` trending articles still in the index and its publication window (and
+        passing the facet filter), then the freshest ones. Pure CPU work on the current
+        snapshot; similarity is reported as 0.
+        """
+        snapshot = article_index.snapshot
+        start = snapshot.window_start(window_cutoff())
+        mask = snapshot.facets.mask(facets, start) if facets is not None else None
+        excluded = set(exclude_ids)
+        ids = []
+        for news_id in self.ids:
+            if len(ids) == limit:
+                break
+            row = snapshot.id_to_row.get(news_id, -1)
+            if row >= start and news_id not in excluded and (mask is None or mask[row - start]):
+                ids.append(news_id)
+        # Rows are ordered oldest first
+        chosen = set(ids)
+        for row in range(len(snapshot) - 1, start - 1, -1):
+            if len(ids) >= limit:
+                break
+            news_id = snapshot.ids[row]
+            if news_id not in chosen and news_id not in excluded and (mask is None or mask[row - start]):
+                ids.append(news_id)
+        return article_index.hydrate(ids, [0.0] * len(ids))
+
+
+trending = TrendingList()
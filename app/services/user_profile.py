@@ -0,0 +1,294 @@
+import hashlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from app.core.config import settings
+from app.db import db
+from app.services.embedding_codec import decode_embedding, encode_embedding, is_empty_embedding
+from app.services.embedding_provider import normalize_text
+from app.services.fetch_news import NewsFetcher
+
+# Optimistic-concurrency retries when another request updates the same profile
+MAX_UPDATE_ATTEMPTS = 5
+
+
+def profile_vector(user: Dict) -> Optional[np.ndarray]:
+    """
+    Mean embedding of the user's interacted articles, read from the stored running sum.
+    Returns None for users whose profile has not been initialized yet.
+    """
+    if "profile_sum" not in user:
+        return None
+    count = user.get("profile_count", 0)
+    if not count:
+        return np.zeros(settings.embedding_dim)
+    return np.asarray(user["profile_sum"], dtype=np.float64) / count
+
+
+def preference_key(model: str, preferences: str) -> str:
+    """
+    Identifies the (model, normalized preferences) pair a stored preference vector was embedded from.
+    """
+    return hashlib.sha256(f"{model}\n{normalize_text(preferences)}".encode("utf-8")).hexdigest()
+
+
+def stored_preference_vector(user: Dict) -> Optional[np.ndarray]:
+    """
+    The last preference embedding stored for the user, possibly of older preferences; None if
+    there is none.
+    """
+    value = user.get("preference_embedding")
+    return None if is_empty_embedding(value) else decode_embedding(value)
+
+
+async def remember_preference_vector(email: str, key: str, embedding: np.ndarray):
+    """
+    Store the user's preference embedding as the fallback for when the embedding backend is down.
+    """
+    await db.user_data.update_one(
+        {"email": email},
+        {"$set": {"preference_embedding": encode_embedding(embedding), "preference_embedding_key": key}},
+    )
+
+
+async def _embedding_sum(news_ids: List[str], news_fetcher: NewsFetcher):
+    """
+    Sum and count of the embeddings found for `news_ids`.
+    """
+    return _sum_embeddings(news_ids, await _fetch_embeddings(news_ids, news_fetcher))
+
+
+# User event types accepted by apply_user_events
+INTERACTION = "interaction"
+INTEREST = "interest"
+UNINTEREST = "uninterest"
+EVENT_TYPES = (INTERACTION, INTEREST, UNINTEREST)
+
+USER_EVENT_PROJECTION = {"email": 1, "interaction_list": 1, "interest_list": 1,
+                         "profile_sum": 1, "profile_count": 1, "profile_version": 1}
+
+
+def coalesce_events(events: Iterable[Tuple[str, str]]) -> Tuple[List[str], Dict[str, bool]]:
+    """
+    Reduce (type, news_id) events to the interacted ids, in order and without repeats, and the
+    final interest state per id (True to add, False to remove); the last interest event wins.
+    """
+    interactions, interests = {}, {}
+    for event_type, news_id in events:
+        if event_type == INTERACTION:
+            interactions[news_id] = None
+        elif event_type in (INTEREST, UNINTEREST):
+            interests[news_id] = event_type == INTEREST
+        else:
+            raise ValueError(f"Unknown user event type: {event_type}")
+    return list(interactions), interests
+
+
+def _plan_events(user: Dict, interactions: List[str], interests: Dict[str, bool]) -> Dict[str, List[str]]:
+    """
+    The changes the coalesced events make to this version of the user document.
+    """
+    existing = set(user.get("interaction_list", []))
+    current_interests = set(user.get("interest_list", []))
+    return {
+        INTERACTION: [news_id for news_id in interactions if news_id not in existing],
+        INTEREST: [news_id for news_id, add in interests.items() if add and news_id not in current_interests],
+        UNINTEREST: [news_id for news_id, add in interests.items() if not add and news_id in current_interests],
+    }
+
+
+async def _fetch_embeddings(news_ids: Iterable[str], news_fetcher: NewsFetcher) -> Dict[str, np.ndarray]:
+    # One malformed id would fail the whole lookup, which may serve several users
+    news_ids = [news_id for news_id in dict.fromkeys(news_ids) if ObjectId.is_valid(news_id)]
+    if not news_ids:
+        return {}
+    articles = await news_fetcher.fetch_news_by_ids(news_ids)
+    return {item["_id"]: np.asarray(item["embedding"], dtype=np.float64) for item in articles
+            if not is_empty_embedding(item.get("embedding"))}
+
+
+def _sum_embeddings(news_ids: Iterable[str], embeddings: Dict[str, np.ndarray]):
+    found = [embeddings[news_id] for news_id in news_ids if news_id in embeddings]
+    if not found:
+        return np.zeros(settings.embedding_dim), 0
+    return np.sum(found, axis=0), len(found)
+
+
+def _profile_ids(user: Dict, new_interactions: List[str]) -> List[str]:
+    """
+    Articles whose embeddings a profile update needs: only the new ones for an initialized
+    profile, the whole history otherwise.
+    """
+    if not new_interactions or "profile_sum" in user:
+        return new_interactions
+    return list(user.get("interaction_list", [])) + new_interactions
+
+
+def _event_operations(user: Dict, changes: Dict[str, List[str]], embeddings: Dict[str, np.ndarray]) -> List[UpdateOne]:
+    """
+    Updates applying `changes` to the user document, guarded so that they only match the
+    version the changes were planned against. Interactions and interest additions go in one
+    update; interest removals join it unless both would touch `interest_list`. In that case a
+    removal applied by an attempt that then lost a race is not reported by the retry.
+    """
+    new_interactions, added, removed = changes[INTERACTION], changes[INTEREST], changes[UNINTEREST]
+    query, update = {"_id": user["_id"]}, {}
+    if new_interactions:
+        delta, delta_count = _sum_embeddings(_profile_ids(user, new_interactions), embeddings)
+        if "profile_sum" in user:
+            profile_sum = np.asarray(user["profile_sum"], dtype=np.float64) + delta
+            profile_count = user.get("profile_count", 0) + delta_count
+        else:
+            # Profile never initialized: fold in the whole history once
+            profile_sum, profile_count = delta, delta_count
+        query["profile_version"] = user.get("profile_version")
+        query["interaction_list"] = {"$nin": new_interactions}
+        update["$addToSet"] = {"interaction_list": {"$each": new_interactions}}
+        update["$set"] = {"profile_sum": profile_sum.tolist(), "profile_count": profile_count}
+        update["$inc"] = {"profile_version": 1}
+    if added:
+        query["interest_list"] = {"$nin": added}
+        update.setdefault("$addToSet", {})["interest_list"] = {"$each": added}
+
+    operations = []
+    if removed and not added:
+        query["interest_list"] = {"$all": removed}
+        update["$pull"] = {"interest_list": {"$in": removed}}
+    elif removed:
+        # $addToSet and $pull on the same array cannot share an update
+        operations.append(UpdateOne(
+            {"_id": user["_id"], "interest_list": {"$all": removed}},
+            {"$pull": {"interest_list": {"$in": removed}}},
+        ))
+    if update:
+        operations.insert(0, UpdateOne(query, update))
+    return operations
+
+
+async def _write_events(users: Dict[str, Dict], events: Dict[str, Tuple[List[str], Dict[str, bool]]],
+                        news_fetcher: NewsFetcher) -> Tuple[Dict[str, Dict[str, List[str]]], bool]:
+    """
+    Apply every user's coalesced events with a single bulk_write.
+    Returns the planned changes per email and whether every guarded update matched; False
+    means at least one lost a race with another writer.
+    """
+    changes = {email: _plan_events(users[email], *events[email]) for email in users}
+    embeddings = await _fetch_embeddings(
+        (news_id for email, user in users.items() for news_id in _profile_ids(user, changes[email][INTERACTION])),
+        news_fetcher,
+    )
+    operations = [operation for email, user in users.items()
+                  for operation in _event_operations(user, changes[email], embeddings)]
+    if operations:
+        result = await db.user_data.bulk_write(operations, ordered=False)
+        if result.matched_count != len(operations):
+            return changes, False
+    return changes, True
+
+
+def _reflects(user: Dict, changes: Dict[str, List[str]]) -> bool:
+    """
+    Whether the user document already shows every change, i.e. the update planning them went through.
+    """
+    interactions, interests = set(user.get("interaction_list", [])), set(user.get("interest_list", []))
+    return (interactions.issuperset(changes[INTERACTION]) and interests.issuperset(changes[INTEREST])
+            and interests.isdisjoint(changes[UNINTEREST]))
+
+
+async def apply_user_events(email: str, events: Iterable[Tuple[str, str]], user: Optional[Dict] = None,
+                            news_fetcher: Optional[NewsFetcher] = None) -> Dict[str, List[str]]:
+    """
+    Apply one user's interaction, interest and un-interest events in a single round trip,
+    folding new interactions into the profile; `user` may be a stale cached document.
+    Returns the ids each event type actually changed.
+    """
+    news_fetcher = news_fetcher or NewsFetcher()
+    coalesced = coalesce_events(events)
+    for _ in range(MAX_UPDATE_ATTEMPTS):
+        if user is None:
+            user = await db.user_data.find_one({"email": email}, USER_EVENT_PROJECTION)
+            if user is None:
+                return {event_type: [] for event_type in EVENT_TYPES}
+
+        changes, applied = await _write_events({email: user}, {email: coalesced}, news_fetcher)
+        if applied:
+            return changes[email]
+        user = None  # Lost a race; re-read and recompute
+
+    raise RuntimeError(f"Could not update interaction profile for {email}")
+
+
+async def apply_events_bulk(events: Dict[str, List[Tuple[str, str]]],
+                            news_fetcher: Optional[NewsFetcher] = None) -> Dict[str, Dict[str, List[str]]]:
+    """
+    `apply_user_events` for many users at once: one read of all their documents and one
+    bulk_write. If any update loses a race, the documents are read again: users whose changes
+    all show keep them, the others are re-applied on their own. A user's changes made by a
+    concurrent writer are reported as well then.
+    """
+    news_fetcher = news_fetcher or NewsFetcher()
+    coalesced = {email: coalesce_events(user_events) for email, user_events in events.items()}
+    users = {user["email"]: user async for user in db.user_data.find(
+        {"email": {"$in": list(events)}}, USER_EVENT_PROJECTION
+    )}
+    changes, applied = await _write_events(users, coalesced, news_fetcher)
+    if not applied:
+        # Bulk results do not say which updates matched; the documents do
+        current = {user["email"]: user async for user in db.user_data.find(
+            {"email": {"$in": list(users)}}, USER_EVENT_PROJECTION
+        )}
+        for email in users:
+            if email not in current:
+                del changes[email]  # Deleted meanwhile
+            elif not _reflects(current[email], changes[email]):
+                changes[email] = await apply_user_events(email, events[email], current[email], news_fetcher)
+    empty = {event_type: [] for event_type in EVENT_TYPES}
+    return {email: changes.get(email, empty) for email in events}
+
+
+async def add_interactions(email: str, news_ids: List[str], user: Optional[Dict] = None,
+                           news_fetcher: Optional[NewsFetcher] = None) -> List[str]:
+    """
+    Add news IDs to the user's interaction list and fold their embeddings into the profile.
+    Returns the IDs that were not already in the list.
+    """
+    changes = await apply_user_events(email, [(INTERACTION, news_id) for news_id in news_ids], user, news_fetcher)
+    return changes[INTERACTION]
+
+
+async def backfill_profile(user: Dict, news_fetcher: Optional[NewsFetcher] = None) -> bool:
+    """
+    Recompute the stored profile from the full interaction list.
+    Returns False if the user changed concurrently; the next run picks it up.
+    """
+    news_fetcher = news_fetcher or NewsFetcher()
+    profile_sum, profile_count = await _embedding_sum(user.get("interaction_list", []), news_fetcher)
+    result = await db.user_data.update_one(
+        {"_id": user["_id"], "profile_version": user.get("profile_version")},
+        {
+            "$set": {"profile_sum": profile_sum.tolist(), "profile_count": profile_count},
+            "$inc": {"profile_version": 1},
+        },
+    )
+    return result.modified_count == 1
+
+
+async def backfill_profiles(force: bool = False, batch_size: int = 500) -> Dict[str, int]:
+    """
+    Initialize profile vectors for existing users (all users when `force` is set).
+    """
+    query = {} if force else {"profile_sum": {"$exists": False}}
+    news_fetcher = NewsFetcher()
+    stats = {"updated": 0, "skipped": 0}
+    cursor = db.user_data.find(
+        query, {"interaction_list": 1, "profile_version": 1}
+    ).batch_size(batch_size)
+    async for user in cursor:
+        if await backfill_profile(user, news_fetcher):
+            stats["updated"] += 1
+        else:
+            stats["skipped"] += 1
+    return stats
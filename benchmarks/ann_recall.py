@@ -0,0 +1,51 @@
+"""
+Recall/latency benchmark of the IVF index against exact cosine search.
+
+    python -m benchmarks.ann_recall --articles 100000 --queries 200
+    python -m benchmarks.ann_recall --from-db   # use the real news_scraper embeddings
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from app.services.ann_index import IVFIndex, benchmark_recall
+from benchmarks.common import perturbed_queries, synthetic_corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--topics", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--n-lists", type=int, default=0)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--from-db", action="store_true", help="Benchmark on the article index built from MongoDB")
+    args = parser.parse_args()
+
+    if args.from_db:
+        from app.services.article_index import ArticleIndex
+
+        snapshot = asyncio.run(ArticleIndex(refresh_seconds=0).build())
+        vectors, ids = snapshot.matrix, snapshot.ids
+    else:
+        vectors = synthetic_corpus(args.articles, args.dim, args.topics)
+        ids = [str(row) for row in range(len(vectors))]
+
+    queries = perturbed_queries(vectors, args.queries)
+
+    started = time.perf_counter()
+    index = IVFIndex(vectors.shape[1], args.n_lists).build(vectors, ids)
+    build_seconds = time.perf_counter() - started
+
+    print(json.dumps({
+        "articles": len(vectors),
+        "n_lists": index.n_lists,
+        "build_seconds": build_seconds,
+        "results": benchmark_recall(index, vectors, queries, k=args.k),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+Shared pieces of the benchmark suite: local MongoDB stand-ins, the synthetic corpus and
+latency statistics. Import `app` modules only after `configure_environment`, since settings
+and the MongoDB client are created at import time.
+"""
+import os
+import platform
+import subprocess
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Sequence
+
+import numpy as np
+
+BENCHMARK_PASSWORD = "benchmark-password"
+CATEGORIES = ["world", "politics", "business", "technology", "science", "health", "sports", "culture"]
+PREFERENCE_TERMS = ["football", "elections", "markets", "startups", "ai", "climate", "space", "medicine",
+                    "music", "film", "travel", "energy", "crypto", "tennis", "education", "security"]
+
+
+def add_mongo_arguments(parser):
+    parser.add_argument("--mongo-url", default="", help="Local mongod to use, e.g. mongodb://localhost:27017")
+    parser.add_argument("--db-name", default="informed_pulse_benchmark")
+    parser.add_argument("--articles", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--interactions", type=int, default=20, help="Interactions per seeded user")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--reseed", action="store_true", help="Drop and regenerate the benchmark data")
+    parser.add_argument("--output", default="", help="Write the JSON results to this file as well")
+
+
+@contextmanager
+def mongo_server(mongo_url: str = "") -> Iterator[str]:
+    """
+    Connection string of the MongoDB to benchmark against: `mongo_url` if given, otherwise a
+    throwaway mongod started with pymongo_inmemory (pip install pymongo_inmemory).
+    """
+    if mongo_url:
+        yield mongo_url
+        return
+    try:
+        from pymongo_inmemory import Mongod
+    except ImportError:
+        raise SystemExit("Pass --mongo-url or install pymongo_inmemory for a temporary mongod")
+    mongod = Mongod(None)
+    mongod.start()
+    try:
+        yield mongod.connection_string
+    finally:
+        mongod.stop()
+
+
+def configure_environment(mongo_url: str, db_name: str, dim: int):
+    """
+    Point the app at the benchmark database with the deterministic local embedding provider.
+    """
+    os.environ["MONGO_URL"] = mongo_url
+    os.environ["DB_NAME"] = db_name
+    os.environ["EMBEDDING_PROVIDER"] = "local"
+    os.environ["EMBEDDING_DIM"] = str(dim)
+    for name in ("SECRET_KEY", "MONGO_USERNAME", "MONGO_PASSWORD", "GENAI_API_KEY"):
+        os.environ.setdefault(name, "benchmark")
+
+
+def synthetic_corpus(n_articles: int, dim: int, n_topics: int, seed: int = 0) -> np.ndarray:
+    # Articles cluster around topics, like real news embeddings do
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((n_topics, dim)).astype(np.float32)
+    labels = rng.integers(0, n_topics, n_articles)
+    return topics[labels] + 0.6 * rng.standard_normal((n_articles, dim)).astype(np.float32)
+
+
+def perturbed_queries(vectors: np.ndarray, n_queries: int, seed: int = 1) -> np.ndarray:
+    # Perturbed articles, like a user profile close to what they read
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(vectors), n_queries, replace=False)
+    return vectors[picks] + 0.3 * rng.standard_normal((n_queries, vectors.shape[1])).astype(np.float32)
+
+
+def _article_documents(start: int, vectors: np.ndarray, rng: np.random.Generator) -> List[Dict]:
+    from app.services.embedding_codec import encode_embedding
+
+    now = datetime.now(timezone.utc)
+    documents = []
+    for offset, vector in enumerate(vectors):
+        number = start + offset
+        category = CATEGORIES[number % len(CATEGORIES)]
+        documents.append({
+            "title": f"Synthetic article {number}",
+            "summary": f"Summary of synthetic {category} article {number}.",
+            "sentiment": ["positive", "neutral", "negative"][number % 3],
+            "main_image": f"https://example.com/images/{number}.jpg",
+            "domain": f"news{number % 50}.example.com",
+            "category": category,
+            "url": f"https://news{number % 50}.example.com/articles/{number}",
+            "publication_date": now - timedelta(minutes=int(rng.integers(0, 30 * 24 * 60))),
+            "embedding": encode_embedding(vector),
+        })
+    return documents
+
+
+async def seed_database(args, batch_size: int = 5000) -> Dict:
+    """
+    Fill the benchmark database with `args.articles` articles and `args.users` users, unless it
+    already holds data generated with the same parameters.
+    """
+    from app.db import db
+    from app.services.password_hasher import _hash
+    from app.core.config import settings
+    from app.services.user_profile import backfill_profiles
+
+    params = {"articles": args.articles, "users": args.users, "interactions": args.interactions,
+              "dim": args.dim, "seed": args.seed, "bcrypt_rounds": settings.bcrypt_rounds}
+    existing = await db.benchmark_meta.find_one({"_id": "corpus"})
+    if existing and existing.get("params") == params and not args.reseed:
+        return {**params, "seeded": False}
+
+    for name in ("news_scraper", "user_data", "benchmark_meta", "embedding_cache", "revoked_tokens"):
+        await db.drop_collection(name)
+
+    started = time.perf_counter()
+    rng = np.random.default_rng(args.seed)
+    n_topics = max(8, int(np.sqrt(args.articles)))
+    topics = rng.standard_normal((n_topics, args.dim)).astype(np.float32)
+    article_ids = []
+    for start in range(0, args.articles, batch_size):
+        count = min(batch_size, args.articles - start)
+        vectors = topics[rng.integers(0, n_topics, count)] + 0.6 * rng.standard_normal((count, args.dim)).astype(np.float32)
+        result = await db.news_scraper.insert_many(_article_documents(start, vectors, rng), ordered=False)
+        article_ids.extend(str(inserted_id) for inserted_id in result.inserted_ids)
+
+    hashed_password = _hash(BENCHMARK_PASSWORD, settings.bcrypt_rounds)
+    users = []
+    for number in range(args.users):
+        interactions = rng.choice(len(article_ids), min(args.interactions, len(article_ids)), replace=False)
+        users.append({
+            "name": f"Benchmark user {number}",
+            "email": f"user{number}@benchmark.example.com",
+            "hashed_password": hashed_password,
+            "date_of_birth": "1990-01-01",
+            "preferences": list(rng.choice(PREFERENCE_TERMS, 3, replace=False)),
+            "interaction_list": [article_ids[row] for row in interactions],
+            "interest_list": [],
+        })
+    for start in range(0, len(users), batch_size):
+        await db.user_data.insert_many(users[start:start + batch_size], ordered=False)
+    await backfill_profiles()
+
+    await db.benchmark_meta.insert_one({"_id": "corpus", "params": params})
+    return {**params, "seeded": True, "seed_seconds": time.perf_counter() - started}
+
+
+def benchmark_users(n_users: int) -> List[str]:
+    return [f"user{number}@benchmark.example.com" for number in range(n_users)]
+
+
+def latency_summary(samples: Sequence[float], elapsed: float = 0.0, errors: int = 0) -> Dict:
+    """
+    p50/p95/p99/mean/max in milliseconds from per-call durations in seconds, plus throughput
+    when the wall-clock `elapsed` time of the run is given.
+    """
+    samples = np.asarray(samples, dtype=np.float64) * 1000
+    if len(samples) == 0:
+        return {"count": 0, "errors": errors}
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    summary = {
+        "count": int(len(samples)),
+        "errors": errors,
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "mean_ms": float(samples.mean()),
+        "max_ms": float(samples.max()),
+    }
+    if elapsed:
+        summary["throughput_per_second"] = len(samples) / elapsed
+    return summary
+
+
+def run_metadata() -> Dict:
+    """
+    Where and on what the results were produced, so runs from different commits can be compared.
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
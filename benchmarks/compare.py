@@ -0,0 +1,53 @@
+"""
+Compare two benchmark result files (e.g. from two commits) and flag latency regressions.
+
+    python -m benchmarks.compare baseline.json candidate.json --threshold 0.10
+
+Exits with status 1 when any p50/p95/p99 grew by more than the threshold.
+"""
+import argparse
+import json
+import sys
+from typing import Dict, List
+
+METRICS = ["p50_ms", "p95_ms", "p99_ms"]
+
+
+def compare(baseline: Dict, candidate: Dict, threshold: float) -> List[Dict]:
+    rows = []
+    for name, before in baseline.get("results", {}).items():
+        after = candidate.get("results", {}).get(name)
+        if not isinstance(before, dict) or not isinstance(after, dict):
+            continue
+        for metric in METRICS:
+            if metric not in before or metric not in after or not before[metric]:
+                continue
+            change = after[metric] / before[metric] - 1
+            rows.append({"name": name, "metric": metric, "before": before[metric], "after": after[metric],
+                         "change": change, "regression": change > threshold})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed relative increase")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    rows = compare(baseline, candidate, args.threshold)
+    for row in rows:
+        flag = "REGRESSION" if row["regression"] else ""
+        print(f"{row['name']:<32} {row['metric']:<7} {row['before']:>10.2f} -> {row['after']:>10.2f} "
+              f"({row['change']:+.1%}) {flag}")
+    if any(row["regression"] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
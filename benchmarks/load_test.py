@@ -0,0 +1,181 @@
+"""
+Latency percentiles and throughput of the HTTP hot paths against a seeded local database,
+with the deterministic local embedding provider instead of the Gemini API.
+
+    python -m benchmarks.load_test --articles 100000 --users 500 --requests 2000 --concurrency 32
+    python -m benchmarks.load_test --mongo-url mongodb://localhost:27017 --scenarios recommendations
+    python -m benchmarks.load_test --mongo-url mongodb://localhost:27017 --url http://localhost:8000
+
+Without --url the app runs in-process behind an ASGI transport. With --url, start the server
+with the same MONGO_URL, DB_NAME, EMBEDDING_PROVIDER=local and EMBEDDING_DIM.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.common import (
+    BENCHMARK_PASSWORD, CATEGORIES, add_mongo_arguments, benchmark_users, configure_environment, latency_summary,
+    mongo_server, run_metadata, seed_database,
+)
+
+SCENARIOS = ["login", "recommendations", "filtered", "scroll", "resume_burst", "add_interaction", "add_interest", "events"]
+
+
+async def run_scenario(send: Callable, n_requests: int, concurrency: int) -> Dict:
+    """
+    Issue `n_requests` calls of `send(i)` from `concurrency` concurrent workers.
+    """
+    samples: List[float] = []
+    errors = 0
+    counter = itertools.count()
+
+    async def worker():
+        nonlocal errors
+        while (i := next(counter)) < n_requests:
+            started = time.perf_counter()
+            try:
+                response = await send(i)
+                failed = response.status_code >= 400
+            except Exception:
+                failed = True
+            if failed:
+                errors += 1
+            else:
+                samples.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latency_summary(samples, time.perf_counter() - started, errors)
+
+
+async def login_all(client, emails: List[str]) -> List[Dict[str, str]]:
+    headers = []
+    for email in emails:
+        response = await client.post("/auth/login", json={"email": email, "password": BENCHMARK_PASSWORD})
+        response.raise_for_status()
+        headers.append({"Authorization": f"Bearer {response.json()['access_token']}"})
+    return headers
+
+
+async def run_scenarios(client, args, article_ids: List[str]) -> Dict:
+    emails = benchmark_users(args.users)
+    headers = await login_all(client, emails)
+    rng = random.Random(args.seed)
+    cursors: Dict[int, Optional[str]] = {}
+
+    async def scroll(i):
+        # Each user pages through their feed, starting over after the last page
+        user = i % len(headers)
+        cursor = cursors.get(user)
+        url = f"/user/recommendations?limit={args.limit}" + (f"&cursor={cursor}" if cursor else "")
+        response = await client.get(url, headers=headers[user])
+        if response.status_code == 200:
+            cursors[user] = response.json()["next_cursor"]
+        return response
+
+    async def resume_burst(i):
+        # An app resume fires several identical feed requests at once; the slowest one counts
+        url = f"/user/recommendations?limit={args.limit}"
+        responses = await asyncio.gather(*(client.get(url, headers=headers[i % len(headers)]) for _ in range(args.burst)))
+        return max(responses, key=lambda response: response.status_code)
+
+    def filtered(i):
+        # Alternates a narrow filter (one category, scored as a subset) and a broad one (masked scan)
+        category = CATEGORIES[i % len(CATEGORIES)]
+        facets = f"category={category}&exclude_sentiment=negative" if i % 2 else f"exclude_category={category}"
+        return client.get(f"/user/recommendations?limit={args.limit}&{facets}", headers=headers[i % len(headers)])
+
+    senders = {
+        "login": lambda i: client.post(
+            "/auth/login", json={"email": emails[i % len(emails)], "password": BENCHMARK_PASSWORD}
+        ),
+        "recommendations": lambda i: client.get(
+            f"/user/recommendations?limit={args.limit}", headers=headers[i % len(headers)]
+        ),
+        "filtered": filtered,
+        "scroll": scroll,
+        "resume_burst": resume_burst,
+        "add_interaction": lambda i: client.post(
+            "/user/add-interaction", json={"news_id": rng.choice(article_ids)}, headers=headers[i % len(headers)]
+        ),
+        "add_interest": lambda i: client.post(
+            "/user/add-interest", json={"news_id": rng.choice(article_ids)}, headers=headers[i % len(headers)]
+        ),
+        "events": lambda i: client.post("/user/events", json={"events": [
+            {"type": rng.choice(["interaction", "interest", "uninterest"]), "news_id": rng.choice(article_ids)}
+            for _ in range(args.events_per_request)
+        ]}, headers=headers[i % len(headers)]),
+    }
+
+    results = {}
+    for name in args.scenarios:
+        # Warm-up calls are not measured
+        await run_scenario(senders[name], args.warmup, args.concurrency)
+        results[name] = await run_scenario(senders[name], args.requests, args.concurrency)
+    return results
+
+
+async def run(args) -> Dict:
+    import httpx
+    from app.db import client as mongo_client, db
+
+    await mongo_client.aconnect()
+    corpus = await seed_database(args)
+    if args.precompute:
+        from app.services.batch_recommendations import precompute_recommendations
+
+        corpus["precompute"] = await precompute_recommendations()
+    article_ids = [str(doc["_id"]) for doc in await db.news_scraper.find({}, {"_id": 1}).limit(10000).to_list()]
+
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=60) as client:
+            results = await run_scenarios(client, args, article_ids)
+    else:
+        from app.main import app
+
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=60) as client:
+                results = await run_scenarios(client, args, article_ids)
+
+    return {
+        "benchmark": "load_test",
+        "meta": run_metadata(),
+        "corpus": corpus,
+        "config": {"requests": args.requests, "concurrency": args.concurrency, "limit": args.limit, "burst": args.burst,
+                   "target": args.url or "in-process", "precompute": args.precompute},
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_mongo_arguments(parser)
+    parser.add_argument("--url", default="", help="Benchmark a running server instead of the in-process app")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--requests", type=int, default=500, help="Measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--limit", type=int, default=10, help="Recommendations per request")
+    parser.add_argument("--burst", type=int, default=4, help="Identical concurrent requests per resume_burst call")
+    parser.add_argument("--events-per-request", type=int, default=20, help="Events per POST /user/events")
+    parser.add_argument("--precompute", action="store_true", help="Run the batch precompute job first")
+    args = parser.parse_args()
+
+    with mongo_server(args.mongo_url) as mongo_url:
+        configure_environment(mongo_url, args.db_name, args.dim)
+        results = asyncio.run(run(args))
+
+    output = json.dumps(results, indent=2, default=str)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Password verification throughput of the bcrypt process pool versus worker count.
+
+    python -m benchmarks.login_throughput --rounds 12 --logins 64
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from app.services.password_hasher import PasswordHasher, _hash
+
+
+async def measure(workers: int, rounds: int, logins: int, hashed_password: str) -> dict:
+    hasher = PasswordHasher(rounds=rounds, workers=workers, max_pending=logins)
+    await hasher.warm_up()
+    started = time.perf_counter()
+    await asyncio.gather(*(hasher.verify("correct horse", hashed_password) for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    hasher.shutdown()
+    return {"workers": workers, "logins_per_second": logins / elapsed, "seconds": elapsed}
+
+
+async def run(args):
+    hashed_password = _hash("correct horse", args.rounds)
+    counts = sorted({1, 2, 4, 8, 16, os.cpu_count() or 1})
+    return [
+        await measure(workers, args.rounds, args.logins, hashed_password)
+        for workers in counts if workers <= (os.cpu_count() or 1)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--logins", type=int, default=64)
+    args = parser.parse_args()
+    print(json.dumps({"cpu_count": os.cpu_count(), "rounds": args.rounds, "results": asyncio.run(run(args))}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
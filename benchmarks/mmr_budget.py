@@ -0,0 +1,79 @@
+"""
+Latency budget of the diversity re-rank at a given candidate pool size, on a synthetic corpus
+where every article lists near-duplicate neighbours.
+
+    python -m benchmarks.mmr_budget --articles 100000 --pool-size 500 --budget-ms 5
+
+Exits with status 1 when the p95 of the per-query `search_diverse` - `search` difference
+exceeds the budget.
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.common import configure_environment, latency_summary, perturbed_queries, run_metadata, synthetic_corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--pool-size", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--budget-ms", type=float, default=5.0)
+    parser.add_argument("--output", default="")
+    args = parser.parse_args()
+
+    configure_environment("mongodb://localhost:27017", "informed_pulse_benchmark", args.dim)
+    from app.services.article_index import ArticleIndex, ArticleSnapshot
+
+    vectors = synthetic_corpus(args.articles, args.dim, max(8, int(np.sqrt(args.articles))))
+    ids = [f"{row:024x}" for row in range(args.articles)]
+    # Every article lists its 5 following rows as neighbours, like the scraper's top_5_similar
+    documents = [
+        {"_id": ids[row], "embedding": vectors[row],
+         "top_5_similar": [{"_id": ids[(row + offset) % args.articles]} for offset in range(1, 6)]}
+        for row in range(args.articles)
+    ]
+    index = ArticleIndex(refresh_seconds=0)
+    index._snapshot = ArticleSnapshot.from_documents(documents)
+
+    queries = perturbed_queries(vectors, args.queries)
+
+    plain, diverse = [], []
+    for query in queries:
+        started = time.perf_counter()
+        index.search(query, args.limit)
+        plain.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        index.search_diverse(query, args.limit, pool_size=args.pool_size)
+        diverse.append(time.perf_counter() - started)
+
+    added = latency_summary(np.subtract(diverse, plain))
+    results = {
+        "benchmark": "mmr_budget",
+        "meta": run_metadata(),
+        "config": vars(args),
+        "results": {
+            "search": latency_summary(plain),
+            "search_diverse": latency_summary(diverse),
+            "added": added,
+        },
+        "added_p95_ms": added["p95_ms"],
+        "within_budget": added["p95_ms"] <= args.budget_ms,
+    }
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    if not results["within_budget"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Accuracy and latency of int8-quantized scoring (`QUANTIZED_SCORING`) against exact float32
+cosine search, for several re-rank depths.
+
+    python -m benchmarks.quantization_accuracy --articles 200000 --depths 10 100 300 1000
+    python -m benchmarks.quantization_accuracy --from-db   # use the real news_scraper embeddings
+
+`overlap` is the mean share of the exact top-k found and `identical` the share of queries
+whose top-k list is unchanged, order included.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+
+from benchmarks.common import configure_environment, latency_summary, perturbed_queries, run_metadata, synthetic_corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--topics", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--depths", type=int, nargs="+", default=[10, 100, 300, 1000])
+    parser.add_argument("--from-db", action="store_true", help="Benchmark on the article index built from MongoDB")
+    parser.add_argument("--output", default="")
+    args = parser.parse_args()
+
+    if not args.from_db:
+        configure_environment("mongodb://localhost:27017", "informed_pulse_benchmark", args.dim)
+    from app.core.config import settings
+    from app.services.article_index import ArticleIndex, ArticleSnapshot
+    from app.services.quantization import QuantizedMatrix
+
+    if args.from_db:
+        snapshot = asyncio.run(ArticleIndex(refresh_seconds=0).build())
+    else:
+        vectors = synthetic_corpus(args.articles, args.dim, args.topics)
+        snapshot = ArticleSnapshot.from_documents(
+            [{"_id": f"{row:024x}", "embedding": vectors[row]} for row in range(len(vectors))]
+        )
+    matrix = snapshot.matrix
+
+    exact = ArticleIndex(refresh_seconds=0)
+    exact._snapshot = ArticleSnapshot(matrix, snapshot.ids, snapshot.metadata, snapshot.published)
+    quantized = ArticleIndex(refresh_seconds=0)
+    quantized._snapshot = ArticleSnapshot(matrix, snapshot.ids, snapshot.metadata, snapshot.published,
+                                          QuantizedMatrix.from_matrix(matrix))
+
+    queries = perturbed_queries(matrix, args.queries)
+
+    expected, exact_latency = [], []
+    for query in queries:
+        started = time.perf_counter()
+        rows, _ = exact._top_rows(exact.snapshot, query, args.k, ())
+        exact_latency.append(time.perf_counter() - started)
+        expected.append(rows)
+
+    results = []
+    for depth in args.depths:
+        settings.quantized_rerank_depth = depth
+        overlap, identical, latency = [], [], []
+        for query, rows in zip(queries, expected):
+            started = time.perf_counter()
+            found, _ = quantized._top_rows(quantized.snapshot, query, args.k, ())
+            latency.append(time.perf_counter() - started)
+            overlap.append(len(np.intersect1d(found, rows)) / max(len(rows), 1))
+            identical.append(np.array_equal(found, rows))
+        results.append({
+            "depth": depth,
+            "overlap": float(np.mean(overlap)),
+            "min_overlap": float(np.min(overlap)),
+            "identical": float(np.mean(identical)),
+            "latency": latency_summary(latency),
+        })
+
+    report = {
+        **run_metadata(),
+        "articles": len(matrix),
+        "dim": matrix.shape[1],
+        "k": args.k,
+        "float32_mb": round(matrix.nbytes / 2 ** 20, 1),
+        "int8_mb": round(quantized.snapshot.quantized.codes.nbytes / 2 ** 20, 1),
+        "exact_latency": latency_summary(exact_latency),
+        "results": results,
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
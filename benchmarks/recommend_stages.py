@@ -0,0 +1,128 @@
+"""
+Microbenchmarks of the stages behind `PersonalizedRecommender.recommend()` on a seeded local
+database: embedding, profile lookup, scoring (exact and IVF), hydration and the full call.
+
+    python -m benchmarks.recommend_stages --articles 100000 --iterations 200
+    python -m benchmarks.recommend_stages --mongo-url mongodb://localhost:27017 --articles 1000000 --ann
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Awaitable, Callable, Dict, List
+
+from benchmarks.common import (
+    add_mongo_arguments, configure_environment, latency_summary, mongo_server, run_metadata, seed_database,
+)
+
+
+async def measure(fn: Callable[[int], Awaitable], iterations: int, warmup: int = 5) -> Dict:
+    for i in range(warmup):
+        await fn(i)
+    samples: List[float] = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        await fn(i)
+        samples.append(time.perf_counter() - started)
+    return latency_summary(samples)
+
+
+def sync_stage(fn: Callable[[int], object]) -> Callable[[int], Awaitable]:
+    async def stage(i):
+        return fn(i)
+    return stage
+
+
+async def run(args) -> Dict:
+    from app.core.config import settings
+    from app.db import client, db
+    from app.services.ann_index import IVFIndex
+    from app.services.article_index import ArticleIndex
+    from app.services.embedding_provider import LocalEmbeddingProvider, get_embedding_provider
+    from app.services.fetch_news import NewsFetcher
+    from app.services.personalized_recommender import PersonalizedRecommender
+    from app.services.user_profile import profile_vector
+
+    await client.aconnect()
+    corpus = await seed_database(args)
+
+    index = ArticleIndex(refresh_seconds=0)
+    started = time.perf_counter()
+    snapshot = await index.build()
+    build_seconds = time.perf_counter() - started
+
+    users = await db.user_data.find({}).limit(args.users).to_list()
+    preferences = [" ".join(user["preferences"]) for user in users]
+    uncached_provider = LocalEmbeddingProvider(settings.embedding_dim)
+    cached_provider = get_embedding_provider()
+    recommender = PersonalizedRecommender(cached_provider, index)
+    news_fetcher = NewsFetcher()
+    queries = [0.5 * profile_vector(user) + 0.5 * await cached_provider.embed(text)
+               for user, text in zip(users, preferences)]
+    top_lists = [index.search(query, args.limit) for query in queries]
+
+    def user_at(i):
+        return users[i % len(users)]
+
+    stages = {
+        "embed_uncached": lambda i: uncached_provider.embed(f"{preferences[i % len(users)]} {i}"),
+        "embed_cached": lambda i: cached_provider.embed(preferences[i % len(users)]),
+        "profile_vector": sync_stage(lambda i: profile_vector(user_at(i))),
+        "fetch_interaction_embeddings": lambda i: news_fetcher.fetch_news_by_ids(user_at(i)["interaction_list"]),
+        "search_exact": sync_stage(
+            lambda i: index.search(queries[i % len(users)], args.limit, user_at(i)["interaction_list"])
+        ),
+        "search_diverse": sync_stage(
+            lambda i: index.search_diverse(queries[i % len(users)], args.limit, user_at(i)["interaction_list"])
+        ),
+        "hydrate": sync_stage(lambda i: index.hydrate(
+            [item["_id"] for item in top_lists[i % len(users)]],
+            [item["similarity"] for item in top_lists[i % len(users)]],
+        )),
+        "recommend": lambda i: recommender.recommend(
+            preferences[i % len(users)], user_at(i)["interaction_list"], args.limit,
+            interaction_profile=profile_vector(user_at(i)),
+        ),
+        "recommend_without_profile": lambda i: recommender.recommend(
+            preferences[i % len(users)], user_at(i)["interaction_list"], args.limit,
+        ),
+    }
+    results = {name: await measure(stage, args.iterations) for name, stage in stages.items()}
+
+    if args.ann:
+        started = time.perf_counter()
+        snapshot.ann = IVFIndex(snapshot.matrix.shape[1], settings.ann_n_lists, settings.ann_n_probe) \
+            .build(snapshot.matrix, snapshot.ids)
+        results["ann_build"] = {"seconds": time.perf_counter() - started, "n_lists": snapshot.ann.n_lists}
+        results["search_ann"] = await measure(stages["search_exact"], args.iterations)
+
+    return {
+        "benchmark": "recommend_stages",
+        "meta": run_metadata(),
+        "corpus": corpus,
+        "config": {"iterations": args.iterations, "limit": args.limit, "ann": args.ann},
+        "results": {"index_build": {"seconds": build_seconds, "articles": len(snapshot)}, **results},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_mongo_arguments(parser)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--ann", action="store_true", help="Also build and measure the IVF index")
+    args = parser.parse_args()
+
+    with mongo_server(args.mongo_url) as mongo_url:
+        configure_environment(mongo_url, args.db_name, args.dim)
+        results = asyncio.run(run(args))
+
+    output = json.dumps(results, indent=2, default=str)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Host memory of the article index as the number of worker processes grows, with a private
+copy per worker versus the shared matrix (`SHARED_MATRIX_DIR`).
+
+    python -m benchmarks.shared_matrix_memory --articles 200000 --workers 1 2 4 8
+
+Sums the workers' proportional set sizes, which is what the host actually spends. Linux only.
+"""
+import argparse
+import json
+import multiprocessing
+import tempfile
+
+import numpy as np
+
+from benchmarks.common import configure_environment, run_metadata, synthetic_corpus
+
+
+def _memory_mb() -> dict:
+    memory = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if name in ("Rss", "Pss"):
+                memory[name.lower()] = int(value.split()[0]) / 1024
+    return memory
+
+
+def _worker(mode: str, directory: str, generation: int, queries: np.ndarray, barrier, results):
+    from app.services.article_index import ArticleIndex, ArticleSnapshot
+    from app.services.shared_matrix import SharedMatrixStore
+
+    mapped = SharedMatrixStore(directory).open(generation)
+    if mode == "private":
+        # What every worker held before: its own matrix and metadata
+        snapshot = ArticleSnapshot(np.array(mapped.matrix), list(mapped.ids), list(mapped.metadata),
+                                   np.array(mapped.published))
+        del mapped
+    else:
+        snapshot = mapped
+    index = ArticleIndex(refresh_seconds=0)
+    index._snapshot = snapshot
+    for query in queries:
+        index.search(query, 10)
+
+    barrier.wait()  # Measure while every worker is alive, so shared pages are split between all of them
+    results.put(_memory_mb())
+    barrier.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--output", default="")
+    args = parser.parse_args()
+
+    configure_environment("mongodb://localhost:27017", "informed_pulse_benchmark", args.dim)
+    from app.services.article_index import ArticleSnapshot
+    from app.services.shared_matrix import SharedMatrixStore
+
+    vectors = synthetic_corpus(args.articles, args.dim, max(8, int(np.sqrt(args.articles))))
+    documents = [{"_id": f"{row:024x}", "embedding": vectors[row], "title": f"Article {row}"}
+                 for row in range(args.articles)]
+    snapshot = ArticleSnapshot.from_documents(documents)
+    queries = vectors[np.random.default_rng(1).choice(args.articles, args.queries, replace=False)]
+
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory(dir="/dev/shm") as directory:
+        store = SharedMatrixStore(directory)
+        generation = store.publish(snapshot)
+        del snapshot, documents, vectors
+
+        results = []
+        for mode in ("private", "shared"):
+            for workers in args.workers:
+                barrier, queue = context.Barrier(workers), context.Queue()
+                processes = [context.Process(target=_worker, args=(mode, directory, generation, queries, barrier, queue))
+                             for _ in range(workers)]
+                for process in processes:
+                    process.start()
+                memory = [queue.get() for _ in processes]
+                for process in processes:
+                    process.join()
+                results.append({
+                    "mode": mode,
+                    "workers": workers,
+                    "total_pss_mb": round(sum(m["pss"] for m in memory), 1),
+                    "pss_per_worker_mb": round(sum(m["pss"] for m in memory) / workers, 1),
+                    "max_rss_mb": round(max(m["rss"] for m in memory), 1),
+                })
+
+    report = {
+        **run_metadata(),
+        "articles": args.articles,
+        "dim": args.dim,
+        "matrix_mb": round(args.articles * args.dim * 4 / 2 ** 20, 1),
+        "results": results,
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
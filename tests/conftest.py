@@ -0,0 +1,8 @@
+import os
+
+# Settings without defaults; nothing in the unit tests connects to MongoDB or the GenAI API
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("MONGO_USERNAME", "test")
+os.environ.setdefault("MONGO_PASSWORD", "test")
+os.environ.setdefault("GENAI_API_KEY", "test")
+os.environ.setdefault("EMBEDDING_PROVIDER", "local")
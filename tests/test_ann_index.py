@@ -0,0 +1,68 @@
+import os
+
+import numpy as np
+import pytest
+
+from app.services.ann_index import IVFIndex, normalize_rows
+
+
+def corpus(n: int = 400, dim: int = 16, seed: int = 0) -> np.ndarray:
+    return normalize_rows(np.random.default_rng(seed).standard_normal((n, dim)))
+
+
+def built_index(vectors: np.ndarray) -> IVFIndex:
+    index = IVFIndex(vectors.shape[1], n_lists=8, n_probe=8)
+    index.build(vectors, [str(row) for row in range(len(vectors))])
+    return index
+
+
+def test_exhaustive_probe_matches_exact_search():
+    vectors = corpus()
+    index = built_index(vectors)
+    query = vectors[7] + 0.1
+    ids, scores = index.search(query, 10)
+    exact = np.argsort(-(vectors @ normalize_rows(query)[0]))[:10]
+    assert ids == [str(row) for row in exact]
+    assert np.all(np.diff(scores) <= 1e-6)
+
+
+def test_add_and_remove_without_retraining():
+    vectors = corpus()
+    index = built_index(vectors[:300])
+    index.add(vectors[300:], [str(row) for row in range(300, 400)])
+    index.remove(["0", "1", "missing"])
+    assert len(index) == 398
+    assert "0" not in index and "399" in index
+    assert index.search(vectors[350], 1)[0] == ["350"]
+    assert "0" not in index.search(vectors[0], 20)[0]
+
+    # Re-adding an id replaces its vector
+    index.add(vectors[5:6], ["399"])
+    assert len(index) == 398
+    assert index.search(vectors[5], 2)[0][0] in ("5", "399")
+
+
+def test_add_requires_a_built_index():
+    with pytest.raises(RuntimeError):
+        IVFIndex(16, n_lists=4).add(corpus(1), ["a"])
+
+
+def test_save_and_load_round_trip(tmp_path):
+    vectors = corpus()
+    index = built_index(vectors)
+    index.remove(["3"])
+    path = str(tmp_path / "ivf")
+
+    index.save(path)
+    assert sorted(os.listdir(tmp_path)) == ["ivf"]
+
+    loaded = IVFIndex.load(path)
+    assert (loaded.dim, loaded.n_lists, loaded.n_probe) == (index.dim, index.n_lists, index.n_probe)
+    assert sorted(loaded.indexed_ids()) == sorted(index.indexed_ids())
+    for row in (0, 42, 399):
+        assert loaded.search(vectors[row], 5)[0] == index.search(vectors[row], 5)[0]
+
+    # Saving again replaces the file in place
+    loaded.remove(["0"])
+    loaded.save(path)
+    assert "0" not in IVFIndex.load(path)
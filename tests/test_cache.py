@@ -0,0 +1,81 @@
+import asyncio
+
+import numpy as np
+
+from app.services import cache as cache_module
+from app.services.cache import TTLCache
+from app.services.embedding_provider import CachedEmbeddingProvider, LocalEmbeddingProvider, normalize_text
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, "monotonic", clock)
+    cache = TTLCache(maxsize=10, ttl=30)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=5)
+    clock.now += 10
+    assert cache.get("a") == 1
+    assert cache.get("b", "missing") == "missing"
+    clock.now += 30
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_hit_ratio_pop_and_zero_size():
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("b")
+    assert cache.hit_ratio == 0.5
+    assert cache.pop("a") == 1
+    assert cache.pop("a", "gone") == "gone"
+
+    disabled = TTLCache(maxsize=0, ttl=60)
+    disabled.set("a", 1)
+    assert disabled.get("a") is None
+
+
+class CountingProvider(LocalEmbeddingProvider):
+    def __init__(self):
+        super().__init__(dim=16)
+        self.calls = []
+
+    async def embed(self, text: str) -> np.ndarray:
+        self.calls.append(text)
+        await asyncio.sleep(0.01)
+        return await super().embed(text)
+
+
+def test_embedding_cache_normalizes_text_and_coalesces_misses():
+    provider = CountingProvider()
+    cached = CachedEmbeddingProvider(provider, TTLCache(maxsize=10, ttl=60))
+
+    async def run():
+        first = await asyncio.gather(*(cached.embed(text) for text in ["Space  News", "space news", " SPACE NEWS "]))
+        again = await cached.embed("space news")
+        return first, again
+
+    first, again = asyncio.run(run())
+    assert provider.calls == [normalize_text("Space  News")]
+    assert all(embedding is again for embedding in first)
+    assert not again.flags.writeable
@@ -0,0 +1,114 @@
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.services import circuit_breaker as circuit_breaker_module
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.embedding_provider import EmbeddingProvider, EmbeddingUnavailable, GuardedEmbeddingProvider
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    # Patched on the module only; the event loop keeps the real clock
+    monkeypatch.setattr(circuit_breaker_module, "time", SimpleNamespace(monotonic=clock))
+    return clock
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_seconds=10)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.allow() and not breaker.is_open
+    breaker.record_failure()
+    assert breaker.is_open
+    assert not breaker.allow()
+
+
+def test_single_trial_call_after_reset_period(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=10)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    # A failed trial keeps the circuit open for another period
+    breaker.record_failure()
+    assert not breaker.allow()
+    clock.now += 10
+    assert breaker.allow()
+    breaker.record_success()
+    assert not breaker.is_open
+    assert breaker.allow() and breaker.allow()
+
+
+class Backend(EmbeddingProvider):
+    model = "test"
+
+    def __init__(self):
+        self.mode = "ok"
+
+    async def embed(self, text: str) -> np.ndarray:
+        if self.mode == "error":
+            raise ConnectionError("down")
+        if self.mode == "hang":
+            await asyncio.sleep(10)
+        return np.ones(4, dtype=np.float32)
+
+
+def test_guarded_provider_fails_fast_while_open(clock):
+    backend = Backend()
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=10)
+    guarded = GuardedEmbeddingProvider(backend, timeout=0.05, breaker=breaker)
+
+    async def run():
+        backend.mode = "error"
+        for _ in range(2):
+            with pytest.raises(EmbeddingUnavailable):
+                await guarded.embed("text")
+        backend.mode = "ok"
+        with pytest.raises(EmbeddingUnavailable, match="circuit breaker is open"):
+            await guarded.embed("text")
+        clock.now += 10
+        assert (await guarded.embed("text")).shape == (4,)
+        assert not breaker.is_open
+
+        backend.mode = "hang"
+        with pytest.raises(EmbeddingUnavailable, match="exceeded"):
+            await guarded.embed("text")
+
+    asyncio.run(run())
+
+
+def test_cancelled_trial_releases_its_slot(clock):
+    backend = Backend()
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=10)
+    guarded = GuardedEmbeddingProvider(backend, timeout=0, breaker=breaker)
+    breaker.record_failure()
+    clock.now += 10
+
+    async def run():
+        backend.mode = "hang"
+        trial = asyncio.ensure_future(guarded.embed("text"))
+        await asyncio.sleep(0)
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+        backend.mode = "ok"
+        return await guarded.embed("text")
+
+    assert asyncio.run(run()).shape == (4,)
+    assert not breaker.is_open
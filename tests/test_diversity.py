@@ -0,0 +1,37 @@
+import numpy as np
+
+from app.services.ann_index import normalize_rows
+from app.services.diversity import drop_near_duplicates, mmr, similar_ids
+
+
+def test_mmr_without_diversity_follows_relevance():
+    vectors = normalize_rows(np.random.default_rng(0).standard_normal((20, 8)))
+    relevance = np.random.default_rng(1).random(20)
+    assert mmr(vectors, relevance, 5, diversity=0).tolist() == np.argsort(-relevance)[:5].tolist()
+
+
+def test_mmr_skips_near_duplicates_of_chosen_rows():
+    base = np.eye(4, dtype=np.float32)
+    # Row 1 is a near copy of row 0, which is the most relevant
+    vectors = normalize_rows(np.vstack([base[0], base[0] + 0.01 * base[1], base[1], base[2]]))
+    relevance = np.array([1.0, 0.99, 0.8, 0.7])
+    assert mmr(vectors, relevance, 2, diversity=0.5).tolist() == [0, 2]
+    assert mmr(vectors, relevance, 2, diversity=0).tolist() == [0, 1]
+
+
+def test_mmr_handles_small_pools():
+    vectors = normalize_rows(np.eye(3))
+    assert mmr(vectors, np.ones(3), 10).tolist() == [0, 1, 2]
+    assert len(mmr(vectors, np.ones(3), 0)) == 0
+
+
+def test_near_duplicates_are_dropped_in_both_directions():
+    ids = ["a", "b", "c", "d"]
+    neighbours = [["b"], [], ["a"], ["x"]]
+    # b is a's neighbour, and c lists a as its own neighbour
+    assert drop_near_duplicates(ids, neighbours) == [0, 3]
+
+
+def test_similar_ids_accepts_ids_and_sub_documents():
+    assert similar_ids(["1", {"_id": "2"}, {"news_id": 3}, {"title": "no id"}]) == ["1", "2", "3"]
+    assert similar_ids(None) == []
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services.article_index import ArticleIndex, ArticleSnapshot
+from app.services.facets import FacetFilter, FacetIndex, facet_value
+
+METADATA = [
+    {"category": "Science", "domain": "a.com", "sentiment": "positive"},
+    {"category": "sports", "domain": "b.com", "sentiment": "negative"},
+    {"category": " science ", "domain": "b.com"},
+    {"domain": "a.com", "sentiment": "positive"},
+]
+
+
+def test_facet_values_are_normalized():
+    assert facet_value(" Science ") == "science"
+    assert facet_value("  ") is None
+    assert facet_value(3) == 3
+    assert facet_value(["x"]) == "['x']"
+
+
+def test_build_ignores_empty_constraints_and_round_trips():
+    assert FacetFilter.build({"category": None, "domain": []}, {"sentiment": None}) is None
+    facet_filter = FacetFilter.build({"category": ["Science", "sports"]}, {"domain": ["B.com"]})
+    assert facet_filter == FacetFilter.build({"category": ["sports", "science"]}, {"domain": ["b.com"]})
+    assert hash(facet_filter) == hash(FacetFilter.build(**facet_filter.as_dict()))
+    assert FacetFilter.build(**facet_filter.as_dict()) == facet_filter
+
+
+def test_mask_applies_includes_and_excludes():
+    index = FacetIndex.from_metadata(METADATA)
+    science = FacetFilter.build({"category": ["science"]}, {})
+    assert index.mask(science).tolist() == [True, False, True, False]
+    assert index.mask(science, start=2).tolist() == [True, False]
+
+    not_b = FacetFilter.build({}, {"domain": ["b.com"], "sentiment": ["negative"]})
+    assert index.mask(not_b).tolist() == [True, False, False, True]
+    unknown = FacetFilter.build({"category": ["politics"]}, {})
+    assert not index.mask(unknown).any()
+
+
+def test_merge_recodes_into_one_vocabulary():
+    old, new = FacetIndex.from_metadata(METADATA[:2]), FacetIndex.from_metadata(METADATA[2:])
+    from_self = np.array([True, False, True, False])
+    merged = old.merge(np.array([0, 1]), new, np.array([0, 1]), from_self)
+    expected = FacetIndex.from_metadata([METADATA[0], METADATA[2], METADATA[1], METADATA[3]])
+    facet_filter = FacetFilter.build({"domain": ["a.com"]}, {"sentiment": ["negative"]})
+    assert merged.mask(facet_filter).tolist() == expected.mask(facet_filter).tolist()
+
+
+@pytest.mark.parametrize("share", [0.05, 0.8])
+def test_filtered_search_returns_only_matching_articles(monkeypatch, share):
+    monkeypatch.setattr(settings, "recency_window_days", 0)
+    rng = np.random.default_rng(0)
+    documents = [
+        {"_id": str(row), "embedding": rng.standard_normal(16).tolist(),
+         "category": "science" if rng.random() < share else "sports"}
+        for row in range(1000)
+    ]
+    index = ArticleIndex(refresh_seconds=0)
+    index._snapshot = ArticleSnapshot.from_documents([dict(doc) for doc in documents])
+    query = rng.standard_normal(16)
+    facet_filter = FacetFilter.build({"category": ["science"]}, {})
+
+    found = index.search(query, 10, facets=facet_filter)
+    science = [doc for doc in documents if doc["category"] == "science"]
+    vectors = np.array([doc["embedding"] for doc in science])
+    scores = vectors @ query / np.linalg.norm(vectors, axis=1) / np.linalg.norm(query)
+    assert [item["_id"] for item in found] == [science[row]["_id"] for row in np.argsort(-scores)[:10]]
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services.ann_index import normalize_rows
+from app.services.article_index import ArticleIndex, ArticleSnapshot
+from app.services.quantization import QuantizedMatrix, quantize_rows
+
+
+def corpus(n: int = 2000, dim: int = 32) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    topics = rng.standard_normal((20, dim))
+    return normalize_rows(topics[rng.integers(0, 20, n)] + 0.6 * rng.standard_normal((n, dim)))
+
+
+def test_quantize_rows_error_is_bounded_by_half_a_step():
+    matrix = corpus(100)
+    codes, scales = quantize_rows(matrix)
+    assert codes.dtype == np.int8 and np.abs(codes).max() <= 127
+    assert np.all(np.abs(codes * scales[:, None] - matrix) <= scales[:, None] / 2 + 1e-7)
+
+    codes, scales = quantize_rows(np.zeros((2, 4), dtype=np.float32))
+    assert not codes.any() and not scales.any()
+
+
+def test_quantized_scores_approximate_dot_products():
+    matrix = corpus()
+    query = matrix[0]
+    quantized = QuantizedMatrix.from_matrix(matrix)
+    np.testing.assert_allclose(quantized.scores(query), matrix @ query, atol=0.02)
+    np.testing.assert_allclose(quantized.scores(query, start=1500), (matrix @ query)[1500:], atol=0.02)
+    assert len(quantized.scores(query, start=len(matrix))) == 0
+
+
+def index_over(matrix: np.ndarray, quantized: bool) -> ArticleIndex:
+    base = ArticleSnapshot.from_documents([{"_id": str(row), "embedding": vector} for row, vector in enumerate(matrix)])
+    index = ArticleIndex(refresh_seconds=0)
+    index._snapshot = ArticleSnapshot(base.matrix, base.ids, base.metadata, base.published,
+                                      QuantizedMatrix.from_matrix(base.matrix) if quantized else None)
+    return index
+
+
+@pytest.fixture
+def exact_window(monkeypatch):
+    monkeypatch.setattr(settings, "recency_window_days", 0)
+    monkeypatch.setattr(settings, "recency_half_life_hours", 0)
+    monkeypatch.setattr(settings, "quantized_rerank_depth", 100)
+
+
+def test_quantized_search_is_re_ranked_with_exact_scores(exact_window):
+    matrix = corpus()
+    exact, quantized = index_over(matrix, False), index_over(matrix, True)
+    rng = np.random.default_rng(1)
+    for row in rng.choice(len(matrix), 10, replace=False):
+        query = matrix[row] + 0.3 * rng.standard_normal(matrix.shape[1])
+        expected = exact.search(query, 10, exclude_ids=[str(row)])
+        found = quantized.search(query, 10, exclude_ids=[str(row)])
+        assert [item["_id"] for item in found] == [item["_id"] for item in expected]
+        assert [item["similarity"] for item in found] == pytest.approx([item["similarity"] for item in expected])
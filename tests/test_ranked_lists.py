@@ -0,0 +1,62 @@
+import pytest
+
+from app.services.ranked_lists import (
+    Cursor, ExpiredCursor, InvalidCursor, RankedListCache, decode_cursor, encode_cursor,
+)
+
+OPTIONS = {"depth": 100, "diversify": True, "diversity": 0.4, "pool_size": None, "dedupe": True,
+           "facets": {"include": {"category": ["science"]}, "exclude": {}}}
+
+
+def test_cursor_round_trip():
+    cursor = Cursor("session", 20, 3, OPTIONS)
+    encoded = encode_cursor(cursor)
+    assert "=" not in encoded
+    assert decode_cursor(encoded) == cursor
+
+
+@pytest.mark.parametrize("encoded", [
+    "",
+    "not base64!",
+    encode_cursor(Cursor("", 0)),
+    encode_cursor(Cursor("session", -1)),
+    encode_cursor(Cursor("session", "10")),
+    encode_cursor(Cursor("session", 0, 1, ["not", "a", "dict"])),
+])
+def test_malformed_cursors_are_rejected(encoded):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(encoded)
+
+
+def test_pages_slice_the_stored_ranking():
+    cache = RankedListCache(maxsize=10, ttl=60)
+    ids = [str(row) for row in range(25)]
+    session = cache.start("ada@example.com", 1, ids, [float(-row) for row in range(25)], OPTIONS)
+
+    page, scores, next_cursor = cache.page("ada@example.com", 1, Cursor(session, 10, 1), 10)
+    assert page == ids[10:20] and scores[0] == -10.0
+    assert decode_cursor(next_cursor) == Cursor(session, 20, 1, OPTIONS)
+
+    page, _, next_cursor = cache.page("ada@example.com", 1, decode_cursor(next_cursor), 10)
+    assert page == ids[20:] and next_cursor is None
+
+    with pytest.raises(InvalidCursor):
+        cache.page("ada@example.com", 1, Cursor(session, 25, 1), 10)
+    with pytest.raises(ValueError):
+        cache.page("ada@example.com", 1, Cursor(session, 0, 1), 0)
+
+
+def test_other_sessions_versions_and_invalidated_lists_expire():
+    cache = RankedListCache(maxsize=10, ttl=60)
+    session = cache.start("ada@example.com", 1, ["a", "b"], [1.0, 0.5])
+    with pytest.raises(ExpiredCursor):
+        cache.page("ada@example.com", 2, Cursor(session, 1, 2), 10)
+    with pytest.raises(ExpiredCursor):
+        cache.page("ada@example.com", 1, Cursor("other", 1, 1), 10)
+    with pytest.raises(ExpiredCursor):
+        cache.page("grace@example.com", 1, Cursor(session, 1, 1), 10)
+
+    # A list rebuilt under the same session id serves its old cursors
+    cache.invalidate("ada@example.com")
+    assert cache.start("ada@example.com", 1, ["a", "b"], [1.0, 0.5], session=session) == session
+    assert cache.page("ada@example.com", 1, Cursor(session, 1, 1), 10)[0] == ["b"]
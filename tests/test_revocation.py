@@ -0,0 +1,71 @@
+import asyncio
+from datetime import datetime, timezone
+
+from app.services import revocation
+from app.services.revocation import InMemoryRevocationStore, MongoRevocationStore
+
+
+class Clock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_in_memory_revocations_expire_with_the_token(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(revocation.time, "time", clock)
+    store = InMemoryRevocationStore(bucket_seconds=60)
+    store.add("short", clock.now + 30)
+    store.add("long", clock.now + 600)
+    store.add("expired", clock.now - 1)
+    assert store.contains("short") and store.contains("long")
+    assert not store.contains("expired")
+
+    clock.now += 31
+    assert not store.contains("short")
+    clock.now += 120
+    assert store.contains("long")
+    assert len(store) == 1
+
+
+class FakeCollection:
+    def __init__(self):
+        self.docs = {}
+        self.finds = 0
+
+    async def create_index(self, *args, **kwargs):
+        pass
+
+    async def update_one(self, query, update, upsert=False):
+        self.docs[query["_id"]] = dict(update["$set"])
+
+    async def find_one(self, query, projection=None):
+        self.finds += 1
+        return self.docs.get(query["_id"])
+
+
+def test_mongo_store_shares_revocations_and_caches_misses():
+    collection = FakeCollection()
+    expires_at = datetime.now(timezone.utc).timestamp() + 600
+    this_worker = MongoRevocationStore(collection, negative_ttl=60)
+    other_worker = MongoRevocationStore(collection, negative_ttl=60)
+
+    async def run():
+        assert not await other_worker.is_revoked("jti")
+        assert not await other_worker.is_revoked("jti")
+        assert collection.finds == 1
+
+        await this_worker.revoke("jti", expires_at)
+        assert await this_worker.is_revoked("jti")
+        assert collection.finds == 1
+
+        # Still within the other worker's negative cache
+        assert not await other_worker.is_revoked("jti")
+        other_worker.not_revoked.clear()
+        assert await other_worker.is_revoked("jti")
+        assert await other_worker.is_revoked("jti")
+        assert collection.finds == 2
+
+    asyncio.run(run())
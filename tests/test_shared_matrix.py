@@ -0,0 +1,83 @@
+import os
+
+import numpy as np
+import pytest
+
+from app.services.ann_index import IVFIndex
+from app.services.article_index import ArticleSnapshot
+from app.services.shared_matrix import FORMAT_VERSION, HEADER, KEEP_GENERATIONS, SharedMatrixStore
+
+
+def snapshot(n: int = 60, dim: int = 8) -> ArticleSnapshot:
+    rng = np.random.default_rng(0)
+    documents = [
+        {
+            "_id": f"n{row}",
+            "embedding": rng.standard_normal(dim).tolist(),
+            "publication_date": f"2026-01-{row % 28 + 1:02d}",
+            "title": f"Article {row}",
+            "category": ["science", "sports", None][row % 3],
+        }
+        for row in range(n)
+    ]
+    return ArticleSnapshot.from_documents(documents)
+
+
+def test_published_generation_maps_back_to_the_snapshot(tmp_path):
+    original = snapshot()
+    original.ann = IVFIndex(original.matrix.shape[1], n_lists=4, n_probe=4)
+    original.ann.build(original.matrix, original.ids)
+    store = SharedMatrixStore(str(tmp_path))
+
+    generation = store.publish(original)
+    assert generation == store.current_generation() == 1
+    mapped = store.open(generation)
+
+    np.testing.assert_array_equal(mapped.matrix, original.matrix)
+    np.testing.assert_array_equal(mapped.published, original.published)
+    assert mapped.ids == original.ids
+    assert mapped.metadata[5] == original.metadata[5]
+    assert list(mapped.metadata[-2:]) == original.metadata[-2:]
+    assert not mapped.matrix.flags.writeable
+    for field, codes in original.facets.codes.items():
+        np.testing.assert_array_equal(mapped.facets.codes[field], codes)
+    assert mapped.ann.search(original.matrix[3], 5)[0] == original.ann.search(original.matrix[3], 5)[0]
+
+
+def test_old_generations_are_pruned(tmp_path):
+    store = SharedMatrixStore(str(tmp_path))
+    for _ in range(KEEP_GENERATIONS + 2):
+        generation = store.publish(snapshot(10))
+    files = sorted(name for name in os.listdir(tmp_path) if name.endswith(".bin"))
+    assert len(files) == KEEP_GENERATIONS
+    assert store.open(generation).ids == snapshot(10).ids
+
+
+def rewrite_header(path: str, field: int, value):
+    with open(path, "r+b") as f:
+        values = list(HEADER.unpack(f.read(HEADER.size)))
+        values[field] = value
+        f.seek(0)
+        f.write(HEADER.pack(*values))
+
+
+@pytest.mark.parametrize("field, value, message", [
+    (0, b"NOTMAGIC", "not a version"),
+    (1, FORMAT_VERSION - 1, "not a version"),
+    (3, 7, "holds generation 7"),
+])
+def test_mismatched_headers_are_rejected(tmp_path, field, value, message):
+    store = SharedMatrixStore(str(tmp_path))
+    generation = store.publish(snapshot(10))
+    rewrite_header(store._path(generation), field, value)
+    with pytest.raises(ValueError, match=message):
+        store.open(generation)
+
+
+def test_truncated_file_is_rejected(tmp_path):
+    store = SharedMatrixStore(str(tmp_path))
+    generation = store.publish(snapshot(10))
+    with open(store._path(generation), "r+b") as f:
+        f.truncate(HEADER.size - 1)
+    with pytest.raises(ValueError, match="truncated"):
+        store.open(generation)
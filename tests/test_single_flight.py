@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from app.services.single_flight import SingleFlight
+
+
+class Work:
+    def __init__(self, result="done", error=None):
+        self.calls = 0
+        self.result = result
+        self.error = error
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def test_concurrent_calls_share_one_computation():
+    async def run():
+        flights = SingleFlight("test")
+        work, other = Work(["shared"]), Work("other")
+        waiting = [asyncio.ensure_future(flights.do("key", work)) for _ in range(5)]
+        separate = asyncio.ensure_future(flights.do("other", other))
+        await asyncio.sleep(0)
+        work.release.set()
+        other.release.set()
+        results = await asyncio.gather(*waiting)
+        assert work.calls == 1 and other.calls == 1
+        assert all(result is results[0] for result in results)
+        assert await separate == "other"
+
+        # Nothing is cached after the computation finished
+        work.release = asyncio.Event()
+        work.release.set()
+        await flights.do("key", work)
+        assert work.calls == 2
+
+    asyncio.run(run())
+
+
+def test_errors_reach_every_caller():
+    async def run():
+        flights = SingleFlight("test")
+        work = Work(error=RuntimeError("failed"))
+        waiting = [asyncio.ensure_future(flights.do("key", work)) for _ in range(3)]
+        await asyncio.sleep(0)
+        work.release.set()
+        for outcome in await asyncio.gather(*waiting, return_exceptions=True):
+            assert isinstance(outcome, RuntimeError)
+        assert work.calls == 1
+
+    asyncio.run(run())
+
+
+def test_cancelled_caller_leaves_the_computation_running():
+    async def run():
+        flights = SingleFlight("test")
+        work = Work()
+        leaving = asyncio.ensure_future(flights.do("key", work))
+        staying = asyncio.ensure_future(flights.do("key", work))
+        await asyncio.sleep(0)
+        leaving.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leaving
+        work.release.set()
+        assert await staying == "done"
+        assert work.calls == 1
+
+    asyncio.run(run())
@@ -0,0 +1,67 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from app import security
+from app.services.revocation import InMemoryRevocationStore
+
+
+class FakeUsers:
+    def __init__(self, users):
+        self.users = users
+        self.finds = 0
+
+    async def find_one(self, query):
+        self.finds += 1
+        return self.users.get(query["email"])
+
+
+@pytest.fixture
+def users(monkeypatch):
+    users = FakeUsers({"ada@example.com": {"email": "ada@example.com", "preferences": ["space"]}})
+    monkeypatch.setattr(security, "db", SimpleNamespace(user_data=users))
+    monkeypatch.setattr(security, "revocation_store", InMemoryRevocationStore())
+    security.token_cache.clear()
+    security.user_cache.clear()
+    yield users
+    security.token_cache.clear()
+    security.user_cache.clear()
+
+
+def test_user_document_is_cached_until_invalidated(users):
+    token = security.create_access_token({"sub": "ada@example.com"})
+    first = asyncio.run(security.get_current_user(token))
+    second = asyncio.run(security.get_current_user(token))
+    assert first is second
+    assert users.finds == 1
+
+    security.invalidate_user("ada@example.com")
+    asyncio.run(security.get_current_user(token))
+    assert users.finds == 2
+
+
+def test_decoded_claims_never_outlive_the_token(users, monkeypatch):
+    token = security.create_access_token({"sub": "ada@example.com"})
+    claims = security.decode_token(token)
+    assert claims["sub"] == "ada@example.com" and claims["jti"]
+    assert security.token_cache.get(token) == claims
+
+    security.token_cache.clear()
+    monkeypatch.setattr(security.time, "time", lambda: claims["exp"] + 1)
+    security.decode_token(token)
+    assert security.token_cache.get(token) is None
+
+
+def test_revoked_and_unknown_users_are_rejected(users):
+    token = security.create_access_token({"sub": "ada@example.com"})
+    asyncio.run(security.revoke_token(token))
+    with pytest.raises(HTTPException) as revoked:
+        asyncio.run(security.get_current_user(token))
+    assert revoked.value.status_code == 401
+
+    unknown = security.create_access_token({"sub": "nobody@example.com"})
+    with pytest.raises(HTTPException) as missing:
+        asyncio.run(security.get_current_user(unknown))
+    assert missing.value.status_code == 404